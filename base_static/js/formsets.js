@@ -0,0 +1,84 @@
+// Linhas dos formsets de horas/paradas do formulário de registro sem recarregar a página.
+// Adicionar busca só o fragmento da linha nova (registros-formset-linha); remover é feito
+// aqui mesmo, renumerando as linhas seguintes. Sem JS os botões continuam enviando o
+// formulário (add_hora/rem_hora... tratados na view).
+(function () {
+  "use strict";
+
+  function campo(form, prefixo, nome) {
+    return form.querySelector(`[name="${prefixo}-${nome}"]`);
+  }
+
+  function renumerar(linha, prefixo, de, para) {
+    const antigo = `${prefixo}-${de}-`;
+    const novo = `${prefixo}-${para}-`;
+    linha.querySelectorAll("[name], [id], [for]").forEach((el) => {
+      for (const atributo of ["name", "id", "for"]) {
+        const valor = el.getAttribute(atributo);
+        if (valor && valor.includes(antigo)) {
+          el.setAttribute(atributo, valor.replace(antigo, novo));
+        }
+      }
+    });
+    linha.querySelectorAll("button[data-formset-remover]").forEach((botao) => {
+      botao.value = `${prefixo}-${para}`;
+    });
+    linha.dataset.linha = `${prefixo}-${para}`;
+  }
+
+  async function adicionar(form, botao) {
+    const prefixo = botao.dataset.formsetAdicionar;
+    const total = campo(form, prefixo, "TOTAL_FORMS");
+    const indice = parseInt(total.value, 10);
+    let resposta;
+    try {
+      resposta = await fetch(`${botao.dataset.url}?indice=${indice}`, { credentials: "same-origin" });
+    } catch (erro) {
+      resposta = null;
+    }
+    if (!resposta || !resposta.ok) {
+      // sem o fragmento, cai no caminho sem JS
+      form.requestSubmit(botao);
+      return;
+    }
+    form.querySelector(`tbody[data-formset="${prefixo}"]`).insertAdjacentHTML("beforeend", await resposta.text());
+    total.value = indice + 1;
+  }
+
+  function remover(form, botao) {
+    const [prefixo, numero] = botao.value.split("-");
+    const indice = parseInt(numero, 10);
+    const linha = botao.closest("tr");
+
+    if (indice < parseInt(campo(form, prefixo, "INITIAL_FORMS").value, 10)) {
+      // já gravada: marca para excluir no salvar
+      campo(form, prefixo, `${indice}-DELETE`).checked = true;
+      linha.hidden = true;
+      return;
+    }
+
+    const total = campo(form, prefixo, "TOTAL_FORMS");
+    const quantidade = parseInt(total.value, 10);
+    linha.remove();
+    for (let i = indice + 1; i < quantidade; i++) {
+      const seguinte = form.querySelector(`tr[data-linha="${prefixo}-${i}"]`);
+      if (seguinte) {
+        renumerar(seguinte, prefixo, i, i - 1);
+      }
+    }
+    total.value = quantidade - 1;
+  }
+
+  document.addEventListener("click", (evento) => {
+    const botao = evento.target.closest("button[data-formset-adicionar], button[data-formset-remover]");
+    if (!botao || !botao.form) {
+      return;
+    }
+    evento.preventDefault();
+    if (botao.hasAttribute("data-formset-adicionar")) {
+      adicionar(botao.form, botao);
+    } else {
+      remover(botao.form, botao);
+    }
+  });
+})();
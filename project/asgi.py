@@ -13,4 +13,27 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from sgpi import ingestao  # noqa: E402  (depois do setup do Django)
+
+
+async def application(scope, receive, send):
+    # O Django não trata o protocolo lifespan; aqui ele liga o timer do
+    # buffer de contadores e, no desligamento, grava o que estiver pendente.
+    if scope["type"] != "lifespan":
+        return await django_application(scope, receive, send)
+
+    while True:
+        mensagem = await receive()
+        if mensagem["type"] == "lifespan.startup":
+            ingestao.buffer.iniciar()
+            await send({"type": "lifespan.startup.complete"})
+        elif mensagem["type"] == "lifespan.shutdown":
+            try:
+                await ingestao.buffer.parar()
+            except Exception as exc:
+                await send({"type": "lifespan.shutdown.failed", "message": str(exc)})
+            else:
+                await send({"type": "lifespan.shutdown.complete"})
+            return
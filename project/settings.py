@@ -133,5 +133,21 @@ STATICFILES_DIRS = [
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = "/accounts/login/"
-LOGIN_REDIRECT_URL = "/sgpi/registros/"
+LOGIN_REDIRECT_URL = "/sgpi/painel/"
 LOGOUT_REDIRECT_URL = "/accounts/login/"
+
+# Orçamento de consultas SQL por rota (sgpi/middleware.py, InstrumentacaoMiddleware).
+# Os testes rodam as views com o middleware em modo estrito: um N+1 estoura.
+SGPI_ORCAMENTO_CONSULTAS = {
+    "registros-lista": 4,
+    "registros-detalhes": 6,
+    "registros-criar": 4,
+    "registros-editar": 7,
+    "registros-formset-linha": 3,
+    "registros-buscar": 4,
+    "registros-exportar": 2,
+    "painel": 4,
+    "relatorios-oee": 3,
+    "relatorios-pareto": 3,
+    "linhas-lista": 3,
+}
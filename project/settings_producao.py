@@ -0,0 +1,86 @@
+"""
+Perfil de produção: DJANGO_SETTINGS_MODULE=project.settings_producao.
+
+Tudo o que muda entre ambientes vem de variáveis de ambiente:
+
+    DJANGO_SECRET_KEY          obrigatória
+    DJANGO_ALLOWED_HOSTS       lista separada por vírgula
+    SGPI_DB_ENGINE             "sqlite" (padrão) ou "postgresql"
+    SGPI_DB_NAME               arquivo do SQLite ou nome do banco
+    SGPI_DB_USER, SGPI_DB_PASSWORD, SGPI_DB_HOST, SGPI_DB_PORT
+    SGPI_DB_POOL               "1" usa o pool do psycopg 3 (psycopg[pool])
+    SGPI_DB_POOL_MIN, SGPI_DB_POOL_MAX
+    SGPI_DB_CONN_MAX_AGE       segundos de reuso da conexão sem pool (padrão 60)
+    SGPI_CACHE                 "arquivo" (padrão), "redis" ou "memoria" (um processo só)
+    SGPI_CACHE_DIR             diretório do cache em arquivo (padrão BASE_DIR/cache)
+    SGPI_CACHE_URL             URL do Redis, com SGPI_CACHE=redis
+    SGPI_IMPORTACAO_ERROS_DIR  relatórios de erro da importação (padrão BASE_DIR/importacao_erros)
+
+SQLite: o "database is locked" da troca de turno vem de transações que
+começam como leitura e precisam virar escrita no meio (o SQLite não espera
+o busy_timeout nesse caso). Aqui toda transação começa com BEGIN IMMEDIATE
+e espera a vez; o WAL deixa as leituras rodarem durante as escritas;
+synchronous=NORMAL (seguro com WAL) tira um fsync por commit.
+``manage.py benchmark_concorrencia`` mede a diferença.
+
+Compatibilidade: a suíte roda igual nos dois bancos, por exemplo
+``DJANGO_SECRET_KEY=x SGPI_DB_ENGINE=postgresql DJANGO_SETTINGS_MODULE=project.settings_producao
+python manage.py test sgpi`` (as migrações são aplicadas no banco de teste).
+Com ``DATABASE_URL=postgresql://...`` a suíte normal também conecta nesse
+PostgreSQL e roda a si mesma lá (sgpi.tests.PostgreSQLTests).
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .bancos import banco_postgresql, banco_sqlite
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+
+def _env(nome, padrao=None):
+    valor = os.environ.get(nome, padrao)
+    if valor is None:
+        raise ImproperlyConfigured(f"Defina a variável de ambiente {nome}.")
+    return valor
+
+
+SECRET_KEY = _env("DJANGO_SECRET_KEY")
+DEBUG = False
+ALLOWED_HOSTS = [h.strip() for h in _env("DJANGO_ALLOWED_HOSTS", "localhost").split(",") if h.strip()]
+
+
+# -----------------------
+# Banco de dados (project/bancos.py)
+# -----------------------
+_engine = _env("SGPI_DB_ENGINE", "sqlite")
+if _engine == "sqlite":
+    DATABASES = {"default": banco_sqlite(_env("SGPI_DB_NAME", str(BASE_DIR / "db.sqlite3")))}
+elif _engine == "postgresql":
+    DATABASES = {"default": banco_postgresql(os.environ)}
+else:
+    raise ImproperlyConfigured(f"SGPI_DB_ENGINE inválido: {_engine!r} (use sqlite ou postgresql).")
+
+
+# -----------------------
+# Cache
+# -----------------------
+# Tem que ser visto por todos os workers: permissões de setor
+# (sgpi/permissoes.py) e o painel são invalidados trocando uma versão no
+# cache, e num LocMemCache a troca só valeria no processo que gravou.
+_cache = _env("SGPI_CACHE", "arquivo")
+if _cache == "arquivo":
+    CACHES = {"default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": _env("SGPI_CACHE_DIR", str(BASE_DIR / "cache")),
+    }}
+elif _cache == "redis":
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": _env("SGPI_CACHE_URL")}}
+elif _cache == "memoria":
+    # só com um processo; as permissões deixam de ser guardadas entre requisições
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+else:
+    raise ImproperlyConfigured(f"SGPI_CACHE inválido: {_cache!r} (use arquivo, redis ou memoria).")
+
+# relatórios de erro da importação: o download pode cair em outro worker
+SGPI_IMPORTACAO_ERROS_DIR = _env("SGPI_IMPORTACAO_ERROS_DIR", str(BASE_DIR / "importacao_erros"))
@@ -1,8 +1,9 @@
 
 from django.contrib import admin, messages
-from django.db import transaction
 from django.core.exceptions import PermissionDenied
-from .models import LinhaProducao, RegistroProducao, RegistroHora, Parada
+from .models import (
+    LinhaProducao, MotivoParada, RegistroProducao, RegistroHora, Parada, ProducaoDiaria, ProducaoMensal,
+)
 
 
 @admin.register(LinhaProducao)
@@ -10,6 +11,13 @@ class LinhaProducaoAdmin(admin.ModelAdmin):
     list_display = ("nome", "setor", "capacidade_nominal")
 
 
+@admin.register(MotivoParada)
+class MotivoParadaAdmin(admin.ModelAdmin):
+    list_display = ("descricao", "chave", "ativo")
+    list_filter = ("ativo",)
+    search_fields = ("descricao", "chave")
+
+
 class RegistroHoraInline(admin.TabularInline):
     model = RegistroHora
     extra = 1
@@ -31,13 +39,13 @@ class RegistroHoraInline(admin.TabularInline):
 class ParadaInline(admin.TabularInline):
     model = Parada
     extra = 0
-    fields = ("hora_inicio", "hora_fim", "duracao", "motivo")
+    fields = ("hora_inicio", "hora_fim", "duracao", "motivo_padrao", "motivo")
     readonly_fields = ("duracao",)
 
     def get_readonly_fields(self, request, obj=None):
         base = list(super().get_readonly_fields(request, obj))
         if obj and obj.finalizada:
-            return ("hora_inicio", "hora_fim", "duracao", "motivo")
+            return ("hora_inicio", "hora_fim", "duracao", "motivo_padrao", "motivo")
         return tuple(base)
 
     def has_add_permission(self, request, obj):
@@ -75,12 +83,13 @@ class RegistroProducaoAdmin(admin.ModelAdmin):
     def resumo_tempo_parado_min(self, obj: RegistroProducao):
         return obj.resumo_tempo_parado_min
 
-    base_readonly = ("quantidade_produzida", "quantidade_defeituosa", "tempo_parado")
+    # finalizada só muda pelas ações (finalizar()/reabrir() mantêm os consolidados)
+    base_readonly = ("quantidade_produzida", "quantidade_defeituosa", "tempo_parado", "finalizada", "finalizada_em")
 
     def get_readonly_fields(self, request, obj=None):
         if obj and obj.finalizada:
             return self.base_readonly + (
-                "linha", "data", "turno", "motivo_parada", "finalizada", "finalizada_em",
+                "linha", "data", "turno", "motivo_parada",
                 "resumo_total_produzido", "resumo_total_defeituoso",
                 "resumo_taxa_defeitos_pct", "resumo_tempo_parado_min",
             )
@@ -110,30 +119,14 @@ class RegistroProducaoAdmin(admin.ModelAdmin):
 
     @admin.action(description="Finalizar registros selecionados")
     def acao_finalizar(self, request, queryset):
-        count = 0
-        with transaction.atomic():
-            for reg in queryset:
-                if not reg.finalizada:
-                    reg.finalizar()
-                    count += 1
+        count = queryset.finalizar()
         self.message_user(request, f"{count} registro(s) finalizado(s).", level=messages.SUCCESS)
 
     @admin.action(description="Reabrir registros selecionados")
     def acao_reabrir(self, request, queryset):
-        count = 0
-        with transaction.atomic():
-            for reg in queryset:
-                if reg.finalizada:
-                    reg.reabrir()
-                    count += 1
+        count = queryset.reabrir()
         self.message_user(request, f"{count} registro(s) reaberto(s).", level=messages.WARNING)
 
-    def save_related(self, request, form, formsets, change):
-      
-        super().save_related(request, form, formsets, change)
-        form.instance.recalc_totais()
-
-
     def has_delete_permission(self, request, obj=None):
       
        
@@ -160,3 +153,29 @@ class RegistroProducaoAdmin(admin.ModelAdmin):
                 self.message_user(request, "Registro finalizado — reabra o registro antes de editar.", level=messages.ERROR)
                 return
         super().save_model(request, obj, form, change)
+
+
+class ConsolidadoAdmin(admin.ModelAdmin):
+    list_filter = ("setor", "linha")
+    readonly_fields = (
+        "linha", "setor", "quantidade_produzida", "quantidade_defeituosa",
+        "tempo_parado", "minutos_planejados", "registros",
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ProducaoDiaria)
+class ProducaoDiariaAdmin(ConsolidadoAdmin):
+    list_display = ("linha", "setor", "dia", "quantidade_produzida", "quantidade_defeituosa", "tempo_parado", "registros")
+    date_hierarchy = "dia"
+
+
+@admin.register(ProducaoMensal)
+class ProducaoMensalAdmin(ConsolidadoAdmin):
+    list_display = ("linha", "setor", "mes", "quantidade_produzida", "quantidade_defeituosa", "tempo_parado", "registros")
+    date_hierarchy = "mes"
@@ -0,0 +1,285 @@
+# sgpi/analitico.py
+"""
+Relatórios de desempenho de longo prazo (centenas de linhas, anos de horas).
+
+Em vez de instanciar RegistroHora/Parada e somar propriedades em Python
+(``taxa_defeitos``, ``minutos_intervalo``), as colunas saem do banco com
+values_list em fatias de ``SGPI_ANALITICO_DIAS_LOTE`` dias e viram arrays
+NumPy. Cada fatia só soma em acumuladores de tamanho fixo (linhas x dias,
+linhas x turnos, linhas x faixas do histograma), então a memória não cresce
+com o número de horas do período.
+
+Os percentis do aproveitamento por hora (% da capacidade nominal) saem de um
+histograma com faixas de ``PASSO_HISTOGRAMA`` pontos percentuais: o valor
+informado é o limite superior da faixa, com erro de no máximo um passo.
+
+Requer numpy (pip install numpy). Registros já arquivados (sgpi/arquivo.py)
+não entram.
+"""
+from datetime import time, timedelta
+
+from django.conf import settings
+from django.db.models import CharField
+from django.db.models.functions import Cast
+
+from .models import LinhaProducao, Parada, RegistroHora, RegistroProducao
+
+DIAS_LOTE = getattr(settings, "SGPI_ANALITICO_DIAS_LOTE", 31)
+PASSO_HISTOGRAMA = 0.5
+# aproveitamento acima disso (hora com capacidade mal cadastrada) cai na última faixa
+LIMITE_HISTOGRAMA = 300.0
+PERCENTIS = (50, 90, 95)
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError as exc:
+        raise ImportError("Relatórios analíticos requerem o pacote numpy (pip install numpy).") from exc
+    return numpy
+
+
+def _fatias(data_inicio, data_fim, dias):
+    inicio = data_inicio
+    while inicio <= data_fim:
+        fim = min(inicio + timedelta(days=dias - 1), data_fim)
+        yield inicio, fim
+        inicio = fim + timedelta(days=1)
+
+
+def _segundos(texto):
+    hora = time.fromisoformat(texto)
+    return hora.hour * 3600 + hora.minute * 60 + hora.second
+
+
+def _por_valor(np, valores, converter):
+    """
+    ``converter`` aplicado só aos valores distintos (np.unique) e espalhado
+    de volta: poucas dezenas de chamadas em Python por fatia, em vez de uma
+    por linha como nos conversores de campo do Django.
+    """
+    distintos, inverso = np.unique(np.array(valores), return_inverse=True)
+    return np.array([converter(v) for v in distintos.tolist()], np.int64)[inverso.reshape(-1)]
+
+
+def _dividir(np, numerador, denominador, fator=100.0):
+    # NaN onde não há denominador (sem produção / sem capacidade)
+    saida = np.full(np.shape(numerador), np.nan)
+    np.divide(numerador, denominador, out=saida, where=denominador > 0)
+    return saida * fator
+
+
+def _movel(np, valores, janela):
+    """Soma dos últimos ``janela`` dias ao longo do último eixo."""
+    acumulado = np.cumsum(valores, axis=-1)
+    soma = acumulado.copy()
+    soma[..., janela:] -= acumulado[..., :-janela]
+    return soma
+
+
+def _opcional(valor):
+    valor = float(valor)
+    return None if valor != valor else valor
+
+
+class RelatorioAnalitico:
+    """
+    Arrays NumPy com os acumulados do período. O primeiro eixo segue
+    ``linha_ids``; ``dias`` e ``turnos`` dão os rótulos dos outros eixos.
+    """
+
+    def __init__(self, np, linha_ids, capacidades, data_inicio, data_fim, janela, percentis):
+        self.np = np
+        self.linha_ids = linha_ids
+        self.capacidades = capacidades
+        self.data_inicio = data_inicio
+        self.dias = [data_inicio + timedelta(days=d) for d in range((data_fim - data_inicio).days + 1)]
+        self.turnos = [t for t, _ in RegistroProducao.TURNO_CHOICES]
+        self.janela = janela
+        self.percentis = percentis
+        self.horas_lidas = 0
+
+        forma_dia = (len(linha_ids), len(self.dias))
+        forma_turno = (len(linha_ids), len(self.turnos))
+        self.produzido_dia = np.zeros(forma_dia, np.int64)
+        self.defeituoso_dia = np.zeros(forma_dia, np.int64)
+        self.produzido_turno = np.zeros(forma_turno, np.int64)
+        self.defeituoso_turno = np.zeros(forma_turno, np.int64)
+        self.minutos_turno = np.zeros(forma_turno, np.int64)
+        self.parado_turno = np.zeros(forma_turno, np.int64)
+        self.histograma = np.zeros((len(linha_ids), int(LIMITE_HISTOGRAMA / PASSO_HISTOGRAMA) + 1), np.int64)
+
+    # -----------------------
+    # Acumulação por fatia
+    # -----------------------
+    def _somar(self, destino, indice, pesos=None):
+        # bincount com pesos devolve float64: exato para somas de inteiros até 2**53
+        soma = self.np.bincount(indice, weights=pesos, minlength=destino.size)
+        destino += soma.reshape(destino.shape).astype(destino.dtype)
+
+    def acumular(self, registros, horas, paradas):
+        """
+        Soma uma fatia. ``registros``: (pk, linha_id, data, turno) em ordem de
+        pk; ``horas``: (registro_id, hora_inicio, hora_fim, produzida,
+        defeituosa); ``paradas``: (registro_id, duracao). Datas e horas vêm
+        como texto ISO (ver ``relatorio``).
+        """
+        np = self.np
+        if not registros:
+            return
+        pks, linha_ids, datas, turnos = zip(*registros)
+        pks = np.array(pks, np.int64)
+        linha = np.searchsorted(self.linha_ids, np.array(linha_ids, np.int64))
+        dia = (np.array(datas, "datetime64[D]") - np.datetime64(self.data_inicio, "D")).astype(np.int64)
+        codigos = {t: i for i, t in enumerate(self.turnos)}
+        turno = _por_valor(np, turnos, codigos.__getitem__)
+
+        if horas:
+            self._acumular_horas(np.searchsorted(pks, np.array([h[0] for h in horas], np.int64)), horas, linha, dia, turno)
+        if paradas:
+            registro_ids, duracoes = zip(*paradas)
+            r = np.searchsorted(pks, np.array(registro_ids, np.int64))
+            self._somar(self.parado_turno, linha[r] * len(self.turnos) + turno[r], np.array(duracoes, np.int64))
+
+    def _acumular_horas(self, r, horas, linha, dia, turno):
+        np = self.np
+        _, inicios, fins, produzidas, defeituosas = zip(*horas)
+        li = linha[r]
+        # mesma regra de intervalos.duracao: fim <= início atravessa a meia-noite
+        segundos = (_por_valor(np, fins, _segundos) - _por_valor(np, inicios, _segundos)) % 86400
+        minutos = np.where(segundos == 0, 86400, segundos) // 60
+        produzida = np.array(produzidas, np.int64)
+        defeituosa = np.array(defeituosas, np.int64)
+
+        por_dia = li * len(self.dias) + dia[r]
+        por_turno = li * len(self.turnos) + turno[r]
+        self._somar(self.produzido_dia, por_dia, produzida)
+        self._somar(self.defeituoso_dia, por_dia, defeituosa)
+        self._somar(self.produzido_turno, por_turno, produzida)
+        self._somar(self.defeituoso_turno, por_turno, defeituosa)
+        self._somar(self.minutos_turno, por_turno, minutos)
+
+        capacidade = self.capacidades[li] * minutos / 60.0
+        com_capacidade = capacidade > 0
+        aproveitamento = 100.0 * produzida[com_capacidade] / capacidade[com_capacidade]
+        faixa = np.minimum((aproveitamento / PASSO_HISTOGRAMA).astype(np.int64), self.histograma.shape[1] - 1)
+        self._somar(self.histograma, li[com_capacidade] * self.histograma.shape[1] + faixa)
+        self.horas_lidas += len(horas)
+
+    # -----------------------
+    # Resultados
+    # -----------------------
+    @property
+    def capacidade_turno(self):
+        """Peças que a linha faria no tempo apontado (capacidade_nominal x horas)."""
+        return self.capacidades[:, None] * self.minutos_turno / 60.0
+
+    @property
+    def aproveitamento_turno_pct(self):
+        return _dividir(self.np, self.produzido_turno, self.capacidade_turno)
+
+    @property
+    def taxa_defeitos_movel(self):
+        """% de defeitos dos últimos ``janela`` dias, por linha e dia (NaN sem produção)."""
+        np = self.np
+        return _dividir(np, _movel(np, self.defeituoso_dia, self.janela), _movel(np, self.produzido_dia, self.janela))
+
+    @property
+    def taxa_defeitos_movel_geral(self):
+        np = self.np
+        return _dividir(
+            np,
+            _movel(np, self.defeituoso_dia.sum(axis=0), self.janela),
+            _movel(np, self.produzido_dia.sum(axis=0), self.janela),
+        )
+
+    def percentis_aproveitamento(self):
+        """percentil -> array por linha (NaN para linha sem horas)."""
+        np = self.np
+        acumulado = np.cumsum(self.histograma, axis=1)
+        total = acumulado[:, -1]
+        resultado = {}
+        for q in self.percentis:
+            faixa = (acumulado < (q / 100.0 * total)[:, None]).sum(axis=1)
+            valor = np.minimum((faixa + 1) * PASSO_HISTOGRAMA, LIMITE_HISTOGRAMA)
+            resultado[q] = np.where(total > 0, valor, np.nan)
+        return resultado
+
+    def por_linha(self):
+        """Um dict por linha com totais, aproveitamento, defeitos e percentis."""
+        np = self.np
+        produzido = self.produzido_turno.sum(axis=1)
+        defeituoso = self.defeituoso_turno.sum(axis=1)
+        capacidade = self.capacidade_turno.sum(axis=1)
+        aproveitamento = _dividir(np, produzido, capacidade)
+        taxa = _dividir(np, defeituoso, produzido)
+        percentis = self.percentis_aproveitamento()
+        return [
+            {
+                "linha_id": int(self.linha_ids[i]),
+                "produzido": int(produzido[i]),
+                "defeituoso": int(defeituoso[i]),
+                "horas": float(self.minutos_turno[i].sum() / 60.0),
+                "parado_min": int(self.parado_turno[i].sum()),
+                "capacidade": float(capacidade[i]),
+                "aproveitamento_pct": _opcional(aproveitamento[i]),
+                "taxa_defeitos_pct": _opcional(taxa[i]),
+                "percentis_aproveitamento": {q: _opcional(v[i]) for q, v in percentis.items()},
+            }
+            for i in range(len(self.linha_ids))
+        ]
+
+    def por_turno(self):
+        """Comparação entre turnos, somando todas as linhas."""
+        np = self.np
+        produzido = self.produzido_turno.sum(axis=0)
+        defeituoso = self.defeituoso_turno.sum(axis=0)
+        capacidade = self.capacidade_turno.sum(axis=0)
+        aproveitamento = _dividir(np, produzido, capacidade)
+        taxa = _dividir(np, defeituoso, produzido)
+        minutos = self.minutos_turno.sum(axis=0)
+        parado = self.parado_turno.sum(axis=0)
+        return [
+            {
+                "turno": turno,
+                "produzido": int(produzido[t]),
+                "defeituoso": int(defeituoso[t]),
+                "horas": float(minutos[t] / 60.0),
+                "parado_min": int(parado[t]),
+                "aproveitamento_pct": _opcional(aproveitamento[t]),
+                "taxa_defeitos_pct": _opcional(taxa[t]),
+            }
+            for t, turno in enumerate(self.turnos)
+        ]
+
+
+def relatorio(data_inicio, data_fim, linhas=None, janela=7, percentis=PERCENTIS, dias_lote=None):
+    """
+    RelatorioAnalitico de ``data_inicio`` a ``data_fim`` (inclusive) para as
+    ``linhas`` (queryset/lista de LinhaProducao; todas por padrão).
+    ``janela`` é o número de dias da taxa de defeitos móvel.
+    """
+    np = _numpy()
+    if janela < 1:
+        raise ValueError("A janela precisa ser de pelo menos 1 dia.")
+    qs_linhas = LinhaProducao.objects.all() if linhas is None else LinhaProducao.objects.filter(
+        pk__in=[getattr(linha, "pk", linha) for linha in linhas]
+    )
+    cadastro = list(qs_linhas.order_by("pk").values_list("pk", "capacidade_nominal"))
+    linha_ids = np.array([pk for pk, _ in cadastro], np.int64)
+    capacidades = np.array([capacidade for _, capacidade in cadastro], np.float64)
+    resultado = RelatorioAnalitico(np, linha_ids, capacidades, data_inicio, data_fim, janela, percentis)
+
+    # data e horas como texto: sem os conversores do Django (um parse por linha)
+    data, inicio, fim = (Cast(campo, CharField()) for campo in ("data", "hora_inicio", "hora_fim"))
+    filtro = {} if linhas is None else {"linha_id__in": linha_ids.tolist()}
+    for de, ate in _fatias(data_inicio, data_fim, dias_lote or DIAS_LOTE):
+        registros = RegistroProducao.objects.filter(data__gte=de, data__lte=ate, **filtro)
+        resultado.acumular(
+            list(registros.order_by("pk").values_list("pk", "linha_id", data, "turno")),
+            list(RegistroHora.objects.filter(registro__in=registros).order_by().values_list(
+                "registro_id", inicio, fim, "quantidade_produzida", "quantidade_defeituosa",
+            )),
+            list(Parada.objects.filter(registro__in=registros).order_by().values_list("registro_id", "duracao")),
+        )
+    return resultado
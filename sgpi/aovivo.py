@@ -0,0 +1,207 @@
+# sgpi/aovivo.py
+"""
+Painel ao vivo (Server-Sent Events) por setor ou linha.
+
+Em vez de cada tela consultar o banco, há uma central por processo: quando
+os totais de registros mudam (o mesmo ponto, depois do commit, em que o
+painel troca a versão do cache — ver ``painel.invalidar_registros``), o
+estado do turno atual das linhas afetadas é lido uma vez e cada assinante
+do setor/linha recebe só os campos que mudaram. Nada é consultado quando
+não há ninguém assistindo.
+
+Cada assinante guarda as diferenças ainda não enviadas num dict por linha;
+publicações seguidas se juntam nele, então um cliente lento recebe o
+estado mais recente, sem fila crescendo.
+
+A central é em memória e só publica na hora as gravações do próprio
+processo. As dos outros workers chegam pelo cache compartilhado: cada
+conexão confere a versão do seu setor (a mesma do painel) a cada
+``intervalo_versao()`` segundos e, se mudou, relê o estado do canal —
+o retrato também fica no cache (``painel.estados_do_canal``), então é uma
+leitura por versão, não por conexão. Com SGPI_CACHE=memoria não há cache
+compartilhado: aí o painel ao vivo só funciona com um worker.
+"""
+import asyncio
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import LinhaProducao, Parada, RegistroHora, RegistroProducao
+from .turnos import contem, hora_cheia
+
+
+def intervalo_heartbeat():
+    return getattr(settings, "SGPI_AOVIVO_HEARTBEAT", 15)
+
+
+def intervalo_versao():
+    return getattr(settings, "SGPI_AOVIVO_INTERVALO_VERSAO", 2)
+
+
+# -----------------------
+# Estado do turno atual
+# -----------------------
+def _taxa(defeituosa, produzida):
+    return round(100 * defeituosa / produzida, 1) if produzida else None
+
+
+def estados(linha_ids=(), setores=(), agora=None, using=DEFAULT_DB_ALIAS):
+    """
+    linha_id -> estado do turno em andamento (produção da hora atual, taxa
+    de defeitos acumulada no turno e parada em curso). Quatro consultas,
+    qualquer que seja o número de linhas.
+    """
+    filtro = Q(pk__in=linha_ids) if linha_ids else Q()
+    if setores:
+        filtro |= Q(setor__in=setores)
+    if not filtro:
+        return {}
+    agora = agora or timezone.now()
+    hora = hora_cheia(agora)
+    resultado = {
+        pk: {
+            "linha": pk, "nome": nome, "setor": setor or "",
+            "registro": None, "turno": hora[1] if hora else None,
+            "hora": hora[2].strftime("%H:%M") if hora else None,
+            "hora_produzida": 0, "hora_defeituosa": 0,
+            "produzida": 0, "defeituosa": 0, "taxa_defeitos": None,
+            "parado": 0, "parada": None, "finalizada": False,
+        }
+        for pk, nome, setor in LinhaProducao.objects.using(using).filter(filtro).values_list("pk", "nome", "setor")
+    }
+    if hora is None or not resultado:
+        return resultado
+
+    data, turno, hora_inicio, _ = hora
+    por_registro = {}
+    registros = (
+        RegistroProducao.objects.using(using)
+        .filter(linha_id__in=resultado, data=data, turno=turno)
+        .values_list("pk", "linha_id", "quantidade_produzida", "quantidade_defeituosa", "tempo_parado", "finalizada")
+    )
+    for pk, linha_id, produzida, defeituosa, parado, finalizada in registros:
+        estado = por_registro[pk] = resultado[linha_id]
+        estado.update(
+            registro=pk, produzida=produzida, defeituosa=defeituosa,
+            taxa_defeitos=_taxa(defeituosa, produzida), parado=parado, finalizada=finalizada,
+        )
+    if not por_registro:
+        return resultado
+
+    horas = (
+        RegistroHora.objects.using(using)
+        .filter(registro_id__in=por_registro, hora_inicio=hora_inicio)
+        .values_list("registro_id", "quantidade_produzida", "quantidade_defeituosa")
+    )
+    for registro_id, produzida, defeituosa in horas:
+        por_registro[registro_id].update(hora_produzida=produzida, hora_defeituosa=defeituosa)
+
+    momento = timezone.localtime(agora).time()
+    paradas = (
+        Parada.objects.using(using)
+        .filter(registro_id__in=por_registro)
+        .values_list("registro_id", "hora_inicio", "hora_fim", "motivo", "motivo_padrao__descricao")
+    )
+    for registro_id, inicio, fim, motivo, motivo_padrao in paradas:
+        if contem(inicio, fim, momento):
+            por_registro[registro_id]["parada"] = {
+                "inicio": inicio.strftime("%H:%M"),
+                "fim": fim.strftime("%H:%M"),
+                "motivo": motivo_padrao or motivo or "",
+            }
+    return resultado
+
+
+# -----------------------
+# Central de assinantes
+# -----------------------
+class Assinante:
+    def __init__(self, loop, setor=None, linha_id=None):
+        self.loop = loop
+        self.setor = setor
+        self.linha_id = linha_id
+        self.pendentes = {}
+        self.evento = asyncio.Event()
+
+    def interessa(self, estado):
+        if self.linha_id is not None:
+            return estado["linha"] == self.linha_id
+        return estado["setor"] == self.setor
+
+
+class CentralAoVivo:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._assinantes = set()
+        self._ultimo = {}
+
+    def assinar(self, assinante):
+        with self._lock:
+            self._assinantes.add(assinante)
+
+    def cancelar(self, assinante):
+        with self._lock:
+            self._assinantes.discard(assinante)
+
+    def ha_assinantes(self):
+        return bool(self._assinantes)
+
+    def canais(self):
+        """(linha_ids, setores) com alguém assistindo."""
+        with self._lock:
+            assinantes = list(self._assinantes)
+        linhas = {a.linha_id for a in assinantes if a.linha_id is not None}
+        setores = {a.setor for a in assinantes if a.linha_id is None}
+        return linhas, setores
+
+    def retirar(self, assinante):
+        """Diferenças acumuladas para o assinante (linha_id -> campos)."""
+        with self._lock:
+            pendentes, assinante.pendentes = assinante.pendentes, {}
+            assinante.evento.clear()
+        return pendentes
+
+    def publicar(self, novos):
+        """Compara com o último estado publicado e repassa só o que mudou."""
+        acordar = set()
+        with self._lock:
+            for linha_id, estado in novos.items():
+                anterior = self._ultimo.get(linha_id, {})
+                mudou = {campo: valor for campo, valor in estado.items() if anterior.get(campo, ...) != valor}
+                if not mudou:
+                    continue
+                self._ultimo[linha_id] = estado
+                mudou["linha"] = linha_id
+                for assinante in self._assinantes:
+                    if assinante.interessa(estado):
+                        assinante.pendentes.setdefault(linha_id, {}).update(mudou)
+                        acordar.add(assinante)
+        for assinante in acordar:
+            # publicar roda em threads síncronas (on_commit); o Event é do loop do assinante
+            assinante.loop.call_soon_threadsafe(assinante.evento.set)
+
+
+central = CentralAoVivo()
+
+
+def publicar_alteracao(registro_ids=(), linha_ids=(), using=DEFAULT_DB_ALIAS):
+    """Chamado depois do commit; só consulta se houver alguém assistindo."""
+    if not central.ha_assinantes():
+        return
+    assistidas, setores = central.canais()
+    assistida = Q(pk__in=assistidas) | Q(setor__in=setores)
+    alteradas = set()
+    if linha_ids:
+        alteradas.update(
+            LinhaProducao.objects.using(using).filter(assistida, pk__in=linha_ids).values_list("pk", flat=True)
+        )
+    if registro_ids:
+        alteradas.update(
+            LinhaProducao.objects.using(using).filter(assistida, registros__pk__in=registro_ids)
+            .values_list("pk", flat=True)
+        )
+    if alteradas:
+        central.publicar(estados(linha_ids=alteradas, using=using))
@@ -0,0 +1,89 @@
+# sgpi/apontamento.py
+"""
+Gravação do apontamento enviado pelos terminais de linha (API JSON).
+
+Um apontamento é o RegistroProducao da chave (linha, data, turno) com as
+suas horas. Tudo vai em INSERT ... ON CONFLICT DO UPDATE
+(bulk_create(update_conflicts=True)): reenviar a mesma hora sobrescreve em
+vez de duplicar, e o terminal não precisa saber se o registro já existe.
+Como bulk_create não dispara sinais, os totais são recalculados uma vez só
+no final, junto com o painel e o índice de busca.
+"""
+from django.db import transaction
+
+from . import arquivo
+from .busca import obter_backend
+from .models import RegistroHora, RegistroProducao
+from .painel import marcar_alteracao
+from .recalculo import recalcular_registros, suspender_recalculo
+
+CAMPOS_TOTAIS = ("quantidade_produzida", "quantidade_defeituosa", "tempo_parado")
+
+
+class RegistroFinalizado(Exception):
+    pass
+
+
+class RegistroArquivado(RegistroFinalizado):
+    """A chave (linha, data, turno) está no arquivo frio (sgpi/arquivo.py)."""
+
+
+def gravar_apontamento(linha, data, turno, horas, motivo_parada=None, substituir_horas=False):
+    """
+    ``horas``: dicts com hora_inicio, hora_fim, quantidade_produzida e
+    quantidade_defeituosa (hora_inicio única). Com ``substituir_horas`` as
+    horas do registro que não vieram no envio são apagadas.
+
+    Retorna (id do registro, criado?, totais). Levanta RegistroFinalizado
+    se o registro já estiver finalizado e RegistroArquivado se ele estiver
+    no arquivo frio.
+    """
+    if arquivo.existe(linha.pk, data, turno):
+        raise RegistroArquivado
+    with transaction.atomic():
+        existente = (
+            RegistroProducao.objects.select_for_update()
+            .filter(linha=linha, data=data, turno=turno)
+            .values_list("pk", "finalizada")
+            .first()
+        )
+        if existente and existente[1]:
+            raise RegistroFinalizado
+
+        atualizar = ["atualizado_em"]
+        if motivo_parada is not None:
+            atualizar.append("motivo_parada")
+        registro = RegistroProducao(linha=linha, data=data, turno=turno, motivo_parada=motivo_parada or None)
+        RegistroProducao.objects.bulk_create(
+            [registro],
+            update_conflicts=True,
+            unique_fields=["linha", "data", "turno"],
+            update_fields=atualizar,
+        )
+        pk = registro.pk
+        if pk is None:
+            # backend sem RETURNING no upsert
+            pk = RegistroProducao.objects.filter(linha=linha, data=data, turno=turno).values_list("pk", flat=True).get()
+
+        if substituir_horas:
+            # os totais são recalculados logo abaixo
+            with suspender_recalculo(recalcular_ao_sair=False):
+                RegistroHora.objects.filter(registro_id=pk).exclude(
+                    hora_inicio__in=[h["hora_inicio"] for h in horas]
+                ).delete()
+
+        if horas:
+            RegistroHora.objects.bulk_create(
+                [RegistroHora(registro_id=pk, **h) for h in horas],
+                update_conflicts=True,
+                unique_fields=["registro", "hora_inicio"],
+                update_fields=["hora_fim", "quantidade_produzida", "quantidade_defeituosa"],
+            )
+
+        recalcular_registros([pk])
+        marcar_alteracao(registro_ids=[pk])
+        if not existente or motivo_parada is not None:
+            obter_backend().indexar([pk])
+
+    totais = RegistroProducao.objects.filter(pk=pk).values(*CAMPOS_TOTAIS).get()
+    return pk, not existente, totais
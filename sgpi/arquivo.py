@@ -0,0 +1,414 @@
+# sgpi/arquivo.py
+"""
+Arquivo frio dos registros finalizados antigos.
+
+Registros finalizados de meses inteiros anteriores a ``SGPI_ARQUIVO_MESES``
+(padrão 12) saem das tabelas quentes e vão para um SQLite à parte
+(``SGPI_ARQUIVO_CAMINHO``, padrão ``arquivo.sqlite3`` ao lado do banco):
+uma linha por registro, com os totais em colunas e o registro completo
+(horas e paradas) num JSON comprimido com zlib. ``manage.py
+arquivar_registros`` faz a mudança em lotes; ``manage.py
+restaurar_arquivo`` (e o "Reabrir" de um registro arquivado) traz de volta.
+
+Leitura: o detalhe de um registro e a exportação consultam o arquivo
+quando o registro não está mais nas tabelas quentes. Lista, busca, admin,
+OEE e Pareto enxergam só os registros quentes; os consolidados
+(ProducaoDiaria/ProducaoMensal) não são tocados, então o painel e os
+totais por período continuam incluindo os meses arquivados, e
+``reconstruir_consolidados`` não desce para os meses arquivados.
+"""
+import json
+import sqlite3
+import unicodedata
+import zlib
+from contextlib import closing, contextmanager
+from datetime import date, datetime, time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .busca import obter_backend, termos
+from .models import LinhaProducao, MotivoParada, Parada, RegistroHora, RegistroProducao
+from .painel import marcar_alteracao
+
+TAMANHO_LOTE = 500
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS registros (
+    id INTEGER PRIMARY KEY,
+    linha_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    turno TEXT NOT NULL,
+    quantidade_produzida INTEGER NOT NULL,
+    quantidade_defeituosa INTEGER NOT NULL,
+    tempo_parado INTEGER NOT NULL,
+    texto TEXT NOT NULL,
+    dados BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS registros_data ON registros (data, turno, id);
+CREATE UNIQUE INDEX IF NOT EXISTS registros_linha_data_turno ON registros (linha_id, data, turno);
+"""
+
+_CAMPOS_REGISTRO = [
+    "id", "linha_id", "data", "turno", "quantidade_produzida", "quantidade_defeituosa",
+    "tempo_parado", "criado_em", "atualizado_em", "finalizada_em", "motivo_parada",
+]
+_CAMPOS_HORA = ["hora_inicio", "hora_fim", "quantidade_produzida", "quantidade_defeituosa"]
+_CAMPOS_PARADA = ["hora_inicio", "hora_fim", "duracao", "motivo", "motivo_padrao_id", "motivo_padrao__descricao"]
+
+
+def caminho():
+    padrao = Path(settings.BASE_DIR) / "arquivo.sqlite3"
+    return Path(getattr(settings, "SGPI_ARQUIVO_CAMINHO", padrao))
+
+
+def meses_quentes():
+    return getattr(settings, "SGPI_ARQUIVO_MESES", 12)
+
+
+def limite(hoje=None):
+    """Primeiro dia do mês mais antigo que fica nas tabelas quentes."""
+    hoje = hoje or timezone.localdate()
+    meses = hoje.year * 12 + hoje.month - 1 - meses_quentes()
+    return date(meses // 12, meses % 12 + 1, 1)
+
+
+@contextmanager
+def _conexao(criar=False):
+    """Conexão com o arquivo (None se ainda não existe e ``criar`` é falso)."""
+    arquivo = caminho()
+    if not criar and not arquivo.exists():
+        yield None
+        return
+    # check_same_thread: a exportação em streaming pode ser consumida por outra thread no ASGI
+    with closing(sqlite3.connect(arquivo, check_same_thread=False)) as conexao:
+        if criar:
+            conexao.executescript(_ESQUEMA)
+        with conexao:
+            yield conexao
+
+
+def _texto(*partes):
+    # mesmo recorte de palavras da busca, sem acentos
+    texto = unicodedata.normalize("NFKD", " ".join(p or "" for p in partes))
+    return " ".join(termos("".join(c for c in texto if not unicodedata.combining(c))))
+
+
+def _comprimir(dados):
+    # datas/horas em isoformat completo (o DjangoJSONEncoder corta os microssegundos)
+    return zlib.compress(json.dumps(dados, default=lambda valor: valor.isoformat(), separators=(",", ":")).encode())
+
+
+def _descomprimir(blob):
+    return json.loads(zlib.decompress(blob))
+
+
+# -----------------------
+# Arquivamento
+# -----------------------
+def _documentos(ids):
+    registros = list(
+        RegistroProducao.objects.filter(pk__in=ids)
+        .values_list(*_CAMPOS_REGISTRO, "linha__nome", "linha__setor")
+    )
+    horas, paradas = {}, {}
+    for registro_id, *valores in RegistroHora.objects.filter(registro_id__in=ids).order_by(
+        "registro_id", "hora_inicio"
+    ).values_list("registro_id", *_CAMPOS_HORA):
+        horas.setdefault(registro_id, []).append(valores)
+    for registro_id, *valores in Parada.objects.filter(registro_id__in=ids).order_by(
+        "registro_id", "hora_inicio"
+    ).values_list("registro_id", *_CAMPOS_PARADA):
+        paradas.setdefault(registro_id, []).append(valores)
+
+    for *valores, nome, setor in registros:
+        registro = dict(zip(_CAMPOS_REGISTRO, valores))
+        registro.update(linha=nome, setor=setor)
+        pk = registro["id"]
+        motivos = [p[3] for p in paradas.get(pk, [])] + [p[5] for p in paradas.get(pk, [])]
+        yield (
+            pk, registro["linha_id"], registro["data"].isoformat(), registro["turno"],
+            registro["quantidade_produzida"], registro["quantidade_defeituosa"], registro["tempo_parado"],
+            _texto(nome, setor, registro["motivo_parada"], *motivos),
+            _comprimir({"registro": registro, "horas": horas.get(pk, []), "paradas": paradas.get(pk, [])}),
+        )
+
+
+def arquivar(antes_de=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Move para o arquivo os registros finalizados com data anterior a
+    ``antes_de`` (arredondado para o primeiro dia do mês; padrão
+    ``limite()``). Cada lote é gravado no arquivo antes de sair das tabelas
+    quentes: se o processo cair no meio, o registro fica nos dois lugares
+    (a leitura prefere o quente) e a próxima execução regrava. Retorna
+    quantos registros foram arquivados.
+    """
+    antes_de = (antes_de or limite()).replace(day=1)
+    candidatos = RegistroProducao.objects.filter(finalizada=True, data__lt=antes_de).order_by("pk")
+    total = 0
+    with _conexao(criar=True) as arquivo:
+        while True:
+            ids = list(candidatos.values_list("pk", flat=True)[:tamanho_lote])
+            if not ids:
+                break
+            arquivo.executemany(
+                "INSERT OR REPLACE INTO registros VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", _documentos(ids)
+            )
+            arquivo.commit()
+            with transaction.atomic():
+                linha_ids = set(
+                    RegistroProducao.objects.filter(pk__in=ids).values_list("linha_id", flat=True).distinct()
+                )
+                # sem carregar objetos nem disparar os sinais de recálculo/consolidação:
+                # os consolidados continuam valendo para os meses arquivados
+                for model in (RegistroHora, Parada):
+                    qs = model.objects.filter(registro_id__in=ids)
+                    qs._raw_delete(qs.db)
+                qs = RegistroProducao.objects.filter(pk__in=ids)
+                qs._raw_delete(qs.db)
+                obter_backend().remover(ids)
+                marcar_alteracao(linha_ids=linha_ids)
+            total += len(ids)
+    return total
+
+
+# -----------------------
+# Leitura
+# -----------------------
+def _registro(dados):
+    campos = dados["registro"]
+    registro = RegistroProducao(
+        finalizada=True,
+        **{c: campos[c] for c in _CAMPOS_REGISTRO if c not in ("data", "criado_em", "atualizado_em", "finalizada_em")},
+        data=date.fromisoformat(campos["data"]),
+        criado_em=_momento(campos["criado_em"]),
+        atualizado_em=_momento(campos["atualizado_em"]),
+        finalizada_em=_momento(campos["finalizada_em"]),
+    )
+    registro.arquivado = True
+    registro.horas_arquivadas = [
+        RegistroHora(
+            registro=registro, hora_inicio=time.fromisoformat(inicio), hora_fim=time.fromisoformat(fim),
+            quantidade_produzida=produzida, quantidade_defeituosa=defeituosa,
+        )
+        for inicio, fim, produzida, defeituosa in dados["horas"]
+    ]
+    registro.paradas_arquivadas = [
+        Parada(
+            registro=registro, hora_inicio=time.fromisoformat(inicio), hora_fim=time.fromisoformat(fim),
+            duracao=duracao, motivo=motivo,
+            motivo_padrao=MotivoParada(pk=motivo_id, descricao=descricao) if motivo_id else None,
+        )
+        for inicio, fim, duracao, motivo, motivo_id, descricao in dados["paradas"]
+    ]
+    return registro
+
+
+def _momento(valor):
+    return datetime.fromisoformat(valor) if valor else None
+
+
+def obter(pk):
+    """RegistroProducao arquivado (não salvo, ``arquivado = True``) ou None."""
+    with _conexao() as arquivo:
+        if arquivo is None:
+            return None
+        linha = arquivo.execute("SELECT dados FROM registros WHERE id = ?", [pk]).fetchone()
+    return _registro(_descomprimir(linha[0])) if linha else None
+
+
+def arquivados(chaves):
+    """Quais das chaves (linha_id, data, turno) já têm registro no arquivo."""
+    chaves = sorted(set(chaves))
+    encontrados = set()
+    with _conexao() as arquivo:
+        if arquivo is None:
+            return encontrados
+        # 3 parâmetros por chave, abaixo do limite de variáveis do SQLite
+        for i in range(0, len(chaves), 300):
+            lote = chaves[i:i + 300]
+            condicao = " OR ".join(["(linha_id = ? AND data = ? AND turno = ?)"] * len(lote))
+            params = [v for linha_id, data, turno in lote for v in (linha_id, data.isoformat(), turno)]
+            for linha_id, data, turno in arquivo.execute(
+                f"SELECT linha_id, data, turno FROM registros WHERE {condicao}", params
+            ):
+                encontrados.add((linha_id, date.fromisoformat(data), turno))
+    return encontrados
+
+
+def existe(linha_id, data, turno):
+    return bool(arquivados([(linha_id, data, turno)]))
+
+
+def inicio_livre():
+    """Primeiro dia depois do último mês com registros arquivados (None se vazio)."""
+    with _conexao() as arquivo:
+        ultimo = arquivo.execute("SELECT max(data) FROM registros").fetchone()[0] if arquivo else None
+    if not ultimo:
+        return None
+    ultimo = date.fromisoformat(ultimo)
+    return date(ultimo.year + ultimo.month // 12, ultimo.month % 12 + 1, 1)
+
+
+def _filtro(linha_ids=None, texto=None, de=None, ate=None, ids=None):
+    condicoes, params = [], []
+    if ids is not None:
+        ids = list(ids)
+        condicoes.append(f"id IN ({', '.join('?' * len(ids))})" if ids else "0")
+        params += ids
+    if linha_ids is not None:
+        linha_ids = list(linha_ids)
+        condicoes.append(f"linha_id IN ({', '.join('?' * len(linha_ids))})" if linha_ids else "0")
+        params += linha_ids
+    if texto is not None:
+        palavras = termos(_texto(texto))
+        if not palavras:
+            condicoes.append("0")
+        for palavra in palavras:
+            condicoes.append("texto LIKE ?")
+            params.append(f"%{palavra}%")
+    if de:
+        condicoes.append("data >= ?")
+        params.append(de.isoformat())
+    if ate:
+        condicoes.append("data <= ?")
+        params.append(ate.isoformat())
+    return " AND ".join(condicoes) or "1", params
+
+
+def linhas_exportacao(detalhar="", linha_ids=None, texto=None):
+    """
+    Tuplas no mesmo formato das colunas de ``exportacao`` para os
+    registros arquivados (``linha_ids``: restrição de setor; ``texto``:
+    mesmas palavras da busca ``q``).
+    """
+    condicao, params = _filtro(linha_ids, texto)
+    nomes = {pk: (nome, setor) for pk, nome, setor in LinhaProducao.objects.values_list("pk", "nome", "setor")}
+    with _conexao() as arquivo:
+        if arquivo is None:
+            return
+        cursor = arquivo.execute(
+            f"SELECT dados FROM registros WHERE {condicao} ORDER BY data DESC, turno, id", params
+        )
+        for (blob,) in cursor:
+            dados = _descomprimir(blob)
+            r = dados["registro"]
+            nome, setor = nomes.get(r["linha_id"], (r["linha"], r["setor"]))
+            data = date.fromisoformat(r["data"])
+            if detalhar == "horas":
+                for inicio, fim, produzida, defeituosa in dados["horas"]:
+                    yield (r["id"], nome, setor, data, r["turno"], time.fromisoformat(inicio),
+                           time.fromisoformat(fim), produzida, defeituosa)
+            elif detalhar == "paradas":
+                for inicio, fim, duracao, motivo, _, descricao in dados["paradas"]:
+                    yield (r["id"], nome, setor, data, r["turno"], time.fromisoformat(inicio),
+                           time.fromisoformat(fim), duracao, descricao, motivo)
+            else:
+                yield (r["id"], nome, setor, data, r["turno"], r["quantidade_produzida"],
+                       r["quantidade_defeituosa"], r["tempo_parado"], True, _momento(r["finalizada_em"]),
+                       r["motivo_parada"])
+
+
+# -----------------------
+# Restauração
+# -----------------------
+class ConflitoRestauracao(Exception):
+    """Já existe um registro quente com a mesma (linha, data, turno) de um arquivado."""
+
+    def __init__(self, chaves):
+        self.chaves = sorted(chaves)
+        super().__init__(
+            "Já existe registro nas tabelas quentes para "
+            + ", ".join(f"linha {l} em {d:%d/%m/%Y} turno {t}" for l, d, t in self.chaves)
+        )
+
+
+def restaurar(ids=None, de=None, ate=None, linha_ids=None):
+    """
+    Devolve às tabelas quentes os registros arquivados que casam com o
+    filtro (finalizados, como foram arquivados; os consolidados já os
+    incluem). Sai do arquivo depois do commit. Retorna quantos voltaram.
+
+    Levanta ConflitoRestauracao, sem restaurar nada, se alguma chave
+    (linha, data, turno) já tiver um registro quente.
+    """
+    condicao, params = _filtro(linha_ids=linha_ids, de=de, ate=ate, ids=ids)
+    with _conexao() as arquivo:
+        if arquivo is None:
+            return 0
+        documentos = [
+            (pk, _descomprimir(blob))
+            for pk, blob in arquivo.execute(f"SELECT id, dados FROM registros WHERE {condicao}", params)
+        ]
+    if not documentos:
+        return 0
+
+    chaves = {
+        (d["registro"]["linha_id"], date.fromisoformat(d["registro"]["data"]), d["registro"]["turno"])
+        for _, d in documentos
+    }
+    quentes = set(
+        RegistroProducao.objects.filter(
+            linha_id__in={c[0] for c in chaves}, data__in={c[1] for c in chaves}
+        ).values_list("linha_id", "data", "turno")
+    )
+    if quentes & chaves:
+        raise ConflitoRestauracao(quentes & chaves)
+
+    ops = connection.ops
+    tabela = RegistroProducao._meta
+    colunas = [tabela.get_field(c).column for c in _CAMPOS_REGISTRO]
+    # INSERT direto: bulk_create regravaria criado_em (auto_now_add)
+    sql = (
+        f"INSERT INTO {ops.quote_name(tabela.db_table)} ({', '.join(ops.quote_name(c) for c in colunas)}, "
+        f"{ops.quote_name('finalizada')}) VALUES ({', '.join(['%s'] * (len(colunas) + 1))})"
+    )
+    # motivo excluído do catálogo depois do arquivamento: fica só o texto livre
+    motivos = set(MotivoParada.objects.filter(
+        pk__in={p[4] for _, d in documentos for p in d["paradas"] if p[4]}
+    ).values_list("pk", flat=True))
+    registros, horas, paradas = [], [], []
+    for pk, dados in documentos:
+        registro = _registro(dados)
+        registros.append([
+            *(
+                ops.adapt_datetimefield_value(valor) if isinstance(valor, datetime)
+                else ops.adapt_datefield_value(valor) if isinstance(valor, date)
+                else valor
+                for valor in (getattr(registro, c) for c in _CAMPOS_REGISTRO)
+            ),
+            True,
+        ])
+        horas += registro.horas_arquivadas
+        for parada in registro.paradas_arquivadas:
+            padrao, parada.motivo_padrao = parada.motivo_padrao, None
+            if padrao and padrao.pk in motivos:
+                parada.motivo_padrao_id = padrao.pk
+            elif padrao and not parada.motivo:
+                parada.motivo = padrao.descricao
+            paradas.append(parada)
+
+    restaurados = [pk for pk, _ in documentos]
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for i in range(0, len(registros), TAMANHO_LOTE):
+                    cursor.executemany(sql, registros[i:i + TAMANHO_LOTE])
+            RegistroHora.objects.bulk_create(horas, batch_size=TAMANHO_LOTE)
+            Parada.objects.bulk_create(paradas, batch_size=TAMANHO_LOTE)
+            obter_backend().indexar(restaurados)
+            marcar_alteracao(registro_ids=restaurados)
+            transaction.on_commit(lambda: _remover(restaurados))
+    except IntegrityError as exc:
+        # outra transação criou uma dessas chaves depois da verificação acima
+        raise ConflitoRestauracao(chaves) from exc
+    return len(restaurados)
+
+
+def _remover(ids):
+    with _conexao() as arquivo:
+        for i in range(0, len(ids), TAMANHO_LOTE):
+            lote = ids[i:i + TAMANHO_LOTE]
+            arquivo.execute(f"DELETE FROM registros WHERE id IN ({', '.join('?' * len(lote))})", lote)
@@ -0,0 +1,212 @@
+# sgpi/busca.py
+"""
+Busca textual nos registros de produção (linha, setor e motivos de parada).
+
+O backend é plugável via ``SGPI_BUSCA_BACKEND`` (caminho da classe). Sem a
+configuração, no SQLite com a tabela ``sgpi_busca`` (FTS5, criada pela
+migração 0012) usa ``BuscaFTS5``; nos demais casos ``BuscaSimples``, que
+faz icontains como antes.
+
+No FTS5 cada RegistroProducao é um documento (rowid = id do registro) com
+o nome e o setor da linha e os motivos (``motivo_parada`` + ``motivo`` de
+todas as paradas). O índice é mantido pelos sinais (sgpi/signals.py): o
+registro na mesma transação da gravação; as paradas com
+``indexar_no_commit``, uma reindexação por registro no commit por mais
+paradas que o formset grave. ``manage.py reconstruir_busca`` refaz tudo.
+Cada palavra digitada vira um prefixo (``vaz`` acha "vazamento"), acentos
+são ignorados e o resultado é ordenado por bm25.
+"""
+import re
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import LinhaProducao, Parada, RegistroProducao
+
+TABELA = "sgpi_busca"
+# pesos do bm25 por coluna: linha, setor, motivos
+PESOS = (4.0, 2.0, 1.0)
+
+_disponivel = {}
+_estado = threading.local()
+
+
+def termos(texto):
+    return re.findall(r"\w+", (texto or "").lower())
+
+
+class BuscaSimples:
+    """icontains nos campos; não mantém índice."""
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+
+    def indexar(self, registro_ids):
+        pass
+
+    def indexar_linha(self, linha_id):
+        pass
+
+    def remover(self, registro_ids):
+        pass
+
+    def reconstruir(self):
+        return 0
+
+    def filtrar(self, registros, texto):
+        filtro = Q()
+        for termo in termos(texto):
+            filtro &= (
+                Q(linha__nome__icontains=termo)
+                | Q(linha__setor__icontains=termo)
+                | Q(motivo_parada__icontains=termo)
+                | Q(pk__in=Parada.objects.filter(motivo__icontains=termo).values("registro_id"))
+            )
+        return registros.filter(filtro) if filtro else registros.none()
+
+    def buscar(self, registros, texto, limite=20):
+        """Lista de (registro, relevância, trecho), mais relevantes primeiro."""
+        encontrados = self.filtrar(registros, texto).select_related("linha").order_by("-data", "turno", "pk")
+        return [(registro, None, "") for registro in encontrados[:limite]]
+
+
+class BuscaFTS5(BuscaSimples):
+    @classmethod
+    def disponivel(cls, using=DEFAULT_DB_ALIAS):
+        if using not in _disponivel:
+            connection = connections[using]
+            _disponivel[using] = (
+                connection.vendor == "sqlite"
+                and TABELA in connection.introspection.table_names()
+            )
+        return _disponivel[using]
+
+    # -----------------------
+    # índice
+    # -----------------------
+    def _executar(self, sql, params=()):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def _reindexar(self, condicao, params):
+        registro = RegistroProducao._meta.db_table
+        linha = LinhaProducao._meta.db_table
+        parada = Parada._meta.db_table
+        self._executar(
+            f"DELETE FROM {TABELA} WHERE rowid IN (SELECT r.id FROM {registro} r WHERE {condicao})",
+            params,
+        )
+        self._executar(
+            f"""
+            INSERT INTO {TABELA} (rowid, linha, setor, motivos)
+            SELECT r.id, l.nome, COALESCE(l.setor, ''),
+                   COALESCE(r.motivo_parada, '') || ' ' || COALESCE(
+                       (SELECT group_concat(p.motivo, ' ') FROM {parada} p WHERE p.registro_id = r.id), ''
+                   )
+            FROM {registro} r JOIN {linha} l ON l.id = r.linha_id
+            WHERE {condicao}
+            """,
+            params,
+        )
+
+    def indexar(self, registro_ids):
+        ids = sorted({pk for pk in registro_ids if pk is not None})
+        # limite de variáveis do SQLite
+        for i in range(0, len(ids), 500):
+            lote = ids[i:i + 500]
+            self._reindexar(f"r.id IN ({', '.join(['%s'] * len(lote))})", lote)
+
+    def indexar_linha(self, linha_id):
+        self._reindexar("r.linha_id = %s", [linha_id])
+
+    def remover(self, registro_ids):
+        ids = sorted({pk for pk in registro_ids if pk is not None})
+        for i in range(0, len(ids), 500):
+            lote = ids[i:i + 500]
+            self._executar(f"DELETE FROM {TABELA} WHERE rowid IN ({', '.join(['%s'] * len(lote))})", lote)
+
+    def reconstruir(self):
+        self._executar(f"DELETE FROM {TABELA}")
+        self._reindexar("1 = 1", [])
+        self._executar(f"INSERT INTO {TABELA} ({TABELA}) VALUES ('optimize')")
+        return RegistroProducao.objects.using(self.using).count()
+
+    # -----------------------
+    # consulta
+    # -----------------------
+    @staticmethod
+    def consulta(texto):
+        """Texto livre -> expressão MATCH (todas as palavras, como prefixo)."""
+        return " ".join('"{}"*'.format(t.replace('"', '""')) for t in termos(texto))
+
+    def filtrar(self, registros, texto):
+        consulta = self.consulta(texto)
+        if not consulta:
+            return registros.none()
+        return registros.filter(
+            pk__in=RawSQL(f"SELECT rowid FROM {TABELA} WHERE {TABELA} MATCH %s", [consulta])
+        )
+
+    def buscar(self, registros, texto, limite=20):
+        consulta = self.consulta(texto)
+        if not consulta:
+            return []
+        pesos = ", ".join(str(p) for p in PESOS)
+        sql = (
+            f"SELECT rowid, bm25({TABELA}, {pesos}), snippet({TABELA}, 2, '[', ']', '…', 12) "
+            f"FROM {TABELA} WHERE {TABELA} MATCH %s ORDER BY 2"
+        )
+        # o recorte por setor/permissão vem de ``registros``; lê o ranking em blocos
+        # até completar o limite
+        resultado = []
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(sql, [consulta])
+            while len(resultado) < limite:
+                bloco = cursor.fetchmany(max(limite * 4, 100))
+                if not bloco:
+                    break
+                objetos = registros.select_related("linha").in_bulk([linha[0] for linha in bloco])
+                for pk, relevancia, trecho in bloco:
+                    if pk in objetos:
+                        resultado.append((objetos[pk], -relevancia, trecho))
+        return resultado[:limite]
+
+
+def obter_backend(using=DEFAULT_DB_ALIAS):
+    caminho = getattr(settings, "SGPI_BUSCA_BACKEND", None)
+    if caminho:
+        return import_string(caminho)(using)
+    return BuscaFTS5(using) if BuscaFTS5.disponivel(using) else BuscaSimples(using)
+
+
+def indexar_no_commit(registro_id, using=DEFAULT_DB_ALIAS):
+    """
+    Reindexa o registro depois do commit, juntando os ids da transação como
+    ``recalculo.marcar_para_recalculo``: N paradas do mesmo registro viram
+    uma reindexação. Fora de um bloco atomic roda na hora.
+    """
+    if registro_id is None:
+        return
+    if not hasattr(_estado, "pendentes"):
+        _estado.pendentes = {}
+    pendentes = _estado.pendentes
+
+    atual = pendentes.get(using)
+    # callbacks de savepoints/transações desfeitos somem de run_on_commit
+    if atual and any(item[1] is atual[1] for item in connections[using].run_on_commit):
+        atual[0].add(registro_id)
+        return
+
+    ids = {registro_id}
+
+    def _executar():
+        if pendentes.get(using, (None, None))[1] is _executar:
+            del pendentes[using]
+        obter_backend(using).indexar(ids)
+
+    pendentes[using] = (ids, _executar)
+    transaction.on_commit(_executar, using=using)
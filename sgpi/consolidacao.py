@@ -0,0 +1,188 @@
+# sgpi/consolidacao.py
+"""
+Manutenção dos consolidados ProducaoDiaria (linha, dia) e ProducaoMensal
+(linha, mês).
+
+Só entram registros finalizados: ``finalizar`` soma os totais do registro
+e ``reabrir`` subtrai, sempre com UPDATE ... SET campo = campo + delta, de
+modo que painéis e relatórios leem algumas centenas de linhas em vez de
+varrer RegistroProducao. ``manage.py reconstruir_consolidados`` refaz tudo
+a partir dos registros (carga inicial ou correção).
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+
+from .models import ProducaoDiaria, ProducaoMensal
+from .oee import MINUTOS_TURNO
+
+CAMPOS = ("quantidade_produzida", "quantidade_defeituosa", "tempo_parado", "minutos_planejados", "registros")
+
+
+def _totais(qs, *agrupamento):
+    return (
+        qs.order_by()
+        .values(*agrupamento)
+        .annotate(
+            quantidade_produzida=Sum("quantidade_produzida"),
+            quantidade_defeituosa=Sum("quantidade_defeituosa"),
+            tempo_parado=Sum("tempo_parado"),
+            registros=Count("id"),
+        )
+    )
+
+
+def _acumular(model, chave, setor, valores):
+    atualizados = model.objects.filter(**chave).update(
+        setor=setor, **{campo: F(campo) + valor for campo, valor in valores.items()}
+    )
+    if atualizados or any(v < 0 for v in valores.values()):
+        # subtração sem linha consolidada: não há o que desfazer
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(setor=setor, **chave, **valores)
+    except IntegrityError:
+        # outra transação criou a mesma linha nesse meio-tempo
+        model.objects.filter(**chave).update(
+            **{campo: F(campo) + valor for campo, valor in valores.items()}
+        )
+
+
+def _aplicar(model, periodo, grupos, setores, sinal, correlacionados):
+    """
+    ``grupos``: (linha_id, período) -> valores. Um UPDATE para todas as
+    linhas consolidadas que já existem (cada uma soma os seus registros
+    por subconsulta correlacionada) e um INSERT em lote para as que faltam.
+    """
+    alvo = model.objects.filter(
+        linha_id__in={linha for linha, _ in grupos}, **{f"{periodo}__in": {p for _, p in grupos}}
+    )
+    existentes = set(alvo.values_list("linha_id", periodo))
+
+    if existentes:
+        def _soma(expressao):
+            return Coalesce(
+                Subquery(correlacionados.values("linha_id").annotate(total=expressao).values("total")),
+                Value(0),
+                output_field=IntegerField(),
+            )
+
+        quantidade = _soma(Count("id"))
+        alvo.update(
+            quantidade_produzida=F("quantidade_produzida") + sinal * _soma(Sum("quantidade_produzida")),
+            quantidade_defeituosa=F("quantidade_defeituosa") + sinal * _soma(Sum("quantidade_defeituosa")),
+            tempo_parado=F("tempo_parado") + sinal * _soma(Sum("tempo_parado")),
+            minutos_planejados=F("minutos_planejados") + sinal * MINUTOS_TURNO * quantidade,
+            registros=F("registros") + sinal * quantidade,
+        )
+
+    faltando = [chave for chave in grupos if chave not in existentes]
+    if not faltando or sinal < 0:
+        # subtração sem linha consolidada: não há o que desfazer
+        return
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create([
+                model(linha_id=linha, setor=setores[linha], **{periodo: p}, **grupos[(linha, p)])
+                for linha, p in faltando
+            ])
+    except IntegrityError:
+        # outra transação criou alguma dessas linhas nesse meio-tempo
+        for linha, p in faltando:
+            _acumular(model, {"linha_id": linha, periodo: p}, setores[linha], grupos[(linha, p)])
+
+
+@transaction.atomic
+def aplicar_registros(registros, sinal=1):
+    """
+    Soma (``sinal=1``) ou subtrai (``sinal=-1``) os totais atuais dos
+    ``registros`` (queryset de RegistroProducao) nos consolidados.
+
+    O número de consultas não depende de quantos registros ou dias entram:
+    uma leitura agrupada e, para diário e mensal, leitura das chaves
+    existentes + um UPDATE + um INSERT em lote.
+    """
+    registros = registros.order_by()
+    por_dia = {}
+    por_mes = defaultdict(lambda: dict.fromkeys(CAMPOS, 0))
+    setores = {}
+
+    for grupo in _totais(registros, "linha_id", "linha__setor", "data"):
+        valores = {
+            "quantidade_produzida": grupo["quantidade_produzida"],
+            "quantidade_defeituosa": grupo["quantidade_defeituosa"],
+            "tempo_parado": grupo["tempo_parado"],
+            "minutos_planejados": grupo["registros"] * MINUTOS_TURNO,
+            "registros": grupo["registros"],
+        }
+        por_dia[(grupo["linha_id"], grupo["data"])] = valores
+        for campo, valor in valores.items():
+            por_mes[(grupo["linha_id"], grupo["data"].replace(day=1))][campo] += valor
+        setores[grupo["linha_id"]] = grupo["linha__setor"]
+
+    if not por_dia:
+        return
+    _aplicar(
+        ProducaoDiaria, "dia", por_dia, setores, sinal,
+        registros.filter(linha_id=OuterRef("linha_id"), data=OuterRef("dia")),
+    )
+    _aplicar(
+        ProducaoMensal, "mes", por_mes, setores, sinal,
+        registros.annotate(mes_registro=TruncMonth("data"))
+        .filter(linha_id=OuterRef("linha_id"), mes_registro=OuterRef("mes")),
+    )
+
+
+@transaction.atomic
+def reconstruir(registros, data_inicio=None, data_fim=None, tamanho_lote=2000):
+    """
+    Apaga e recria os consolidados do período a partir dos registros
+    finalizados. O período é ampliado para meses inteiros, já que o
+    consolidado mensal não pode ser refeito pela metade.
+    """
+    if data_inicio:
+        data_inicio = data_inicio.replace(day=1)
+    if data_fim:
+        proximo_mes = (data_fim.replace(day=28) + timedelta(days=4)).replace(day=1)
+        data_fim = proximo_mes - timedelta(days=1)
+
+    finalizados = registros.filter(finalizada=True)
+    diarios = ProducaoDiaria.objects.all()
+    mensais = ProducaoMensal.objects.all()
+    if data_inicio:
+        finalizados = finalizados.filter(data__gte=data_inicio)
+        diarios = diarios.filter(dia__gte=data_inicio)
+        mensais = mensais.filter(mes__gte=data_inicio)
+    if data_fim:
+        finalizados = finalizados.filter(data__lte=data_fim)
+        diarios = diarios.filter(dia__lte=data_fim)
+        mensais = mensais.filter(mes__lte=data_fim)
+    diarios.delete()
+    mensais.delete()
+
+    def _linha(model, grupo, **periodo):
+        return model(
+            linha_id=grupo["linha_id"],
+            setor=grupo["linha__setor"],
+            quantidade_produzida=grupo["quantidade_produzida"],
+            quantidade_defeituosa=grupo["quantidade_defeituosa"],
+            tempo_parado=grupo["tempo_parado"],
+            minutos_planejados=grupo["registros"] * MINUTOS_TURNO,
+            registros=grupo["registros"],
+            **periodo,
+        )
+
+    criados_dia = ProducaoDiaria.objects.bulk_create(
+        [_linha(ProducaoDiaria, g, dia=g["data"]) for g in _totais(finalizados, "linha_id", "linha__setor", "data")],
+        batch_size=tamanho_lote,
+    )
+    por_mes = _totais(finalizados.annotate(mes=TruncMonth("data")), "linha_id", "linha__setor", "mes")
+    criados_mes = ProducaoMensal.objects.bulk_create(
+        [_linha(ProducaoMensal, g, mes=g["mes"]) for g in por_mes],
+        batch_size=tamanho_lote,
+    )
+    return len(criados_dia), len(criados_mes)
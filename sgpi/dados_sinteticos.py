@@ -0,0 +1,203 @@
+# sgpi/dados_sinteticos.py
+"""
+Geração rápida de dados sintéticos para benchmarks.
+
+Os registros são inseridos com executemany direto na tabela (sem instanciar
+modelos nem disparar sinais), o que permite gerar milhões de linhas em
+poucos segundos no SQLite.
+"""
+import random
+from datetime import date, datetime, time, timedelta
+
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import LinhaProducao, MotivoParada, Parada, RegistroHora, RegistroProducao, normalizar_motivo
+from .painel import marcar_alteracao
+from .turnos import horario as turnos_horario
+
+TAMANHO_LOTE = 10_000
+
+
+def _insert_sql(model, campos):
+    ops = connection.ops
+    meta = model._meta
+    colunas = ", ".join(ops.quote_name(meta.get_field(c).column) for c in campos)
+    valores = ", ".join(["%s"] * len(campos))
+    return f"INSERT INTO {ops.quote_name(meta.db_table)} ({colunas}) VALUES ({valores})"
+
+
+def _inserir(model, campos, linhas):
+    sql = _insert_sql(model, campos)
+    with connection.cursor() as cursor:
+        lote = []
+        for linha in linhas:
+            lote.append(linha)
+            if len(lote) >= TAMANHO_LOTE:
+                cursor.executemany(sql, lote)
+                lote = []
+        if lote:
+            cursor.executemany(sql, lote)
+
+
+def gerar_linhas(quantidade, setores, seed=None, prefixo="Linha"):
+    rnd = random.Random(seed)
+    linhas = [
+        LinhaProducao(
+            nome=f"{prefixo} {i + 1:03d}",
+            setor=f"Setor {i % setores + 1:02d}",
+            capacidade_nominal=rnd.randint(50, 500),
+        )
+        for i in range(quantidade)
+    ]
+    LinhaProducao.objects.bulk_create(linhas)
+    return list(LinhaProducao.objects.filter(nome__startswith=f"{prefixo} ").order_by("pk"))
+
+
+MOTIVOS = [
+    "Falta de material", "Troca de ferramenta", "Setup de produto", "Manutenção corretiva",
+    "Quebra de correia", "Vazamento na válvula", "Falta de operador", "Limpeza programada",
+    "Ajuste de máquina", "Queda de energia",
+]
+
+
+def gerar_motivos():
+    """Catálogo de motivos de parada usado pelos dados sintéticos (pk por descrição)."""
+    for descricao in MOTIVOS:
+        MotivoParada.objects.get_or_create(chave=normalizar_motivo(descricao), defaults={"descricao": descricao})
+    return dict(
+        MotivoParada.objects.filter(chave__in=[normalizar_motivo(d) for d in MOTIVOS])
+        .values_list("descricao", "pk")
+    )
+
+
+class _Lotes:
+    """
+    Acumula linhas por tabela e grava com executemany a cada TAMANHO_LOTE.
+    As tabelas são gravadas na ordem em que apareceram (pais antes dos filhos).
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.sql = {}
+        self.pendentes = {}
+        self.contagem = {}
+
+    def adicionar(self, model, campos, linha):
+        if model not in self.sql:
+            self.sql[model] = _insert_sql(model, campos)
+            self.pendentes[model] = []
+            self.contagem[model] = 0
+        self.pendentes[model].append(linha)
+        self.contagem[model] += 1
+        if len(self.pendentes[model]) >= TAMANHO_LOTE:
+            self.gravar(model)
+
+    def gravar(self, model=None):
+        ordem = list(self.pendentes)
+        for m in ordem[:ordem.index(model) + 1] if model else ordem:
+            if self.pendentes[m]:
+                self.cursor.executemany(self.sql[m], self.pendentes[m])
+                self.pendentes[m] = []
+
+
+CAMPOS_REGISTRO = [
+    "id", "linha", "data", "turno", "quantidade_produzida", "quantidade_defeituosa",
+    "tempo_parado", "criado_em", "atualizado_em", "finalizada", "finalizada_em",
+]
+CAMPOS_HORA = ["registro", "hora_inicio", "hora_fim", "quantidade_produzida", "quantidade_defeituosa"]
+CAMPOS_PARADA = ["registro", "hora_inicio", "hora_fim", "duracao", "motivo", "motivo_padrao"]
+
+
+def _horas_do_turno(turno, horario):
+    inicio, fim = horario[turno]
+    base = datetime.combine(date.min, inicio)
+    duracao = (datetime.combine(date.min, fim) - base) % timedelta(days=1) or timedelta(days=1)
+    return [(base + timedelta(hours=h)).time() for h in range(int(duracao.total_seconds() // 3600))]
+
+
+def _hora_seguinte(valor, ops):
+    h = time.fromisoformat(valor) if isinstance(valor, str) else valor
+    return ops.adapt_timefield_value(time((h.hour + 1) % 24, h.minute))
+
+
+def gerar_registros(linhas, total, seed=None, fim=None, horas_desde=None, max_paradas=3):
+    """
+    Gera ``total`` RegistroProducao distribuídos por linha x dia x turno,
+    terminando em ``fim`` (hoje por padrão). Retorna (data_inicial, data_final).
+
+    Com ``horas_desde`` (data), os registros a partir dela ganham as horas do
+    turno (RegistroHora) e até ``max_paradas`` paradas, com os totais do
+    registro batendo com a soma dos filhos; os mais antigos ficam só com os
+    totais. Registros até anteontem saem finalizados.
+    """
+    rnd = random.Random(seed)
+    turnos = [t for t, _ in RegistroProducao.TURNO_CHOICES]
+    por_dia = len(linhas) * len(turnos)
+    dias = -(-total // por_dia)
+    fim = fim or timezone.localdate()
+    inicio = fim - timedelta(days=dias - 1)
+    ops = connection.ops
+    agora = ops.adapt_datetimefield_value(timezone.now())
+    abertos_desde = timezone.localdate() - timedelta(days=1)
+
+    horario = turnos_horario()
+    horas_turno = {t: [ops.adapt_timefield_value(h) for h in _horas_do_turno(t, horario)] for t in turnos}
+    inicio_turno = {t: datetime.combine(date.min, horario[t][0]) for t in turnos}
+    motivos = list(gerar_motivos().items()) if horas_desde is not None and max_paradas else []
+    proximo_id = (RegistroProducao.objects.aggregate(m=Max("pk"))["m"] or 0) + 1
+
+    with connection.cursor() as cursor:
+        lotes = _Lotes(cursor)
+        gerados = 0
+        for d in range(dias):
+            dia = inicio + timedelta(days=d)
+            dia_sql = ops.adapt_datefield_value(dia)
+            finalizada = dia < abertos_desde
+            detalhar = horas_desde is not None and dia >= horas_desde
+            for linha in linhas:
+                for turno in turnos:
+                    if gerados >= total:
+                        break
+                    registro_id = proximo_id + gerados
+                    gerados += 1
+                    horas, paradas = [], []
+                    if not detalhar:
+                        produzida = rnd.randint(0, linha.capacidade_nominal * 8)
+                        defeituosa = rnd.randint(0, produzida // 20)
+                        parado = rnd.randint(0, 90)
+                    else:
+                        produzida = defeituosa = parado = 0
+                        for h in horas_turno[turno]:
+                            p = rnd.randint(linha.capacidade_nominal // 2, linha.capacidade_nominal)
+                            x = rnd.randint(0, p // 25)
+                            produzida += p
+                            defeituosa += x
+                            horas.append((registro_id, h, _hora_seguinte(h, ops), p, x))
+                        for hora in rnd.sample(range(len(horas_turno[turno])), rnd.randint(0, max_paradas)):
+                            comeco = inicio_turno[turno] + timedelta(hours=hora, minutes=rnd.randint(0, 40))
+                            duracao = rnd.randint(5, 20)
+                            descricao, motivo_id = rnd.choice(motivos)
+                            parado += duracao
+                            paradas.append((
+                                registro_id,
+                                ops.adapt_timefield_value(comeco.time()),
+                                ops.adapt_timefield_value((comeco + timedelta(minutes=duracao)).time()),
+                                duracao, descricao, motivo_id,
+                            ))
+                    lotes.adicionar(RegistroProducao, CAMPOS_REGISTRO, (
+                        registro_id, linha.pk, dia_sql, turno, produzida, defeituosa, parado,
+                        agora, agora, finalizada, agora if finalizada else None,
+                    ))
+                    for hora in horas:
+                        lotes.adicionar(RegistroHora, CAMPOS_HORA, hora)
+                    for parada in paradas:
+                        lotes.adicionar(Parada, CAMPOS_PARADA, parada)
+        lotes.gravar()
+        # PostgreSQL: a sequência do id não viu os ids explícitos
+        for sql in ops.sequence_reset_sql(no_style(), [RegistroProducao]):
+            cursor.execute(sql)
+    marcar_alteracao(linha_ids=[linha.pk for linha in linhas])
+    return inicio, fim
@@ -0,0 +1,102 @@
+# sgpi/exportacao.py
+"""
+Exportação em streaming (CSV/JSONL) dos registros de produção.
+
+As linhas saem direto do cursor com values_list().iterator(chunk_size=...),
+sem instanciar modelos nem acumular a resposta: a memória fica constante
+para 100 ou 10 milhões de linhas.
+"""
+import csv
+import json
+from itertools import chain
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Parada, RegistroHora
+
+TAMANHO_BLOCO = 2000
+FORMATOS = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson"}
+
+# (coluna exportada, campo do values_list)
+_REGISTRO = [
+    ("id", "pk"),
+    ("linha", "linha__nome"),
+    ("setor", "linha__setor"),
+    ("data", "data"),
+    ("turno", "turno"),
+    ("quantidade_produzida", "quantidade_produzida"),
+    ("quantidade_defeituosa", "quantidade_defeituosa"),
+    ("tempo_parado", "tempo_parado"),
+    ("finalizada", "finalizada"),
+    ("finalizada_em", "finalizada_em"),
+    ("motivo_parada", "motivo_parada"),
+]
+_PAI = [
+    ("registro_id", "registro_id"),
+    ("linha", "registro__linha__nome"),
+    ("setor", "registro__linha__setor"),
+    ("data", "registro__data"),
+    ("turno", "registro__turno"),
+]
+_HORA = _PAI + [
+    ("hora_inicio", "hora_inicio"),
+    ("hora_fim", "hora_fim"),
+    ("quantidade_produzida", "quantidade_produzida"),
+    ("quantidade_defeituosa", "quantidade_defeituosa"),
+]
+_PARADA = _PAI + [
+    ("hora_inicio", "hora_inicio"),
+    ("hora_fim", "hora_fim"),
+    ("duracao", "duracao"),
+    ("motivo_padrao", "motivo_padrao__descricao"),
+    ("motivo", "motivo"),
+]
+DETALHAMENTOS = ("", "horas", "paradas")
+
+
+def _linhas(registros, detalhar, extras=()):
+    """
+    Retorna (cabeçalho, iterador de tuplas) para o detalhamento pedido;
+    ``extras`` (tuplas nas mesmas colunas, ex.: do arquivo frio) vêm no final.
+    """
+    if detalhar == "horas":
+        colunas = _HORA
+        qs = RegistroHora.objects.filter(registro__in=registros.values("pk")).order_by(
+            "-registro__data", "registro__turno", "registro_id", "hora_inicio"
+        )
+    elif detalhar == "paradas":
+        colunas = _PARADA
+        qs = Parada.objects.filter(registro__in=registros.values("pk")).order_by(
+            "-registro__data", "registro__turno", "registro_id", "hora_inicio"
+        )
+    else:
+        colunas = _REGISTRO
+        qs = registros.order_by("-data", "turno", "pk")
+
+    cabecalho = [nome for nome, _ in colunas]
+    valores = qs.values_list(*(campo for _, campo in colunas)).iterator(chunk_size=TAMANHO_BLOCO)
+    return cabecalho, chain(valores, extras)
+
+
+class _Eco:
+    """Pseudo-arquivo para o csv.writer devolver a linha em vez de gravá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+def gerar_csv(registros, detalhar="", extras=()):
+    cabecalho, valores = _linhas(registros, detalhar, extras)
+    writer = csv.writer(_Eco())
+    yield "\ufeff" + writer.writerow(cabecalho)  # BOM para o Excel abrir em UTF-8
+    for linha in valores:
+        yield writer.writerow(linha)
+
+
+def gerar_jsonl(registros, detalhar="", extras=()):
+    cabecalho, valores = _linhas(registros, detalhar, extras)
+    for linha in valores:
+        yield json.dumps(dict(zip(cabecalho, linha)), cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+
+GERADORES = {"csv": gerar_csv, "jsonl": gerar_jsonl}
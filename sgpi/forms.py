@@ -1,19 +1,24 @@
 # sgpi/forms.py
 from django import forms
-from django.forms import inlineformset_factory
+from django.forms import BaseInlineFormSet, inlineformset_factory
+from django.utils.functional import cached_property
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.db.models import Q
 
 from .models import (
     LinhaProducao,
     RegistroProducao,
     RegistroHora,
     Parada,
+    MotivoParada,
     PermissaoSetorUsuario,   
 )
+from . import arquivo, intervalos
+from .permissoes import setores_permitidos
 
 # -----------------------
 # Linhas
@@ -33,10 +38,10 @@ class RegistroProducaoForm(forms.ModelForm):
     """
     class Meta:
         model = RegistroProducao
-        fields = ["linha", "data", "turno", "finalizada"]
+        # finalizada só muda por finalizar()/reabrir(), que mantêm os consolidados
+        fields = ["linha", "data", "turno"]
         widgets = {
             "data": forms.DateInput(attrs={"type": "date"}),
-            "finalizada": forms.HiddenInput(),
         }
 
     def __init__(self, *args, user=None, **kwargs):
@@ -44,10 +49,7 @@ class RegistroProducaoForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
 
         if user and user.is_authenticated and not user.is_superuser:
-            setores = list(
-                PermissaoSetorUsuario.objects.filter(usuario=user)
-                .values_list("setor", flat=True)
-            )
+            setores = setores_permitidos(user)
             # filtra linhas pelos setores permitidos
             self.fields["linha"].queryset = self.fields["linha"].queryset.filter(setor__in=setores)
 
@@ -56,20 +58,124 @@ class RegistroProducaoForm(forms.ModelForm):
         data = cleaned.get("data")
         linha = cleaned.get("linha")
 
+        if self.instance.pk and self.instance.finalizada:
+            raise ValidationError("Registro finalizado — reabra o registro antes de editar.")
         if data and data > timezone.now().date():
             raise ValidationError("A data do registro não pode ser no futuro.")
+        turno = cleaned.get("turno")
+        if linha and data and turno and arquivo.existe(linha.pk, data, turno):
+            raise ValidationError(
+                "Já existe um registro arquivado para esta linha, data e turno; reabra-o pelos detalhes."
+            )
 
         user = getattr(self, "user", None)
         if user and user.is_authenticated and not user.is_superuser:
             if not linha:
                 raise ValidationError("Selecione uma linha válida.")
             # valida setor permitido
-            setor = linha.setor
-            ok = PermissaoSetorUsuario.objects.filter(usuario=user, setor=setor).exists()
-            if not ok:
+            if linha.setor not in setores_permitidos(user):
                 raise ValidationError("Você não tem permissão para registrar neste setor.")
         return cleaned
 
+# -----------------------
+# Relatórios
+# -----------------------
+class FiltroOEEForm(forms.Form):
+    data_inicio = forms.DateField(
+        label="De", required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
+    data_fim = forms.DateField(
+        label="Até", required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
+    agrupar_por = forms.ChoiceField(
+        label="Agrupar por",
+        choices=[("linha", "Linha"), ("dia", "Linha e dia"), ("turno", "Linha, dia e turno")],
+        required=False,
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        ini = cleaned.get("data_inicio")
+        fim = cleaned.get("data_fim")
+        if ini and fim and ini > fim:
+            raise ValidationError("A data inicial deve ser anterior à data final.")
+        return cleaned
+
+class FiltroParetoForm(forms.Form):
+    data_inicio = forms.DateField(
+        label="De", required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
+    data_fim = forms.DateField(
+        label="Até", required=False, widget=forms.DateInput(attrs={"type": "date"})
+    )
+    agrupar_por = forms.ChoiceField(
+        label="Agrupar por",
+        choices=[("", "Período todo"), ("linha", "Linha"), ("setor", "Setor")],
+        required=False,
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        ini = cleaned.get("data_inicio")
+        fim = cleaned.get("data_fim")
+        if ini and fim and ini > fim:
+            raise ValidationError("A data inicial deve ser anterior à data final.")
+        return cleaned
+
+class ImportacaoProducaoForm(forms.Form):
+    arquivo = forms.FileField(
+        label="Arquivo (CSV ou XLSX)",
+        help_text="Colunas: linha, data, turno, hora_inicio, hora_fim, quantidade_produzida, quantidade_defeituosa",
+    )
+
+    def clean_arquivo(self):
+        arquivo = self.cleaned_data["arquivo"]
+        if not arquivo.name.lower().endswith((".csv", ".txt", ".xlsx")):
+            raise ValidationError("Envie um arquivo .csv ou .xlsx.")
+        return arquivo
+
+# -----------------------
+# API de apontamento (JSON)
+# -----------------------
+class ApontamentoForm(forms.Form):
+    linha = forms.ModelChoiceField(queryset=LinhaProducao.objects.all())
+    data = forms.DateField()
+    turno = forms.CharField(max_length=20)
+    motivo_parada = forms.CharField(required=False)
+    substituir_horas = forms.BooleanField(required=False)
+
+    def clean_turno(self):
+        turno = RegistroProducao.turno_por_codigo(self.cleaned_data["turno"])
+        if turno is None:
+            raise ValidationError("Turno inválido.")
+        return turno
+
+    def clean_data(self):
+        data = self.cleaned_data["data"]
+        if data > timezone.now().date():
+            raise ValidationError("A data do registro não pode ser no futuro.")
+        return data
+
+
+class HoraApontamentoForm(forms.Form):
+    hora_inicio = forms.TimeField()
+    hora_fim = forms.TimeField()
+    quantidade_produzida = forms.IntegerField(min_value=0)
+    quantidade_defeituosa = forms.IntegerField(min_value=0, required=False)
+
+    def clean(self):
+        cleaned = super().clean()
+        hi = cleaned.get("hora_inicio")
+        hf = cleaned.get("hora_fim")
+        qtd = cleaned.get("quantidade_produzida")
+        defe = cleaned.get("quantidade_defeituosa") or 0
+        cleaned["quantidade_defeituosa"] = defe
+        if hi and hf and hi == hf:
+            raise ValidationError("A hora final deve ser diferente da hora inicial.")
+        if qtd is not None and defe > qtd:
+            raise ValidationError("Quantidade defeituosa não pode ser maior que a produzida.")
+        return cleaned
+
 # -----------------------
 # Filhos
 # -----------------------
@@ -95,16 +201,46 @@ class RegistroHoraForm(forms.ModelForm):
             raise ValidationError("Quantidade defeituosa não pode ser maior que a produzida.")
         return cleaned
 
+class MotivoParadaField(forms.ModelChoiceField):
+    """Com ``carregados`` (pk -> motivo) valida sem ir ao banco."""
+
+    carregados = None
+
+    def to_python(self, value):
+        if self.carregados is not None and value not in self.empty_values:
+            try:
+                return self.carregados[int(value)]
+            except (KeyError, TypeError, ValueError):
+                raise ValidationError(self.error_messages["invalid_choice"], code="invalid_choice") from None
+        return super().to_python(value)
+
+
 class ParadaForm(forms.ModelForm):
     class Meta:
         model = Parada
-        fields = ["hora_inicio", "hora_fim", "motivo"]
+        fields = ["hora_inicio", "hora_fim", "motivo_padrao", "motivo"]
+        field_classes = {"motivo_padrao": MotivoParadaField}
         widgets = {
             "hora_inicio": forms.TimeInput(attrs={"type": "time"}),
             "hora_fim": forms.TimeInput(attrs={"type": "time"}),
             "motivo": forms.Textarea(attrs={"rows": 2}),
         }
 
+    def __init__(self, *args, motivos=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        campo = self.fields["motivo_padrao"]
+        self.catalogo = None
+        if motivos is None:
+            # motivo desativado continua valendo para as paradas que já o usam
+            campo.queryset = MotivoParada.objects.filter(
+                Q(ativo=True) | Q(pk=self.instance.motivo_padrao_id)
+            )
+        else:
+            # lista carregada uma vez pelo formset
+            campo.carregados = {m.pk: m for m in motivos}
+            campo.choices = [("", campo.empty_label), *((m.pk, campo.label_from_instance(m)) for m in motivos)]
+            self.catalogo = {m.chave: m for m in motivos if m.ativo}
+
     def clean(self):
         cleaned = super().clean()
         hi = cleaned.get("hora_inicio")
@@ -113,21 +249,98 @@ class ParadaForm(forms.ModelForm):
             raise ValidationError("A hora final deve ser diferente da hora inicial.")
         return cleaned
 
+    def save(self, commit=True):
+        if self.catalogo is not None:
+            # texto livre classificado pela lista do formset, sem uma consulta por parada
+            self.instance.classificar_motivo(self.catalogo)
+        return super().save(commit)
+
 # -----------------------
 # Formsets filhos
 # -----------------------
+def _intervalos_do_formset(formset):
+    """Horas dos forms preenchidos e não excluídos, na linha do tempo do turno (sgpi/intervalos.py)."""
+    pares = []
+    for form in formset.forms:
+        dados = getattr(form, "cleaned_data", {})
+        if dados.get("hora_inicio") is None or dados.get("hora_fim") is None:
+            continue
+        if formset.can_delete and formset._should_delete_form(form):
+            continue
+        pares.append((dados["hora_inicio"], dados["hora_fim"], form))
+    return intervalos.normalizar(pares, formset.instance.turno)
+
+
+def _rotulo_form(form):
+    return intervalos.rotulo(form.cleaned_data["hora_inicio"], form.cleaned_data["hora_fim"])
+
+
+def _erros_sobreposicao(varredura, descricao):
+    # um intervalo dividido na virada do turno pode repetir o mesmo par
+    return list(dict.fromkeys(
+        f"{descricao} sobrepostas: {_rotulo_form(a.item)} e {_rotulo_form(b.item)}."
+        for a, b in varredura.sobreposicoes
+    ))
+
+
+class BaseRegistroHoraFormSet(BaseInlineFormSet):
+    def clean(self):
+        super().clean()
+        erros = _erros_sobreposicao(intervalos.varrer(_intervalos_do_formset(self)), "Horas")
+        if erros:
+            raise ValidationError(erros)
+
+
 RegistroHoraFormSet = inlineformset_factory(
     RegistroProducao,
     RegistroHora,
     form=RegistroHoraForm,
+    formset=BaseRegistroHoraFormSet,
     extra=1,
     can_delete=True,
 )
 
+class BaseParadaFormSet(BaseInlineFormSet):
+    """
+    Com ``formset_hora`` (o formset de horas do mesmo POST), cada parada
+    também tem que caber nas horas apontadas, quando houver alguma.
+    """
+
+    def __init__(self, *args, formset_hora=None, **kwargs):
+        self.formset_hora = formset_hora
+        super().__init__(*args, **kwargs)
+
+    def get_form_kwargs(self, index):
+        kwargs = super().get_form_kwargs(index)
+        kwargs["motivos"] = self.motivos
+        return kwargs
+
+    def clean(self):
+        super().clean()
+        paradas = _intervalos_do_formset(self)
+        erros = _erros_sobreposicao(intervalos.varrer(paradas), "Paradas")
+        if self.formset_hora is not None:
+            horas = intervalos.varrer(_intervalos_do_formset(self.formset_hora))
+            if horas.blocos:
+                erros += dict.fromkeys(
+                    f"A parada {_rotulo_form(p.item)} está fora das horas apontadas."
+                    for p in intervalos.fora_dos_blocos(paradas, horas.blocos)
+                )
+        if erros:
+            raise ValidationError(erros)
+
+    @cached_property
+    def motivos(self):
+        # ativos + os que as paradas do registro já usam; sem isso cada form faz a sua consulta
+        usados = {p.motivo_padrao_id for p in self.get_queryset() if p.motivo_padrao_id}
+        return list(MotivoParada.objects.filter(Q(ativo=True) | Q(pk__in=usados)))
+
+
 ParadaFormSet = inlineformset_factory(
     RegistroProducao,
     Parada,
     form=ParadaForm,
+    formset=BaseParadaFormSet,
     extra=1,
     can_delete=True,
 )
@@ -0,0 +1,438 @@
+# sgpi/importacao.py
+"""
+Importação em massa da produção hora a hora (CSV/XLSX vindos do CLP/MES).
+
+O arquivo é lido em streaming e gravado em lotes por INSERT em massa, que
+não dispara os sinais de RegistroHora; os totais de cada RegistroProducao
+afetado são recalculados uma única vez no final. Linhas inválidas não
+interrompem a carga: vão para ``ResultadoImportacao.erros`` e podem ser
+baixadas como CSV.
+
+Colunas esperadas (cabeçalho na primeira linha, em qualquer ordem):
+linha, data, turno, hora_inicio, hora_fim, quantidade_produzida,
+quantidade_defeituosa. ``linha`` aceita o nome ou o id da linha.
+"""
+import csv
+import io
+import itertools
+import os
+import re
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, connections, router, transaction
+from django.utils import timezone
+
+from . import arquivo, intervalos
+from .busca import obter_backend
+from .models import LinhaProducao, RegistroHora, RegistroProducao
+from .painel import marcar_alteracao
+from .recalculo import recalcular_registros
+
+COLUNAS = (
+    "linha", "data", "turno", "hora_inicio", "hora_fim",
+    "quantidade_produzida", "quantidade_defeituosa",
+)
+TAMANHO_LOTE = 5000
+# acima disso os erros só são contados, para o relatório não estourar a memória
+MAX_ERROS = 100_000
+# segundos em que o relatório de erros pode ser baixado
+VALIDADE_RELATORIO = 60 * 60
+
+
+class ErroLinha(ValueError):
+    pass
+
+
+class ResultadoImportacao:
+    def __init__(self):
+        self.lidas = 0
+        self.inseridas = 0
+        self.registros_criados = 0
+        self.registros_afetados = set()
+        self.erros = []
+        self.total_erros = 0
+
+    def adicionar_erro(self, numero, mensagem, valores):
+        self.total_erros += 1
+        if len(self.erros) < MAX_ERROS:
+            self.erros.append((numero, mensagem, valores))
+
+    def relatorio_csv(self):
+        saida = io.StringIO()
+        writer = csv.writer(saida)
+        writer.writerow(["linha_arquivo", "erro", *COLUNAS])
+        for numero, mensagem, valores in self.erros:
+            writer.writerow([numero, mensagem, *(valores.get(c, "") for c in COLUNAS)])
+        if self.total_erros > len(self.erros):
+            writer.writerow(["", f"... mais {self.total_erros - len(self.erros)} erro(s) omitido(s)"])
+        return saida.getvalue()
+
+
+def diretorio_relatorios():
+    padrao = Path(settings.BASE_DIR) / "importacao_erros"
+    return Path(getattr(settings, "SGPI_IMPORTACAO_ERROS_DIR", padrao))
+
+
+def guardar_relatorio(resultado):
+    """Grava o relatório de erros e retorna o token do download."""
+    diretorio = diretorio_relatorios()
+    diretorio.mkdir(parents=True, exist_ok=True)
+    limite = timezone.now().timestamp() - VALIDADE_RELATORIO
+    for antigo in diretorio.glob("*.csv"):
+        try:
+            if antigo.stat().st_mtime < limite:
+                antigo.unlink()
+        except FileNotFoundError:
+            # outro worker limpou primeiro
+            pass
+
+    token = uuid.uuid4().hex
+    temporario = diretorio / f"{token}.tmp"
+    temporario.write_text(resultado.relatorio_csv(), encoding="utf-8")
+    os.replace(temporario, diretorio / f"{token}.csv")
+    return token
+
+
+def ler_relatorio(token):
+    """Conteúdo do relatório ou None se o token não existe ou expirou."""
+    if not re.fullmatch(r"[0-9a-f]{32}", token):
+        return None
+    caminho = diretorio_relatorios() / f"{token}.csv"
+    try:
+        if caminho.stat().st_mtime < timezone.now().timestamp() - VALIDADE_RELATORIO:
+            return None
+        return caminho.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+
+
+# -----------------------
+# Leitura
+# -----------------------
+def _normalizar_cabecalho(campos):
+    return [(c or "").strip().lower() for c in campos]
+
+
+def ler_csv(arquivo_texto):
+    """Gera dicts linha a linha; detecta ``,`` ``;`` ou tab pelo cabeçalho."""
+    cabecalho = arquivo_texto.readline()
+    if not cabecalho:
+        return
+    try:
+        dialeto = csv.Sniffer().sniff(cabecalho, delimiters=",;\t")
+    except csv.Error:
+        dialeto = csv.excel
+    leitor = csv.reader(itertools.chain([cabecalho], arquivo_texto), dialeto)
+    campos = _normalizar_cabecalho(next(leitor))
+    for valores in leitor:
+        if any(valores):
+            yield dict(zip(campos, valores))
+
+
+def ler_xlsx(arquivo_binario):
+    """Gera dicts a partir da primeira planilha (requer openpyxl)."""
+    try:
+        from openpyxl import load_workbook
+    except ImportError as exc:
+        raise ImportError("Importar XLSX requer o pacote openpyxl (pip install openpyxl).") from exc
+
+    planilha = load_workbook(arquivo_binario, read_only=True, data_only=True).active
+    linhas = planilha.iter_rows(values_only=True)
+    campos = _normalizar_cabecalho(str(c) if c is not None else "" for c in next(linhas, ()))
+    for valores in linhas:
+        if any(v not in (None, "") for v in valores):
+            yield dict(zip(campos, valores))
+
+
+# -----------------------
+# Validação
+# -----------------------
+def _data(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = str(valor or "").strip()
+    try:
+        return date.fromisoformat(texto)
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(texto, "%d/%m/%Y").date()
+    except ValueError:
+        raise ErroLinha(f"Data inválida: {texto!r}") from None
+
+
+def _hora(valor, campo):
+    if isinstance(valor, datetime):
+        return valor.time()
+    if isinstance(valor, time):
+        return valor
+    texto = str(valor or "").strip()
+    try:
+        return time.fromisoformat(texto)
+    except ValueError:
+        raise ErroLinha(f"{campo} inválida: {texto!r}") from None
+
+
+def _inteiro(valor, campo):
+    texto = str(valor if valor is not None else "0").strip() or "0"
+    try:
+        numero = int(float(texto))
+    except ValueError:
+        raise ErroLinha(f"{campo} inválida: {texto!r}") from None
+    if numero < 0:
+        raise ErroLinha(f"{campo} não pode ser negativa.")
+    return numero
+
+
+class _Validador:
+    def __init__(self):
+        self.linhas = {}
+        for pk, nome in LinhaProducao.objects.values_list("pk", "nome"):
+            self.linhas[str(pk)] = pk
+            self.linhas.setdefault(nome.strip().lower(), pk)
+        self.turnos = {t: t for t, _ in RegistroProducao.TURNO_CHOICES}
+        # aceita "1", "2", "3" como atalho de "1/especial" etc.
+        self.turnos.update({t.split("/")[0]: t for t in list(self.turnos)})
+        self.hoje = timezone.localdate()
+
+    def __call__(self, valores):
+        faltando = [c for c in COLUNAS[:5] if valores.get(c) in (None, "")]
+        if faltando:
+            raise ErroLinha(f"Coluna(s) obrigatória(s) vazia(s): {', '.join(faltando)}")
+
+        linha = str(valores["linha"]).strip().lower()
+        if linha.endswith(".0"):
+            linha = linha[:-2]
+        linha_id = self.linhas.get(linha)
+        if linha_id is None:
+            raise ErroLinha(f"Linha não encontrada: {valores['linha']!r}")
+
+        turno = self.turnos.get(str(valores["turno"]).strip().lower())
+        if turno is None:
+            raise ErroLinha(f"Turno inválido: {valores['turno']!r}")
+
+        data = _data(valores["data"])
+        if data > self.hoje:
+            raise ErroLinha("A data do registro não pode ser no futuro.")
+
+        hora_inicio = _hora(valores["hora_inicio"], "Hora inicial")
+        hora_fim = _hora(valores["hora_fim"], "Hora final")
+        if hora_inicio == hora_fim:
+            raise ErroLinha("A hora final deve ser diferente da hora inicial.")
+
+        produzida = _inteiro(valores.get("quantidade_produzida"), "Quantidade produzida")
+        defeituosa = _inteiro(valores.get("quantidade_defeituosa"), "Quantidade defeituosa")
+        if defeituosa > produzida:
+            raise ErroLinha("Quantidade defeituosa não pode ser maior que a produzida.")
+
+        return (linha_id, data, turno), hora_inicio, hora_fim, produzida, defeituosa
+
+
+# -----------------------
+# Gravação
+# -----------------------
+class CacheRegistros:
+    """
+    (linha_id, data, turno) -> (pk, finalizada), criando os que faltam em
+    lote. Chaves que estão no arquivo frio não são recriadas (a restauração
+    esbarraria na chave única): ficam como (None, True), isto é, fechadas,
+    e entram em ``arquivados``.
+    """
+
+    def __init__(self, resultado):
+        self.resultado = resultado
+        self.registros = {}
+        self.arquivados = set()
+
+    def resolver(self, chaves):
+        faltando = {c for c in chaves if c not in self.registros}
+        if not faltando:
+            return
+        self._carregar(faltando)
+
+        novos = [c for c in faltando if c not in self.registros]
+        for chave in arquivo.arquivados(novos):
+            self.registros[chave] = (None, True)
+            self.arquivados.add(chave)
+        novos = [c for c in novos if c not in self.arquivados]
+        if not novos:
+            return
+        try:
+            with transaction.atomic():
+                RegistroProducao.objects.bulk_create(
+                    [RegistroProducao(linha_id=l, data=d, turno=t) for l, d, t in novos]
+                )
+            criados = len(novos)
+            self._carregar(novos)
+            # bulk_create não dispara sinais
+            obter_backend().indexar(self.registros[c][0] for c in novos)
+        except IntegrityError:
+            # outra transação criou algum desses registros nesse meio-tempo;
+            # um a um, só conta (e indexa, pelo sinal) os que criarmos aqui
+            criados = sum(
+                RegistroProducao.objects.get_or_create(linha_id=l, data=d, turno=t)[1]
+                for l, d, t in novos
+            )
+            self._carregar(novos)
+        self.resultado.registros_criados += criados
+
+    def _carregar(self, chaves):
+        linhas = {c[0] for c in chaves}
+        datas = {c[1] for c in chaves}
+        existentes = (
+            RegistroProducao.objects
+            .filter(linha_id__in=linhas, data__in=datas)
+            .values_list("linha_id", "data", "turno", "pk", "finalizada")
+        )
+        for linha_id, data, turno, pk, finalizada in existentes:
+            self.registros[(linha_id, data, turno)] = (pk, finalizada)
+
+    def __getitem__(self, chave):
+        return self.registros[chave]
+
+
+def inserir_horas(linhas, acumular=False):
+    """
+    INSERT em lote de RegistroHora com executemany; ``linhas`` são tuplas
+    (registro_id, hora_inicio, hora_fim, produzida, defeituosa).
+
+    Equivale a RegistroHora.objects.bulk_create(update_conflicts=True)
+    (também sem sinais), mas sem montar um objeto e compilar um VALUES por
+    linha, que era o gargalo em arquivos de milhões de linhas. Uma hora que
+    já existe no registro (mesma hora_inicio) é sobrescrita, então importar
+    o mesmo arquivo de novo não duplica a produção; com ``acumular`` as
+    quantidades são somadas às existentes (contadores das máquinas).
+    """
+    conexao = connections[router.db_for_write(RegistroHora)]
+    ops = conexao.ops
+    meta = RegistroHora._meta
+    tabela = ops.quote_name(meta.db_table)
+    campos = ["registro", "hora_inicio", "hora_fim", "quantidade_produzida", "quantidade_defeituosa"]
+    colunas = [ops.quote_name(meta.get_field(c).column) for c in campos]
+    if acumular:
+        atualizar = [f"{c} = {tabela}.{c} + excluded.{c}" for c in colunas[3:]]
+    else:
+        atualizar = [f"{c} = excluded.{c}" for c in colunas[2:]]
+    sql = (
+        f"INSERT INTO {tabela} ({', '.join(colunas)}) "
+        f"VALUES ({', '.join(['%s'] * len(campos))}) "
+        f"ON CONFLICT ({colunas[0]}, {colunas[1]}) DO UPDATE SET {', '.join(atualizar)}"
+    )
+    with conexao.cursor() as cursor:
+        cursor.executemany(sql, [
+            (registro_id, ops.adapt_timefield_value(hi), ops.adapt_timefield_value(hf), prod, defe)
+            for registro_id, hi, hf, prod, defe in linhas
+        ])
+
+
+def _sobrepostas(candidatas):
+    """
+    numero -> mensagem das linhas cujas horas se sobrepõem a outra hora do
+    mesmo registro, já gravada ou do próprio lote (sgpi/intervalos.py).
+    ``candidatas``: (numero, registro_id, turno, hora_inicio, hora_fim).
+
+    A mesma hora_inicio substitui a anterior, como no upsert de
+    ``inserir_horas``. Numa sobreposição fica a hora que já existia no
+    registro (gravada ou substituída) ou, entre horas novas, a que veio
+    antes no arquivo.
+    """
+    turnos = {registro_id: turno for _, registro_id, turno, _, _ in candidatas}
+    por_registro = defaultdict(dict)
+    gravadas = RegistroHora.objects.filter(registro_id__in=turnos).values_list(
+        "registro_id", "hora_inicio", "hora_fim"
+    )
+    for registro_id, hora_inicio, hora_fim in gravadas:
+        por_registro[registro_id][hora_inicio] = (hora_fim, None, True)
+    for numero, registro_id, _, hora_inicio, hora_fim in candidatas:
+        horas = por_registro[registro_id]
+        existente = hora_inicio in horas and horas[hora_inicio][2]
+        horas[hora_inicio] = (hora_fim, numero, existente)
+
+    rejeitadas = {}
+    for registro_id, horas in por_registro.items():
+        linha_do_tempo = intervalos.normalizar(
+            ((inicio, fim, (numero, existente, inicio, fim)) for inicio, (fim, numero, existente) in horas.items()),
+            turnos[registro_id],
+        )
+        descartadas = intervalos.descartar_sobrepostos(
+            linha_do_tempo, lambda item: (item[1], -(item[0] or 0))
+        )
+        for (numero, _, inicio, fim), (_, _, outra_inicio, outra_fim) in descartadas.items():
+            if numero is not None:
+                rejeitadas[numero] = (
+                    f"Hora {intervalos.rotulo(inicio, fim)} sobreposta a "
+                    f"{intervalos.rotulo(outra_inicio, outra_fim)} no mesmo registro."
+                )
+    return rejeitadas
+
+
+def _gravar_lote(lote, cache, resultado):
+    cache.resolver({item[1][0] for item in lote})
+
+    candidatas = []
+    for numero, (chave, hora_inicio, hora_fim, produzida, defeituosa), valores in lote:
+        registro_id, finalizada = cache[chave]
+        if chave in cache.arquivados:
+            resultado.adicionar_erro(numero, "Registro arquivado — reabra pelos detalhes antes de importar.", valores)
+            continue
+        if finalizada:
+            resultado.adicionar_erro(numero, "Registro finalizado — reabra antes de importar.", valores)
+            continue
+        candidatas.append((numero, registro_id, chave[2], hora_inicio, hora_fim))
+
+    rejeitadas = _sobrepostas(candidatas)
+    horas = []
+    for numero, (chave, hora_inicio, hora_fim, produzida, defeituosa), valores in lote:
+        registro_id, finalizada = cache[chave]
+        if finalizada:
+            continue
+        if numero in rejeitadas:
+            resultado.adicionar_erro(numero, rejeitadas[numero], valores)
+            continue
+        horas.append((registro_id, hora_inicio, hora_fim, produzida, defeituosa))
+        resultado.registros_afetados.add(registro_id)
+
+    if horas:
+        inserir_horas(horas)
+    resultado.inseridas += len(horas)
+
+
+def importar_registros_hora(linhas, tamanho_lote=TAMANHO_LOTE):
+    """
+    Importa um iterável de dicts (ver ``ler_csv``/``ler_xlsx``).
+
+    Cada lote é gravado na sua própria transação; os totais são recalculados
+    uma vez por registro afetado no final.
+    """
+    resultado = ResultadoImportacao()
+    validar = _Validador()
+    cache = CacheRegistros(resultado)
+    lote = []
+
+    for numero, valores in enumerate(linhas, start=2):  # linha 1 é o cabeçalho
+        resultado.lidas += 1
+        try:
+            lote.append((numero, validar(valores), valores))
+        except ErroLinha as exc:
+            resultado.adicionar_erro(numero, str(exc), valores)
+            continue
+
+        if len(lote) >= tamanho_lote:
+            with transaction.atomic():
+                _gravar_lote(lote, cache, resultado)
+            lote = []
+
+    if lote:
+        with transaction.atomic():
+            _gravar_lote(lote, cache, resultado)
+
+    with transaction.atomic():
+        recalcular_registros(resultado.registros_afetados)
+        marcar_alteracao(registro_ids=resultado.registros_afetados)
+    return resultado
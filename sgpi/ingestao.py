@@ -0,0 +1,245 @@
+# sgpi/ingestao.py
+"""
+Ingestão dos contadores das máquinas (peças produzidas/defeituosas a cada
+poucos segundos, por linha).
+
+Os eventos não vão direto para o banco: ``BufferContadores`` soma em
+memória por (linha, data, turno, hora cheia) e descarrega tudo de uma vez
+— a cada ``SGPI_INGESTAO_INTERVALO`` segundos ou quando passam de
+``SGPI_INGESTAO_LIMITE`` eventos pendentes. Cada descarga é uma transação
+com um INSERT ... ON CONFLICT que soma as quantidades às da hora já
+gravada (sem RegistroHora.save() e sem sinais), seguido de um único
+recálculo dos registros afetados.
+
+O timer roda no event loop do servidor ASGI e é ligado/desligado pelo
+lifespan (project/asgi.py); no desligamento o que estiver no buffer é
+gravado antes do processo sair. Sem lifespan (runserver, WSGI, testes) o
+buffer não fica ativo e cada requisição grava na hora.
+
+Registros finalizados ou arquivados e linhas inexistentes são descartados
+na descarga (com aviso no log), como na importação.
+"""
+import asyncio
+import atexit
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .importacao import CacheRegistros, ResultadoImportacao, inserir_horas
+from .models import LinhaProducao
+from .painel import marcar_alteracao
+from .recalculo import recalcular_registros
+from .turnos import hora_cheia
+
+logger = logging.getLogger(__name__)
+
+# tolerância para relógio de máquina adiantado
+MAX_ADIANTAMENTO = timedelta(minutes=5)
+
+
+def intervalo():
+    return getattr(settings, "SGPI_INGESTAO_INTERVALO", 2.0)
+
+
+def limite():
+    return getattr(settings, "SGPI_INGESTAO_LIMITE", 5000)
+
+
+# -----------------------
+# Gravação
+# -----------------------
+def gravar_contadores(pendentes):
+    """
+    ``pendentes``: {(linha_id, data, turno, hora_inicio): [hora_fim, produzida, defeituosa]}.
+    Soma tudo às horas dos registros (criando o que faltar) numa transação.
+    Retorna (horas gravadas, horas descartadas).
+    """
+    linhas = set(
+        LinhaProducao.objects.filter(pk__in={c[0] for c in pendentes}).values_list("pk", flat=True)
+    )
+    descartadas = 0
+    with transaction.atomic():
+        cache = CacheRegistros(ResultadoImportacao())
+        cache.resolver({c[:3] for c in pendentes if c[0] in linhas})
+
+        horas = []
+        afetados = set()
+        for (linha_id, data, turno, hora_inicio), (hora_fim, produzida, defeituosa) in pendentes.items():
+            if linha_id not in linhas:
+                logger.warning("Contadores descartados: linha %s não existe.", linha_id)
+                descartadas += 1
+                continue
+            registro_id, finalizada = cache[(linha_id, data, turno)]
+            if (linha_id, data, turno) in cache.arquivados:
+                logger.warning("Contadores descartados: linha %s, %s, turno %s está arquivado.", linha_id, data, turno)
+                descartadas += 1
+                continue
+            if finalizada:
+                logger.warning("Contadores descartados: registro %s já finalizado.", registro_id)
+                descartadas += 1
+                continue
+            horas.append((registro_id, hora_inicio, hora_fim, produzida, defeituosa))
+            afetados.add(registro_id)
+
+        if horas:
+            inserir_horas(horas, acumular=True)
+            recalcular_registros(afetados)
+            marcar_alteracao(registro_ids=afetados)
+    return len(horas), descartadas
+
+
+# -----------------------
+# Buffer
+# -----------------------
+class BufferContadores:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pendentes = {}
+        self.eventos = 0
+        self._timer = None
+        self._tarefas = set()
+
+    @property
+    def ativo(self):
+        return self._timer is not None and not self._timer.done()
+
+    def adicionar(self, linha_id, momento, produzida, defeituosa):
+        """Soma o evento ao buffer. False se ``momento`` não cai em nenhum turno."""
+        hora = hora_cheia(momento)
+        if hora is None:
+            return False
+        data, turno, hora_inicio, hora_fim = hora
+        with self._lock:
+            item = self._pendentes.get((linha_id, data, turno, hora_inicio))
+            if item is None:
+                self._pendentes[(linha_id, data, turno, hora_inicio)] = [hora_fim, produzida, defeituosa]
+            else:
+                item[1] += produzida
+                item[2] += defeituosa
+            self.eventos += 1
+        return True
+
+    def cheio(self):
+        return self.eventos >= limite()
+
+    def trocar(self):
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, {}
+            self.eventos = 0
+        return pendentes
+
+    def _devolver(self, pendentes):
+        # as quantidades são somadas ao gravar, então devolver e somar de novo é seguro
+        with self._lock:
+            for chave, (hora_fim, produzida, defeituosa) in pendentes.items():
+                item = self._pendentes.setdefault(chave, [hora_fim, 0, 0])
+                item[1] += produzida
+                item[2] += defeituosa
+
+    def descarregar_sync(self):
+        pendentes = self.trocar()
+        if not pendentes:
+            return 0, 0
+        try:
+            return gravar_contadores(pendentes)
+        except Exception:
+            self._devolver(pendentes)
+            logger.exception("Falha ao gravar %s hora(s) de contadores; mantidas no buffer.", len(pendentes))
+            raise
+
+    async def descarregar(self):
+        return await sync_to_async(self.descarregar_sync)()
+
+    def agendar_descarga(self):
+        """Descarga em segundo plano (ex.: buffer cheio), sem segurar a requisição."""
+        tarefa = asyncio.get_running_loop().create_task(self._descarregar_silencioso())
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+
+    async def _descarregar_silencioso(self):
+        try:
+            await self.descarregar()
+        except Exception:
+            pass  # já registrado; os dados voltaram para o buffer
+
+    async def _ciclo(self):
+        while True:
+            await asyncio.sleep(intervalo())
+            await self._descarregar_silencioso()
+
+    def iniciar(self):
+        if not self.ativo:
+            self._timer = asyncio.get_running_loop().create_task(self._ciclo())
+
+    async def parar(self):
+        """Desliga o timer e grava o que estiver pendente."""
+        if self._timer is not None:
+            self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+            self._timer = None
+        if self._tarefas:
+            await asyncio.gather(*self._tarefas, return_exceptions=True)
+        await self.descarregar()
+
+
+buffer = BufferContadores()
+
+
+@atexit.register
+def _gravar_ao_sair():
+    # servidor parado sem passar pelo lifespan: última tentativa de não perder contagens
+    if buffer.eventos or buffer._pendentes:
+        try:
+            buffer.descarregar_sync()
+        except Exception:
+            pass
+
+
+# -----------------------
+# Eventos
+# -----------------------
+class EventoInvalido(ValueError):
+    pass
+
+
+def _inteiro(valor, campo):
+    if isinstance(valor, bool) or not isinstance(valor, (int, str)):
+        raise EventoInvalido(f"{campo} inválido.")
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise EventoInvalido(f"{campo} inválido.") from None
+    if numero < 0:
+        raise EventoInvalido(f"{campo} não pode ser negativo.")
+    return numero
+
+
+def validar_evento(evento, agora):
+    """{"linha", "produzida", "defeituosa", "momento"?} -> (linha_id, momento, produzida, defeituosa)."""
+    if not isinstance(evento, dict):
+        raise EventoInvalido("Evento deve ser um objeto.")
+    linha_id = _inteiro(evento.get("linha"), "linha")
+    produzida = _inteiro(evento.get("produzida", 0), "produzida")
+    defeituosa = _inteiro(evento.get("defeituosa", 0), "defeituosa")
+    if defeituosa > produzida:
+        raise EventoInvalido("defeituosa não pode ser maior que produzida.")
+
+    momento = agora
+    if evento.get("momento"):
+        try:
+            momento = datetime.fromisoformat(str(evento["momento"]))
+        except ValueError:
+            raise EventoInvalido("momento inválido.") from None
+        if timezone.is_naive(momento):
+            momento = timezone.make_aware(momento)
+        if momento > agora + MAX_ADIANTAMENTO:
+            raise EventoInvalido("momento no futuro.")
+    return linha_id, momento, produzida, defeituosa
@@ -0,0 +1,139 @@
+# sgpi/intervalos.py
+"""
+Horas e paradas de um turno numa linha do tempo em minutos.
+
+Cada (hora_inicio, hora_fim) vira [início, fim) em minutos contados a partir
+do início do turno (``turnos.horario``): no turno 22:00-06:00, 22:00-23:00 é
+[0, 60) e 01:00-02:00 é [180, 240). Fim antes do início atravessa a
+meia-noite. Sobreposições, buracos e minutos cobertos saem de uma ordenação
+seguida de uma única varredura (O(n log n)), em vez de comparar par a par.
+"""
+from datetime import time
+from typing import NamedTuple
+
+from .turnos import horario
+
+MINUTOS_DIA = 24 * 60
+
+
+class Intervalo(NamedTuple):
+    inicio: int
+    fim: int
+    item: object = None
+
+
+class Varredura(NamedTuple):
+    # pares (intervalo que ainda estava aberto, intervalo que começou dentro dele)
+    sobreposicoes: list
+    # união dos intervalos: (início, fim) ordenados e disjuntos
+    blocos: list
+
+    @property
+    def buracos(self):
+        return [(a[1], b[0]) for a, b in zip(self.blocos, self.blocos[1:])]
+
+    @property
+    def cobertos(self):
+        """Minutos cobertos por ao menos um intervalo (sobreposição conta uma vez)."""
+        return sum(fim - inicio for inicio, fim in self.blocos)
+
+
+def _segundos(hora):
+    return hora.hour * 3600 + hora.minute * 60 + hora.second
+
+
+def duracao(inicio, fim):
+    """Minutos de ``inicio`` a ``fim``; fim <= inicio atravessa a meia-noite."""
+    return ((_segundos(fim) - _segundos(inicio)) % 86400 or 86400) // 60
+
+
+def origem(turno):
+    """Minuto do dia em que o turno começa (0 para turno sem horário)."""
+    inicio, _ = horario().get(turno, (time(0), time(0)))
+    return inicio.hour * 60 + inicio.minute
+
+
+def normalizar(pares, turno):
+    """
+    Intervalos ordenados a partir de (hora_inicio, hora_fim, item).
+
+    Um intervalo que passa do fim do dia do turno (ex.: 05:30-06:30 num
+    turno que começa às 06:00) é dividido em dois pedaços com o mesmo item,
+    para que a sobreposição com o começo do turno apareça na varredura.
+    """
+    base = origem(turno)
+    intervalos = []
+    for hora_inicio, hora_fim, item in pares:
+        inicio = (hora_inicio.hour * 60 + hora_inicio.minute - base) % MINUTOS_DIA
+        fim = inicio + duracao(hora_inicio, hora_fim)
+        if fim > MINUTOS_DIA:
+            intervalos.append(Intervalo(0, fim - MINUTOS_DIA, item))
+            fim = MINUTOS_DIA
+        intervalos.append(Intervalo(inicio, fim, item))
+    intervalos.sort(key=lambda i: (i.inicio, i.fim))
+    return intervalos
+
+
+def varrer(intervalos):
+    """
+    Uma passada por intervalos já ordenados (``normalizar``).
+
+    Cada intervalo que começa antes do fim do mais longo ainda aberto gera
+    uma sobreposição com ele; basta para apontar todo intervalo sobreposto,
+    não lista todos os pares. Intervalos encostados (fim == início) se juntam
+    no mesmo bloco.
+    """
+    sobreposicoes, blocos = [], []
+    aberto = None
+    for atual in intervalos:
+        if aberto is not None and atual.inicio < aberto.fim:
+            sobreposicoes.append((aberto, atual))
+        if blocos and atual.inicio <= blocos[-1][1]:
+            blocos[-1][1] = max(blocos[-1][1], atual.fim)
+        else:
+            blocos.append([atual.inicio, atual.fim])
+        if aberto is None or atual.fim > aberto.fim:
+            aberto = atual
+    return Varredura(sobreposicoes, [tuple(b) for b in blocos])
+
+
+def fora_dos_blocos(intervalos, blocos):
+    """Intervalos (ordenados) que não cabem inteiros num dos ``blocos`` (ordenados, disjuntos)."""
+    fora, i = [], 0
+    for atual in intervalos:
+        while i < len(blocos) and blocos[i][1] <= atual.inicio:
+            i += 1
+        if i == len(blocos) or not (blocos[i][0] <= atual.inicio and atual.fim <= blocos[i][1]):
+            fora.append(atual)
+    return fora
+
+
+def descartar_sobrepostos(intervalos, prioridade):
+    """
+    Varredura que resolve as sobreposições em vez de só apontá-las: de cada
+    par sobreposto sai o item de menor ``prioridade(item)`` e a varredura
+    segue com o outro. Retorna {item descartado: item que ficou}; os que
+    ficam não se sobrepõem. Os itens precisam ser hasheáveis.
+    """
+    descartados = {}
+    aberto = None
+    for atual in intervalos:
+        if atual.item in descartados:
+            continue
+        if aberto is not None and atual.inicio < aberto.fim:
+            if prioridade(atual.item) < prioridade(aberto.item):
+                descartados[atual.item] = aberto.item
+                continue
+            descartados[aberto.item] = atual.item
+        aberto = atual
+    return descartados
+
+
+def hora(minuto, turno):
+    """time correspondente a ``minuto`` da linha do tempo do turno."""
+    minuto = (origem(turno) + minuto) % MINUTOS_DIA
+    return time(minuto // 60, minuto % 60)
+
+
+def rotulo(hora_inicio, hora_fim):
+    return f"{hora_inicio:%H:%M}–{hora_fim:%H:%M}"
@@ -0,0 +1,39 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sgpi import arquivo
+from sgpi.models import RegistroProducao
+
+
+class Command(BaseCommand):
+    help = (
+        "Move os registros finalizados de meses antigos (com horas e paradas) para o "
+        "arquivo frio (SGPI_ARQUIVO_CAMINHO). Padrão: tudo antes dos últimos "
+        "SGPI_ARQUIVO_MESES meses."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--antes-de", help="Mês (AAAA-MM): arquiva os meses anteriores a ele.")
+        parser.add_argument("--simular", action="store_true", help="Só conta o que seria arquivado.")
+
+    def handle(self, *args, **options):
+        antes_de = arquivo.limite()
+        if options["antes_de"]:
+            try:
+                antes_de = date.fromisoformat(f"{options['antes_de']}-01")
+            except ValueError as exc:
+                raise CommandError(f"Mês inválido: {exc}") from exc
+
+        if options["simular"]:
+            total = RegistroProducao.objects.filter(finalizada=True, data__lt=antes_de).count()
+            self.stdout.write(f"{total} registro(s) finalizado(s) antes de {antes_de:%m/%Y} seriam arquivados.")
+            return
+
+        inicio = time.perf_counter()
+        total = arquivo.arquivar(antes_de)
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} registro(s) antes de {antes_de:%m/%Y} arquivado(s) em {arquivo.caminho()} "
+            f"({time.perf_counter() - inicio:.1f}s)."
+        ))
@@ -0,0 +1,190 @@
+import math
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from sgpi import analitico
+from sgpi.dados_sinteticos import gerar_linhas, gerar_registros
+from sgpi.models import LinhaProducao, Parada, RegistroHora, RegistroProducao
+
+PREFIXO = "Analítico"
+
+
+def relatorio_orm(data_inicio, data_fim, janela, percentis):
+    """
+    O mesmo relatório de sgpi.analitico percorrendo objetos com as
+    propriedades do modelo (minutos_intervalo), como seria sem NumPy.
+    """
+    def zerado():
+        return {"produzido": 0, "defeituoso": 0, "minutos": 0, "capacidade": 0.0, "parado": 0}
+
+    por_linha = defaultdict(zerado)
+    por_turno = defaultdict(zerado)
+    aproveitamentos = defaultdict(list)
+    por_dia = defaultdict(lambda: [0, 0])
+
+    horas = RegistroHora.objects.filter(registro__data__range=(data_inicio, data_fim)).select_related("registro__linha")
+    for hora in horas.iterator(chunk_size=2000):
+        registro = hora.registro
+        minutos = hora.minutos_intervalo
+        capacidade = registro.linha.capacidade_nominal * minutos / 60.0
+        for acumulado in (por_linha[registro.linha_id], por_turno[registro.turno]):
+            acumulado["produzido"] += hora.quantidade_produzida
+            acumulado["defeituoso"] += hora.quantidade_defeituosa
+            acumulado["minutos"] += minutos
+            acumulado["capacidade"] += capacidade
+        if capacidade > 0:
+            aproveitamentos[registro.linha_id].append(100.0 * hora.quantidade_produzida / capacidade)
+        dia = por_dia[(registro.linha_id, registro.data)]
+        dia[0] += hora.quantidade_produzida
+        dia[1] += hora.quantidade_defeituosa
+
+    paradas = Parada.objects.filter(registro__data__range=(data_inicio, data_fim)).select_related("registro")
+    for parada in paradas.iterator(chunk_size=2000):
+        por_linha[parada.registro.linha_id]["parado"] += parada.duracao
+        por_turno[parada.registro.turno]["parado"] += parada.duracao
+
+    movel = {}
+    for linha_id in por_linha:
+        janela_dias, produzido, defeituoso = deque(), 0, 0
+        dia = data_inicio
+        while dia <= data_fim:
+            p, d = por_dia.get((linha_id, dia), (0, 0))
+            janela_dias.append((p, d))
+            produzido, defeituoso = produzido + p, defeituoso + d
+            if len(janela_dias) > janela:
+                p, d = janela_dias.popleft()
+                produzido, defeituoso = produzido - p, defeituoso - d
+            dia += timedelta(days=1)
+        movel[linha_id] = 100.0 * defeituoso / produzido if produzido else None
+
+    for linha_id, valores in por_linha.items():
+        ordenados = sorted(aproveitamentos[linha_id])
+        valores["percentis"] = {
+            q: ordenados[max(math.ceil(q / 100 * len(ordenados)) - 1, 0)] if ordenados else None
+            for q in percentis
+        }
+        valores["taxa_movel_final"] = movel[linha_id]
+    return por_linha, por_turno
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara sgpi.analitico (values_list + NumPy) com o loop equivalente no ORM: gera "
+        "--linhas linhas com --dias dias de horas e paradas num banco de teste e mede tempo "
+        "e pico de memória dos dois, conferindo que os resultados batem."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--linhas", type=int, default=100)
+        parser.add_argument("--dias", type=int, default=90)
+        parser.add_argument("--janela", type=int, default=7)
+        parser.add_argument("--dias-lote", type=int, default=None, help="Dias por fatia (SGPI_ANALITICO_DIAS_LOTE).")
+        parser.add_argument("--repeticoes", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--arquivo", help="Arquivo do banco de teste no SQLite.")
+        parser.add_argument("--manter", action="store_true",
+                            help="Mantém o banco de teste (a próxima execução reaproveita os dados).")
+
+    def handle(self, *args, **options):
+        analitico._numpy()
+        if options["repeticoes"] < 1 or options["dias"] < 1:
+            raise CommandError("--repeticoes e --dias precisam ser pelo menos 1.")
+
+        teste = connection.settings_dict.setdefault("TEST", {})
+        if connection.vendor == "sqlite" and not teste.get("NAME"):
+            teste["NAME"] = options["arquivo"] or str(Path(tempfile.gettempdir()) / "sgpi-benchmark-analitico.sqlite3")
+        nome_original = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=options["manter"],
+        )
+        try:
+            self._medir_tudo(options)
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0, keepdb=options["manter"])
+
+    def _preparar(self, options):
+        fim = timezone.localdate()
+        inicio = fim - timedelta(days=options["dias"] - 1)
+        linhas = list(LinhaProducao.objects.filter(nome__startswith=f"{PREFIXO} "))
+        if not linhas:
+            comeco = time.perf_counter()
+            with transaction.atomic():
+                linhas = gerar_linhas(options["linhas"], 8, seed=options["seed"], prefixo=PREFIXO)
+                turnos = len(RegistroProducao.TURNO_CHOICES)
+                gerar_registros(linhas, len(linhas) * turnos * options["dias"], seed=options["seed"],
+                                fim=fim, horas_desde=inicio)
+            self.stdout.write(f"dados gerados em {time.perf_counter() - comeco:.1f}s")
+        return inicio, fim
+
+    def _medir_tudo(self, options):
+        inicio, fim = self._preparar(options)
+        janela = options["janela"]
+        horas = RegistroHora.objects.filter(registro__data__range=(inicio, fim)).count()
+        self.stdout.write(f"{horas} horas de {inicio} a {fim}\n")
+
+        vetorizado = lambda: analitico.relatorio(inicio, fim, janela=janela, dias_lote=options["dias_lote"])
+        orm = lambda: relatorio_orm(inicio, fim, janela, analitico.PERCENTIS)
+        medidas = {
+            "vetorizado": self._medir(options["repeticoes"], vetorizado),
+            "loop ORM": self._medir(options["repeticoes"], orm),
+        }
+        for nome, (mediana, pico, _) in medidas.items():
+            self.stdout.write(f"{nome:<11} mediana {mediana:>9.1f} ms  pico {pico:>7.1f} MB")
+        self.stdout.write(self.style.SUCCESS(
+            f"vetorizado {medidas['loop ORM'][0] / medidas['vetorizado'][0]:.1f}x mais rápido"
+        ))
+        self._conferir(medidas["vetorizado"][2], *medidas["loop ORM"][2])
+
+    @staticmethod
+    def _medir(repeticoes, funcao):
+        tempos = []
+        for _ in range(repeticoes):
+            comeco = time.perf_counter()
+            funcao()
+            tempos.append((time.perf_counter() - comeco) * 1000)
+        # pico numa execução à parte: o tracemalloc deixa tudo mais lento
+        tracemalloc.start()
+        try:
+            resultado = funcao()
+            pico = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+        return statistics.median(tempos), pico, resultado
+
+    def _conferir(self, relatorio, por_linha, por_turno):
+        divergencias = []
+        movel = relatorio.taxa_defeitos_movel[:, -1]
+        for i, linha in enumerate(relatorio.por_linha()):
+            esperado = por_linha.get(linha["linha_id"])
+            if esperado is None:
+                continue
+            if (linha["produzido"], linha["defeituoso"], linha["parado_min"]) != (
+                esperado["produzido"], esperado["defeituoso"], esperado["parado"]
+            ):
+                divergencias.append(f"totais da linha {linha['linha_id']}")
+            if not math.isclose(linha["capacidade"], esperado["capacidade"], rel_tol=1e-9):
+                divergencias.append(f"capacidade da linha {linha['linha_id']}")
+            for q, valor in linha["percentis_aproveitamento"].items():
+                referencia = esperado["percentis"][q]
+                if referencia is not None and not (0 <= valor - referencia <= analitico.PASSO_HISTOGRAMA + 1e-9):
+                    if referencia < analitico.LIMITE_HISTOGRAMA:
+                        divergencias.append(f"p{q} da linha {linha['linha_id']}")
+            final = esperado["taxa_movel_final"]
+            if final is not None and not math.isclose(movel[i], final, rel_tol=1e-9):
+                divergencias.append(f"taxa móvel da linha {linha['linha_id']}")
+        for turno in relatorio.por_turno():
+            esperado = por_turno.get(turno["turno"])
+            if esperado and (turno["produzido"], turno["parado_min"]) != (esperado["produzido"], esperado["parado"]):
+                divergencias.append(f"turno {turno['turno']}")
+
+        if divergencias:
+            raise CommandError("Resultados diferentes do loop ORM: " + ", ".join(divergencias[:10]))
+        self.stdout.write("resultados conferidos com o loop ORM")
@@ -0,0 +1,142 @@
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date, time as hora
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.db.models import Sum
+
+from project.bancos import banco_sqlite
+from sgpi.models import LinhaProducao, RegistroHora, RegistroProducao
+
+PERFIS = {
+    # o que project/settings.py usa hoje
+    "padrao": lambda nome: {"ENGINE": "django.db.backends.sqlite3", "NAME": nome},
+    # project/settings_producao.py
+    "producao": banco_sqlite,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Simula a troca de turno: vários operadores gravando apontamentos ao mesmo tempo "
+        "(lê o registro e grava a hora na mesma transação, como o formulário) enquanto "
+        "outras conexões leem totais. Roda num SQLite temporário para cada perfil "
+        "(padrão do settings.py x settings_producao) e compara erros de "
+        "\"database is locked\", vazão e latência."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--operadores", type=int, default=24)
+        parser.add_argument("--envios", type=int, default=20, help="Apontamentos por operador.")
+        parser.add_argument("--leitores", type=int, default=4)
+        parser.add_argument("--perfis", default="padrao,producao")
+
+    def handle(self, *args, **options):
+        diretorio = Path(tempfile.mkdtemp(prefix="sgpi-bench-"))
+        try:
+            for perfil in options["perfis"].split(","):
+                self._medir(perfil.strip(), diretorio, options)
+        finally:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+    def _registrar(self, perfil, diretorio):
+        alias = f"bench_{perfil}"
+        configuracao = PERFIS[perfil](str(diretorio / f"{perfil}.sqlite3"))
+        connections.settings[alias] = connections.configure_settings({"default": {}, alias: configuracao})[alias]
+        call_command("migrate", database=alias, verbosity=0)
+        return alias
+
+    def _medir(self, perfil, diretorio, options):
+        alias = self._registrar(perfil, diretorio)
+        linhas = LinhaProducao.objects.using(alias).bulk_create(
+            LinhaProducao(nome=f"Bench {i:03d}", setor=f"Setor {i % 4}", capacidade_nominal=600)
+            for i in range(options["operadores"])
+        )
+        connections[alias].close()
+
+        barreira = threading.Barrier(options["operadores"] + options["leitores"])
+        fim_escrita = threading.Event()
+        latencias, erros, leituras, erros_leitura = [], [], [], []
+
+        def operador(linha):
+            try:
+                barreira.wait()
+                for i in range(options["envios"]):
+                    inicio = time.perf_counter()
+                    try:
+                        self._apontar(alias, linha, i)
+                        latencias.append(time.perf_counter() - inicio)
+                    except OperationalError as exc:
+                        erros.append(str(exc))
+            finally:
+                connections[alias].close()
+
+        def leitor():
+            try:
+                barreira.wait()
+                while not fim_escrita.is_set():
+                    inicio = time.perf_counter()
+                    try:
+                        RegistroProducao.objects.using(alias).values("linha__setor").annotate(
+                            total=Sum("quantidade_produzida")
+                        ).count()
+                        leituras.append(time.perf_counter() - inicio)
+                    except OperationalError as exc:
+                        erros_leitura.append(str(exc))
+            finally:
+                connections[alias].close()
+
+        escritores = [threading.Thread(target=operador, args=(linha,)) for linha in linhas]
+        leitores = [threading.Thread(target=leitor) for _ in range(options["leitores"])]
+        inicio = time.perf_counter()
+        for thread in escritores + leitores:
+            thread.start()
+        for thread in escritores:
+            thread.join()
+        decorrido = time.perf_counter() - inicio
+        fim_escrita.set()
+        for thread in leitores:
+            thread.join()
+
+        total = options["operadores"] * options["envios"]
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {perfil}"))
+        self.stdout.write(
+            f"apontamentos: {len(latencias)}/{total} gravados, {len(erros)} erro(s) "
+            f"({sum('locked' in e for e in erros)} \"database is locked\") em {decorrido:.2f}s "
+            f"— {len(latencias) / decorrido:.0f}/s"
+        )
+        if latencias:
+            self.stdout.write(f"latência de escrita (ms): {self._percentis(latencias)}")
+        self.stdout.write(f"leituras: {len(leituras)} ({len(erros_leitura)} erro(s)) — {len(leituras) / decorrido:.0f}/s")
+        if leituras:
+            self.stdout.write(f"latência de leitura (ms): {self._percentis(leituras)}")
+        connections[alias].close()
+
+    @staticmethod
+    def _percentis(valores):
+        valores = sorted(valores)
+        p = statistics.quantiles(valores, n=100) if len(valores) > 1 else valores * 99
+        return f"p50 {p[49] * 1000:.1f}  p95 {p[94] * 1000:.1f}  máx {valores[-1] * 1000:.1f}"
+
+    @staticmethod
+    def _apontar(alias, linha, i):
+        # mesma forma do formulário/API: lê, depois grava, tudo numa transação
+        with transaction.atomic(using=alias):
+            registro = (
+                RegistroProducao.objects.using(alias)
+                .filter(linha=linha, data=date(2025, 6, 2), turno="1/especial").first()
+            )
+            if registro is None:
+                registro = RegistroProducao.objects.using(alias).create(
+                    linha=linha, data=date(2025, 6, 2), turno="1/especial",
+                )
+            RegistroHora.objects.using(alias).update_or_create(
+                registro=registro, hora_inicio=hora(i % 24),
+                defaults={"hora_fim": hora((i + 1) % 24), "quantidade_produzida": 100 + i},
+            )
@@ -0,0 +1,125 @@
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from sgpi.dados_sinteticos import gerar_linhas, gerar_registros
+from sgpi.models import LinhaProducao, RegistroProducao
+from sgpi.oee import calcular_oee
+
+
+class Command(BaseCommand):
+    help = (
+        "Mostra o plano (EXPLAIN) e o tempo das consultas de RegistroProducao com e "
+        "sem os índices criados a partir da migração 0010, num banco de teste descartável "
+        "(nunca no banco configurado): com --registros gera dados sintéticos nele."
+    )
+
+    # colunas dos índices que já existiam antes da 0010 (FK e unique)
+    INDICES_ORIGINAIS = {
+        RegistroProducao: [["linha_id"], ["linha_id", "data", "turno"]],
+        LinhaProducao: [],
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument("--registros", type=int, default=0, help="Quantos registros sintéticos gerar.")
+        parser.add_argument("--linhas", type=int, default=40)
+        parser.add_argument("--setores", type=int, default=8)
+        parser.add_argument("--repeticoes", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--arquivo", help="Arquivo do banco de teste no SQLite.")
+        parser.add_argument("--manter", action="store_true",
+                            help="Mantém o banco de teste (a próxima execução reaproveita os dados).")
+
+    def handle(self, *args, **options):
+        # DROP INDEX e a carga sintética seguram locks exclusivos: só num banco à parte
+        teste = connection.settings_dict.setdefault("TEST", {})
+        if connection.vendor == "sqlite" and not teste.get("NAME"):
+            teste["NAME"] = options["arquivo"] or str(Path(tempfile.gettempdir()) / "sgpi-benchmark-indices.sqlite3")
+        nome_original = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=options["manter"],
+        )
+        try:
+            self._executar(options)
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0, keepdb=options["manter"])
+
+    def _executar(self, options):
+        if options["registros"] and not LinhaProducao.objects.filter(nome__startswith="Bench ").exists():
+            inicio = time.perf_counter()
+            with transaction.atomic():
+                linhas = gerar_linhas(options["linhas"], options["setores"], seed=options["seed"], prefixo="Bench")
+                gerar_registros(linhas, options["registros"], seed=options["seed"])
+            self.stdout.write(
+                f"{options['registros']} registros gerados em {time.perf_counter() - inicio:.1f}s."
+            )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        consultas = self._consultas()
+        depois = self._medir(consultas, options["repeticoes"], "com índices")
+
+        # desfeito no final: com --manter o banco guardado continua com os índices
+        with transaction.atomic():
+            self._remover_indices_novos()
+            antes = self._medir(consultas, options["repeticoes"], "sem índices")
+            transaction.set_rollback(True)
+
+        for nome in consultas:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {nome}"))
+            for rotulo, resultado in (("sem índices", antes[nome]), ("com índices", depois[nome])):
+                plano, tempo = resultado
+                self.stdout.write(f"-- {rotulo}: {tempo * 1000:.2f} ms (mediana)")
+                self.stdout.write(plano)
+
+    def _consultas(self):
+        ultimo = RegistroProducao.objects.order_by("-data").values_list("data", flat=True).first()
+        setores = list(
+            LinhaProducao.objects.exclude(setor=None).order_by("setor")
+            .values_list("setor", flat=True).distinct()[:2]
+        )
+        lista = RegistroProducao.objects.select_related("linha").order_by("-data", "turno")
+        consultas = {
+            "lista (1ª página)": lista[:20],
+            "lista por setor": lista.filter(linha__setor__in=setores)[:20],
+            "lista de pendentes": lista.filter(finalizada=False)[:20],
+            "busca por nome da linha": lista.filter(linha__nome__icontains="01")[:20],
+            "date_hierarchy (anos)": RegistroProducao.objects.dates("data", "year"),
+            "contagem": RegistroProducao.objects.all(),
+        }
+        if ultimo:
+            consultas["OEE últimos 30 dias"] = calcular_oee(ultimo - timedelta(days=30), ultimo)
+        return consultas
+
+    def _plano(self, qs, rotulo):
+        # o comentário muda o texto do SQL: o sqlite3 reaproveitaria o EXPLAIN
+        # já preparado (com o plano antigo) se o texto fosse idêntico
+        sql, params = qs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql} /* {rotulo} */", params)
+            return "\n".join(" ".join(str(c) for c in linha) for linha in cursor.fetchall())
+
+    def _medir(self, consultas, repeticoes, rotulo):
+        resultados = {}
+        for nome, qs in consultas.items():
+            executar = qs.count if nome == "contagem" else (lambda qs=qs: list(qs.all()))
+            tempos = []
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                executar()
+                tempos.append(time.perf_counter() - inicio)
+            tempos.sort()
+            resultados[nome] = (self._plano(qs, rotulo), tempos[len(tempos) // 2])
+        return resultados
+
+    def _remover_indices_novos(self):
+        with connection.cursor() as cursor:
+            for model, originais in self.INDICES_ORIGINAIS.items():
+                restricoes = connection.introspection.get_constraints(cursor, model._meta.db_table)
+                for nome, info in restricoes.items():
+                    if info["index"] and not info["primary_key"] and not info["unique"] \
+                            and info["columns"] not in originais:
+                        cursor.execute(f"DROP INDEX {connection.ops.quote_name(nome)}")
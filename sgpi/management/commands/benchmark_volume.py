@@ -0,0 +1,269 @@
+import json
+import platform
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Min
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from sgpi.busca import obter_backend
+from sgpi.dados_sinteticos import gerar_linhas, gerar_registros
+from sgpi.forms import ParadaFormSet, RegistroHoraFormSet, RegistroProducaoForm
+from sgpi.models import LinhaProducao, RegistroProducao
+
+PREFIXO = "Bench"
+LINHA_MEDICAO = "Medição benchmark"
+
+
+def _dados(*forms):
+    """POST equivalente ao que o navegador enviaria para os formulários já preenchidos."""
+    dados = {}
+    for form in forms:
+        for campo in form:
+            valor = campo.value()
+            if valor is None or valor is False:
+                continue
+            dados[campo.html_name] = "on" if valor is True else str(valor)
+    return dados
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede lista, detalhe, criação, edição, finalização, changelist do admin e exportação "
+        "com 10 mil, 1 milhão e 10 milhões de registros (--escalas). Roda num banco de teste "
+        "(como o manage.py test; no SQLite, um arquivo temporário), gera os dados de forma "
+        "cumulativa com gerar_dados e grava os resultados em JSON para comparar execuções."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--escalas", default="10000,1000000,10000000")
+        parser.add_argument("--linhas", type=int, default=200)
+        parser.add_argument("--setores", type=int, default=8)
+        parser.add_argument("--horas-dias", type=int, default=30,
+                            help="Dias mais recentes com horas e paradas.")
+        parser.add_argument("--repeticoes", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--arquivo", help="Arquivo do banco de teste no SQLite.")
+        parser.add_argument("--manter", action="store_true",
+                            help="Mantém o banco de teste (a próxima execução reaproveita os dados).")
+        parser.add_argument("--saida", help="JSON de saída. Padrão: benchmark-volume-<data>.json.")
+        parser.add_argument("--comparar", help="JSON de uma execução anterior para comparar.")
+
+    def handle(self, *args, **options):
+        try:
+            escalas = sorted(int(e) for e in options["escalas"].split(","))
+        except ValueError as exc:
+            raise CommandError(f"--escalas inválido: {exc}") from exc
+        if options["repeticoes"] < 1:
+            raise CommandError("--repeticoes precisa ser pelo menos 1.")
+        anterior = None
+        if options["comparar"]:
+            anterior = json.loads(Path(options["comparar"]).read_text(encoding="utf-8"))
+
+        teste = connection.settings_dict.setdefault("TEST", {})
+        if connection.vendor == "sqlite" and not teste.get("NAME"):
+            # o banco de teste padrão do SQLite fica em memória
+            teste["NAME"] = options["arquivo"] or str(Path(tempfile.gettempdir()) / "sgpi-benchmark-volume.sqlite3")
+        nome_original = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=options["manter"],
+        )
+        try:
+            resultado = {
+                "executado_em": timezone.now().isoformat(timespec="seconds"),
+                "ambiente": {
+                    "maquina": platform.platform(),
+                    "processador": platform.processor() or platform.machine(),
+                    "python": platform.python_version(),
+                    "django": django.get_version(),
+                    "banco": f"{connection.vendor} {'.'.join(map(str, connection.Database.version_info))}"
+                    if connection.vendor != "sqlite" else f"sqlite {connection.Database.sqlite_version}",
+                },
+                "opcoes": {k: options[k] for k in ("linhas", "setores", "horas_dias", "repeticoes", "seed")},
+                "escalas": [self._escala(escala, options) for escala in escalas],
+            }
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0, keepdb=options["manter"])
+
+        saida = Path(options["saida"] or f"benchmark-volume-{timezone.localdate():%Y%m%d}.json")
+        saida.write_text(json.dumps(resultado, indent=2, ensure_ascii=False), encoding="utf-8")
+        self.stdout.write(self.style.SUCCESS(f"\nResultados em {saida}."))
+        if anterior:
+            self._comparar(anterior, resultado)
+
+    # -----------------------
+    # Dados
+    # -----------------------
+    def _preparar(self, escala, options):
+        existentes = RegistroProducao.objects.count()
+        hoje = timezone.localdate()
+        linhas = list(LinhaProducao.objects.filter(nome__startswith=f"{PREFIXO} ").order_by("pk"))
+        if existentes >= escala:
+            return linhas, 0.0
+
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            if not linhas:
+                linhas = gerar_linhas(options["linhas"], options["setores"], seed=options["seed"], prefixo=PREFIXO)
+            # cada escala acrescenta registros mais antigos que os já gerados
+            mais_antigo = RegistroProducao.objects.aggregate(d=Min("data"))["d"]
+            gerar_registros(
+                linhas, escala - existentes, seed=options["seed"] + existentes,
+                fim=mais_antigo - timedelta(days=1) if mais_antigo else hoje,
+                horas_desde=hoje - timedelta(days=options["horas_dias"] - 1),
+            )
+            obter_backend().reconstruir()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        return linhas, time.perf_counter() - inicio
+
+    # -----------------------
+    # Medições
+    # -----------------------
+    def _escala(self, escala, options):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {escala} registros"))
+        linhas, geracao = self._preparar(escala, options)
+        if geracao:
+            self.stdout.write(f"dados gerados em {geracao:.1f}s")
+
+        admin = User.objects.filter(username="benchmark").first() or User.objects.create_superuser(
+            "benchmark", "benchmark@sgpi.local", None,
+        )
+        medicao, _ = LinhaProducao.objects.get_or_create(
+            nome=LINHA_MEDICAO, defaults={"setor": linhas[0].setor, "capacidade_nominal": 500},
+        )
+        repeticoes = options["repeticoes"]
+        detalhado = (
+            RegistroProducao.objects.filter(linha__in=linhas, finalizada=True, registros_hora__isnull=False)
+            .order_by("-data", "turno", "pk").first()
+        )
+        abertos = list(
+            RegistroProducao.objects.filter(linha__in=linhas, finalizada=False).order_by("pk")[:repeticoes + 2]
+        )
+        if detalhado is None or len(abertos) < repeticoes + 2:
+            raise CommandError("Poucos registros recentes para medir; aumente --linhas ou --horas-dias.")
+        editado, finalizar = abertos[0], abertos[1:]
+
+        cliente = Client()
+        cliente.force_login(admin)
+        rotas = {}
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            rotas["lista"] = self._medir(repeticoes, lambda i: cliente.get(reverse("registros-lista")))
+            rotas["detalhe"] = self._medir(
+                repeticoes, lambda i: cliente.get(reverse("registros-detalhes", args=[detalhado.pk])),
+            )
+            rotas["criar"] = self._medir(repeticoes, lambda i: cliente.post(
+                reverse("registros-criar"), self._dados_criacao(medicao, timezone.localdate() - timedelta(days=i)),
+            ), status=302)
+            dados_edicao = self._dados_edicao(editado, admin)
+            rotas["editar"] = self._medir(
+                repeticoes, lambda i: cliente.post(reverse("registros-editar", args=[editado.pk]), dados_edicao),
+                status=302,
+            )
+            rotas["finalizar"] = self._medir(
+                repeticoes, lambda i: cliente.post(reverse("registros-finalizar", args=[finalizar[i].pk])),
+                status=302,
+            )
+            rotas["admin_changelist"] = self._medir(
+                repeticoes, lambda i: cliente.get(reverse("admin:sgpi_registroproducao_changelist")),
+            )
+            rotas["exportar"] = self._medir(
+                repeticoes, lambda i: cliente.get(reverse("registros-exportar"), {"q": linhas[0].nome}),
+            )
+
+        # devolve o banco ao estado gerado para a próxima escala
+        RegistroProducao.objects.filter(linha=medicao).delete()
+        RegistroProducao.objects.filter(pk__in=[r.pk for r in finalizar]).reabrir()
+
+        for nome, medida in rotas.items():
+            self.stdout.write(
+                f"{nome:<17} mediana {medida['mediana_ms']:>9.1f} ms  p95 {medida['p95_ms']:>9.1f} ms  "
+                f"{medida['consultas']:>3} consulta(s)"
+            )
+        tamanho = None
+        if connection.vendor == "sqlite":
+            tamanho = round(Path(connection.settings_dict["NAME"]).stat().st_size / 2**20, 1)
+        return {"registros": escala, "geracao_s": round(geracao, 1), "tamanho_mb": tamanho, "rotas": rotas}
+
+    @staticmethod
+    def _medir(repeticoes, requisicao, status=200):
+        # a primeira chamada só aquece caches; cada chamada recebe um índice diferente
+        # (as rotas que gravam usam um registro/data por chamada)
+        tempos, consultas = [], []
+        for n, i in enumerate([repeticoes, *range(repeticoes)]):
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                resposta = requisicao(i)
+                if resposta.streaming:
+                    for _ in resposta.streaming_content:
+                        pass
+                decorrido = time.perf_counter() - inicio
+            if resposta.status_code != status:
+                raise CommandError(f"{resposta.request['PATH_INFO']}: status {resposta.status_code}.")
+            if n:
+                tempos.append(decorrido)
+                consultas.append(len(capturadas))
+        p95 = statistics.quantiles(tempos, n=20)[-1] if len(tempos) > 1 else tempos[0]
+        return {
+            "mediana_ms": round(statistics.median(tempos) * 1000, 2),
+            "p95_ms": round(p95 * 1000, 2),
+            "min_ms": round(min(tempos) * 1000, 2),
+            "consultas": max(consultas),
+        }
+
+    @staticmethod
+    def _dados_criacao(linha, data):
+        dados = {
+            "linha": linha.pk, "data": data.isoformat(), "turno": RegistroProducao.TURNO_CHOICES[0][0],
+            "salvar": "1",
+            "hora-TOTAL_FORMS": 8, "hora-INITIAL_FORMS": 0,
+            "parada-TOTAL_FORMS": 1, "parada-INITIAL_FORMS": 0,
+            "parada-0-hora_inicio": "09:00", "parada-0-hora_fim": "09:15", "parada-0-motivo": "Setup",
+        }
+        for h in range(8):
+            dados.update({
+                f"hora-{h}-hora_inicio": f"{6 + h:02d}:00", f"hora-{h}-hora_fim": f"{7 + h:02d}:00",
+                f"hora-{h}-quantidade_produzida": 100 + h, f"hora-{h}-quantidade_defeituosa": h,
+            })
+        return dados
+
+    @staticmethod
+    def _dados_edicao(registro, usuario):
+        form = RegistroProducaoForm(instance=registro, user=usuario)
+        horas = RegistroHoraFormSet(instance=registro, prefix="hora")
+        paradas = ParadaFormSet(instance=registro, prefix="parada")
+        dados = _dados(form, horas.management_form, *horas, paradas.management_form, *paradas)
+        for h in horas.initial_forms:
+            chave = h["quantidade_produzida"].html_name
+            dados[chave] = str(int(dados.get(chave) or 0) + 1)
+        dados["salvar"] = "1"
+        return dados
+
+    # -----------------------
+    # Comparação
+    # -----------------------
+    def _comparar(self, anterior, atual):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n== comparação com {anterior['executado_em']}"))
+        antes = {e["registros"]: e["rotas"] for e in anterior["escalas"]}
+        for escala in atual["escalas"]:
+            rotas_antes = antes.get(escala["registros"])
+            if not rotas_antes:
+                continue
+            for nome, medida in escala["rotas"].items():
+                if nome not in rotas_antes:
+                    continue
+                base = rotas_antes[nome]["mediana_ms"]
+                self.stdout.write(
+                    f"{escala['registros']:>9} {nome:<17} {base:>9.1f} -> {medida['mediana_ms']:>9.1f} ms "
+                    f"({medida['mediana_ms'] / base if base else 0:.2f}x)  consultas "
+                    f"{rotas_antes[nome]['consultas']} -> {medida['consultas']}"
+                )
@@ -0,0 +1,34 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sgpi.models import RegistroProducao
+
+
+class Command(BaseCommand):
+    help = "Finaliza de uma vez todos os registros abertos de um turno (fábrica inteira ou um setor)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--data", help="Data do turno (AAAA-MM-DD). Padrão: hoje.")
+        parser.add_argument("--turno", required=True, help='Turno, ex.: "1/especial" ou só "1".')
+        parser.add_argument("--setor", help="Fecha só as linhas deste setor.")
+
+    def handle(self, *args, **options):
+        try:
+            data = date.fromisoformat(options["data"]) if options["data"] else timezone.localdate()
+        except ValueError as exc:
+            raise CommandError(f"Data inválida: {exc}") from exc
+
+        turno = RegistroProducao.turno_por_codigo(options["turno"])
+        if turno is None:
+            raise CommandError(f"Turno inválido: {options['turno']!r}")
+
+        registros = RegistroProducao.objects.filter(data=data, turno=turno)
+        if options["setor"]:
+            registros = registros.filter(linha__setor=options["setor"])
+
+        finalizados = registros.finalizar()
+        self.stdout.write(self.style.SUCCESS(
+            f"Turno {turno} de {data:%d/%m/%Y}: {finalizados} registro(s) finalizado(s)."
+        ))
@@ -0,0 +1,72 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from sgpi.busca import obter_backend
+from sgpi.consolidacao import reconstruir
+from sgpi.dados_sinteticos import gerar_linhas, gerar_registros
+from sgpi.models import LinhaProducao, RegistroProducao
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera dados sintéticos reproduzíveis: --linhas linhas em --setores setores, três "
+        "turnos por dia durante --anos, cada registro com as horas do turno e paradas "
+        "aleatórias. Use --horas-dias para detalhar só os dias mais recentes em volumes "
+        "grandes. No final refaz o índice de busca e os consolidados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--linhas", type=int, default=40)
+        parser.add_argument("--setores", type=int, default=8)
+        parser.add_argument("--anos", type=float, default=1.0)
+        parser.add_argument("--registros", type=int, default=0, help="Total de registros (ignora --anos).")
+        parser.add_argument("--horas-dias", type=int, default=None,
+                            help="Só os últimos N dias ganham horas e paradas (padrão: todos).")
+        parser.add_argument("--paradas", type=int, default=3, help="Máximo de paradas por registro.")
+        parser.add_argument("--fim", help="Último dia (AAAA-MM-DD). Padrão: hoje.")
+        parser.add_argument("--prefixo", default="Linha", help="Prefixo do nome das linhas.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--sem-derivados", action="store_true",
+                            help="Não refaz o índice de busca nem os consolidados.")
+
+    def handle(self, *args, **options):
+        try:
+            fim = date.fromisoformat(options["fim"]) if options["fim"] else timezone.localdate()
+        except ValueError as exc:
+            raise CommandError(f"Data inválida: {exc}") from exc
+        if LinhaProducao.objects.filter(nome__startswith=f"{options['prefixo']} ").exists():
+            raise CommandError(
+                f"Já existem linhas \"{options['prefixo']} ...\"; use outro --prefixo ou um banco vazio."
+            )
+
+        turnos = len(RegistroProducao.TURNO_CHOICES)
+        total = options["registros"] or options["linhas"] * turnos * round(365 * options["anos"])
+        horas_desde = date.min
+        if options["horas_dias"] is not None:
+            horas_desde = fim - timedelta(days=options["horas_dias"] - 1)
+
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            linhas = gerar_linhas(options["linhas"], options["setores"], seed=options["seed"],
+                                  prefixo=options["prefixo"])
+            de, ate = gerar_registros(linhas, total, seed=options["seed"], fim=fim,
+                                      horas_desde=horas_desde, max_paradas=options["paradas"])
+        self.stdout.write(
+            f"{total} registros de {de} a {ate} em {len(linhas)} linhas gerados em "
+            f"{time.perf_counter() - inicio:.1f}s."
+        )
+        if options["sem_derivados"]:
+            return
+
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            diarios, mensais = reconstruir(RegistroProducao.objects.all(), de, ate)
+            indexados = obter_backend().reconstruir()
+        self.stdout.write(self.style.SUCCESS(
+            f"{diarios} consolidado(s) diário(s), {mensais} mensal(is) e {indexados} registro(s) "
+            f"indexado(s) em {time.perf_counter() - inicio:.1f}s."
+        ))
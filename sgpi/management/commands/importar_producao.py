@@ -0,0 +1,46 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sgpi.importacao import TAMANHO_LOTE, importar_registros_hora, ler_csv, ler_xlsx
+
+
+class Command(BaseCommand):
+    help = "Importa a produção hora a hora de um arquivo CSV ou XLSX em lotes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("arquivo", help="Caminho do arquivo .csv ou .xlsx.")
+        parser.add_argument("--lote", type=int, default=TAMANHO_LOTE, help="Linhas por lote de gravação.")
+        parser.add_argument("--erros", help="Grava o relatório de erros (CSV) neste caminho.")
+        parser.add_argument("--encoding", default="utf-8-sig", help="Codificação do CSV.")
+
+    def handle(self, *args, **options):
+        caminho = Path(options["arquivo"])
+        if not caminho.exists():
+            raise CommandError(f"Arquivo não encontrado: {caminho}")
+
+        inicio = time.perf_counter()
+        try:
+            if caminho.suffix.lower() == ".xlsx":
+                with caminho.open("rb") as arquivo:
+                    resultado = importar_registros_hora(ler_xlsx(arquivo), options["lote"])
+            else:
+                with caminho.open(encoding=options["encoding"], newline="") as arquivo:
+                    resultado = importar_registros_hora(ler_csv(arquivo), options["lote"])
+        except ImportError as exc:
+            raise CommandError(str(exc)) from exc
+        duracao = time.perf_counter() - inicio
+
+        self.stdout.write(
+            f"{resultado.lidas} linha(s) lida(s), {resultado.inseridas} inserida(s), "
+            f"{resultado.registros_criados} registro(s) criado(s), "
+            f"{len(resultado.registros_afetados)} registro(s) recalculado(s) em {duracao:.1f}s."
+        )
+        if resultado.total_erros:
+            self.stdout.write(self.style.WARNING(f"{resultado.total_erros} linha(s) com erro."))
+            if options["erros"]:
+                Path(options["erros"]).write_text(resultado.relatorio_csv(), encoding="utf-8")
+                self.stdout.write(f"Relatório de erros gravado em {options['erros']}.")
+        else:
+            self.stdout.write(self.style.SUCCESS("Importação concluída sem erros."))
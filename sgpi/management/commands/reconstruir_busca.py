@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from sgpi.busca import obter_backend
+
+
+class Command(BaseCommand):
+    help = "Refaz o índice de busca textual (linha, setor e motivos de parada)."
+
+    def handle(self, *args, **options):
+        backend = obter_backend()
+        total = backend.reconstruir()
+        self.stdout.write(self.style.SUCCESS(
+            f"{type(backend).__name__}: {total} registro(s) indexado(s)."
+        ))
@@ -0,0 +1,38 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sgpi import arquivo
+from sgpi.consolidacao import reconstruir
+from sgpi.models import RegistroProducao
+
+
+class Command(BaseCommand):
+    help = (
+        "Recria ProducaoDiaria/ProducaoMensal a partir dos registros finalizados "
+        "(carga inicial ou correção). O período é ampliado para meses inteiros."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--de", dest="data_inicio", help="Data inicial (AAAA-MM-DD).")
+        parser.add_argument("--ate", dest="data_fim", help="Data final (AAAA-MM-DD).")
+
+    def handle(self, *args, **options):
+        try:
+            data_inicio = date.fromisoformat(options["data_inicio"]) if options["data_inicio"] else None
+            data_fim = date.fromisoformat(options["data_fim"]) if options["data_fim"] else None
+        except ValueError as exc:
+            raise CommandError(f"Data inválida: {exc}") from exc
+
+        # os meses arquivados não têm mais registros para refazer os consolidados
+        inicio_livre = arquivo.inicio_livre()
+        if inicio_livre and (data_inicio is None or data_inicio < inicio_livre):
+            self.stdout.write(self.style.WARNING(
+                f"Meses arquivados preservados: reconstruindo a partir de {inicio_livre:%m/%Y}."
+            ))
+            data_inicio = inicio_livre
+
+        diarios, mensais = reconstruir(RegistroProducao.objects.all(), data_inicio, data_fim)
+        self.stdout.write(self.style.SUCCESS(
+            f"{diarios} consolidado(s) diário(s) e {mensais} mensal(is) recriado(s)."
+        ))
@@ -0,0 +1,35 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sgpi import arquivo
+
+
+class Command(BaseCommand):
+    help = (
+        "Traz registros do arquivo frio de volta para as tabelas quentes (continuam "
+        "finalizados). Reabrir um registro arquivado pela tela faz o mesmo para ele."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--registro", type=int, action="append", dest="ids", help="Id do registro (repetível).")
+        parser.add_argument("--de", dest="data_inicio", help="Data inicial (AAAA-MM-DD).")
+        parser.add_argument("--ate", dest="data_fim", help="Data final (AAAA-MM-DD).")
+        parser.add_argument("--linha", type=int, action="append", dest="linha_ids", help="Id da linha (repetível).")
+
+    def handle(self, *args, **options):
+        if not any(options[k] for k in ("ids", "data_inicio", "data_fim", "linha_ids")):
+            raise CommandError("Informe --registro, --de/--ate ou --linha.")
+        try:
+            data_inicio = date.fromisoformat(options["data_inicio"]) if options["data_inicio"] else None
+            data_fim = date.fromisoformat(options["data_fim"]) if options["data_fim"] else None
+        except ValueError as exc:
+            raise CommandError(f"Data inválida: {exc}") from exc
+
+        try:
+            total = arquivo.restaurar(
+                ids=options["ids"], de=data_inicio, ate=data_fim, linha_ids=options["linha_ids"],
+            )
+        except arquivo.ConflitoRestauracao as exc:
+            raise CommandError(f"{exc}. Exclua ou ajuste esses registros e tente de novo.") from exc
+        self.stdout.write(self.style.SUCCESS(f"{total} registro(s) restaurado(s)."))
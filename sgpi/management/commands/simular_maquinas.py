@@ -0,0 +1,112 @@
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from sgpi.models import LinhaProducao
+
+
+class Command(BaseCommand):
+    help = (
+        "Simula máquinas enviando contadores para /sgpi/ingestao/contadores/ de um "
+        "servidor já no ar (ex.: uvicorn project.asgi:application). Cada linha envia "
+        "um evento a cada --intervalo segundos; no final mostra eventos/s e latência."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000/sgpi/ingestao/contadores/")
+        parser.add_argument("--token", default=None, help="Padrão: SGPI_INGESTAO_TOKEN.")
+        parser.add_argument("--linhas", type=int, default=200, help="Quantas linhas (as primeiras do banco).")
+        parser.add_argument("--intervalo", type=float, default=2.0, help="Segundos entre envios de cada linha.")
+        parser.add_argument("--duracao", type=float, default=30.0)
+        parser.add_argument("--workers", type=int, default=16, help="Conexões HTTP simultâneas.")
+        parser.add_argument("--agrupar", type=int, default=1, help="Eventos por requisição.")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        token = options["token"] or getattr(settings, "SGPI_INGESTAO_TOKEN", None)
+        if not token:
+            raise CommandError("Informe --token ou configure SGPI_INGESTAO_TOKEN.")
+        linhas = list(LinhaProducao.objects.order_by("pk").values_list("pk", flat=True)[:options["linhas"]])
+        if not linhas:
+            raise CommandError("Nenhuma linha de produção cadastrada.")
+
+        url = urlsplit(options["url"])
+        fim = time.monotonic() + options["duracao"]
+        # cada worker cuida de uma fatia das linhas
+        fatias = [linhas[i::options["workers"]] for i in range(options["workers"])]
+        resultados = [{"latencias": [], "eventos": 0, "erros": 0, "produzidas": 0} for _ in fatias]
+        threads = [
+            threading.Thread(
+                target=self._worker,
+                args=(url, token, fatia, options, fim, resultado, random.Random(options["seed"] + i)),
+            )
+            for i, (fatia, resultado) in enumerate(zip(fatias, resultados))
+            if fatia
+        ]
+        inicio = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        decorrido = time.monotonic() - inicio
+
+        latencias = sorted(l for r in resultados for l in r["latencias"])
+        eventos = sum(r["eventos"] for r in resultados)
+        erros = sum(r["erros"] for r in resultados)
+        self.stdout.write(
+            f"{eventos} eventos em {len(latencias)} requisições ({erros} erro(s)) em {decorrido:.1f}s: "
+            f"{eventos / decorrido:.0f} eventos/s."
+        )
+        self.stdout.write(f"Peças enviadas: {sum(r['produzidas'] for r in resultados)}.")
+        if latencias:
+            percentis = statistics.quantiles(latencias, n=100)
+            self.stdout.write(
+                f"Latência (ms): p50 {percentis[49] * 1000:.1f}  p95 {percentis[94] * 1000:.1f}  "
+                f"p99 {percentis[98] * 1000:.1f}  máx {latencias[-1] * 1000:.1f}"
+            )
+
+    def _worker(self, url, token, linhas, options, fim, resultado, rnd):
+        conexao_cls = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        conexao = conexao_cls(url.hostname, url.port, timeout=10)
+        cabecalhos = {"Content-Type": "application/json", "Authorization": f"Token {token}"}
+        # espalha as linhas dentro do intervalo para não enviarem todas juntas
+        proximo = {linha: time.monotonic() + rnd.uniform(0, options["intervalo"]) for linha in linhas}
+        fila = []
+        while time.monotonic() < fim:
+            linha, quando = min(proximo.items(), key=lambda item: item[1])
+            espera = quando - time.monotonic()
+            if espera > 0:
+                time.sleep(min(espera, max(fim - time.monotonic(), 0)))
+            produzida = rnd.randint(0, 12)
+            fila.append({"linha": linha, "produzida": produzida, "defeituosa": rnd.randint(0, produzida // 6)})
+            proximo[linha] = quando + options["intervalo"]
+            if len(fila) < options["agrupar"]:
+                continue
+
+            corpo = json.dumps({"eventos": fila})
+            inicio = time.perf_counter()
+            try:
+                conexao.request("POST", url.path, corpo, cabecalhos)
+                resposta = conexao.getresponse()
+                dados = resposta.read()
+            except (OSError, http.client.HTTPException):
+                resultado["erros"] += 1
+                conexao.close()
+                fila = []
+                continue
+            resultado["latencias"].append(time.perf_counter() - inicio)
+            if resposta.status == 202:
+                aceitos = json.loads(dados)["aceitos"]
+                resultado["eventos"] += aceitos
+                resultado["produzidas"] += sum(e["produzida"] for e in fila) if aceitos == len(fila) else 0
+            else:
+                resultado["erros"] += 1
+            fila = []
+        conexao.close()
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from sgpi.models import RegistroProducao
+from sgpi.painel import invalidar_registros
+from sgpi.recalculo import expressoes_totais, recalcular_registros
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara os totais gravados em cada RegistroProducao com a soma real de "
+        "RegistroHora/Parada e, com --corrigir, recalcula os divergentes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corrigir", action="store_true", help="Recalcula os registros divergentes.")
+        parser.add_argument("--de", dest="data_inicio", help="Data inicial (AAAA-MM-DD).")
+        parser.add_argument("--ate", dest="data_fim", help="Data final (AAAA-MM-DD).")
+
+    def handle(self, *args, **options):
+        reais = expressoes_totais()
+        qs = RegistroProducao.objects.annotate(**{f"real_{campo}": expr for campo, expr in reais.items()})
+        if options["data_inicio"]:
+            qs = qs.filter(data__gte=options["data_inicio"])
+        if options["data_fim"]:
+            qs = qs.filter(data__lte=options["data_fim"])
+
+        divergente = Q()
+        for campo in reais:
+            divergente |= ~Q(**{campo: F(f"real_{campo}")})
+        campos = ["pk", *reais, *(f"real_{c}" for c in reais)]
+        divergentes = list(qs.filter(divergente).values_list(*campos))
+
+        for linha in divergentes:
+            pk, gravados, reais_ = linha[0], linha[1:4], linha[4:]
+            self.stdout.write(f"Registro {pk}: gravado {gravados} / real {reais_}")
+
+        if not divergentes:
+            self.stdout.write(self.style.SUCCESS("Todos os totais conferem."))
+            return
+
+        if options["corrigir"]:
+            ids = [linha[0] for linha in divergentes]
+            recalcular_registros(ids)
+            invalidar_registros(ids)
+            self.stdout.write(self.style.SUCCESS(f"{len(divergentes)} registro(s) recalculado(s)."))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"{len(divergentes)} registro(s) divergente(s). Use --corrigir para recalcular."
+            ))
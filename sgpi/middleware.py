@@ -0,0 +1,164 @@
+# sgpi/middleware.py
+"""
+Instrumentação por rota (opcional): inclua
+``"sgpi.middleware.InstrumentacaoMiddleware"`` no MIDDLEWARE.
+
+Para cada requisição mede, pelo nome da URL (``registros-lista``,
+``registros-criar``...), quantas consultas SQL foram feitas, o tempo gasto
+no banco, as consultas repetidas (mesma SQL com parâmetros diferentes, a
+marca de um N+1) e o tempo total. Cada requisição vira uma linha JSON no
+logger ``sgpi.instrumentacao``; as últimas ``SGPI_INSTRUMENTACAO_JANELA``
+medições de cada rota ficam em memória e o superuser vê os percentis em
+/sgpi/instrumentacao/ (por processo).
+
+Orçamento: ``SGPI_ORCAMENTO_CONSULTAS = {"registros-lista": 4, ...}``.
+Passar do orçamento gera um aviso no log; com ``SGPI_ORCAMENTO_ESTRITO``
+levanta OrcamentoConsultasExcedido, o que faz o teste da view falhar.
+
+Respostas em streaming são medidas até a resposta sair da view (o que a
+geração do corpo consulta depois não entra).
+"""
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger("sgpi.instrumentacao")
+
+_IN_LISTA = re.compile(r"IN \((?:%s, )*%s\)")
+_ESPACOS = re.compile(r"\s+")
+
+
+class OrcamentoConsultasExcedido(AssertionError):
+    pass
+
+
+def impressao_digital(sql):
+    """SQL sem os detalhes que variam entre execuções da mesma consulta."""
+    return _IN_LISTA.sub("IN (...)", _ESPACOS.sub(" ", sql).strip())
+
+
+def orcamento(rota):
+    return getattr(settings, "SGPI_ORCAMENTO_CONSULTAS", {}).get(rota)
+
+
+# -----------------------
+# Janela de medições por rota
+# -----------------------
+class Medicoes:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rotas = {}
+        self._repetidas = {}
+
+    def registrar(self, rota, consultas, tempo_db, tempo_total, repetidas):
+        janela = getattr(settings, "SGPI_INSTRUMENTACAO_JANELA", 500)
+        with self._lock:
+            medicoes = self._rotas.get(rota)
+            if medicoes is None or medicoes.maxlen != janela:
+                medicoes = self._rotas[rota] = deque(medicoes or (), maxlen=janela)
+            medicoes.append((consultas, tempo_db, tempo_total))
+            self._repetidas.setdefault(rota, Counter()).update(repetidas)
+
+    def limpar(self):
+        with self._lock:
+            self._rotas.clear()
+            self._repetidas.clear()
+
+    @staticmethod
+    def _percentis(valores):
+        valores = sorted(valores)
+
+        def p(q):
+            return valores[min(len(valores) - 1, int(q * len(valores)))]
+
+        return {"p50": p(0.50), "p95": p(0.95), "p99": p(0.99), "max": valores[-1]}
+
+    def resumo(self):
+        with self._lock:
+            rotas = {rota: list(medicoes) for rota, medicoes in self._rotas.items()}
+            repetidas = {rota: contador.most_common(5) for rota, contador in self._repetidas.items()}
+        return {
+            rota: {
+                "requisicoes": len(medicoes),
+                "orcamento": orcamento(rota),
+                "consultas": self._percentis([m[0] for m in medicoes]),
+                "tempo_db_ms": self._percentis([round(m[1] * 1000, 2) for m in medicoes]),
+                "tempo_ms": self._percentis([round(m[2] * 1000, 2) for m in medicoes]),
+                "repetidas": [{"sql": sql, "vezes": vezes} for sql, vezes in repetidas.get(rota, [])],
+            }
+            for rota, medicoes in sorted(rotas.items())
+        }
+
+
+medicoes = Medicoes()
+
+
+# -----------------------
+# Middleware
+# -----------------------
+class _Coletor:
+    def __init__(self):
+        self.consultas = Counter()
+        self.total = 0
+        self.tempo = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tempo += time.perf_counter() - inicio
+            self.total += 1
+            self.consultas[impressao_digital(sql)] += 1
+
+
+class InstrumentacaoMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        coletor = _Coletor()
+        inicio = time.perf_counter()
+        with ExitStack() as pilha:
+            for alias in connections:
+                pilha.enter_context(connections[alias].execute_wrapper(coletor))
+            response = self.get_response(request)
+        decorrido = time.perf_counter() - inicio
+
+        match = request.resolver_match
+        rota = (match.url_name or match.view_name) if match else "<sem rota>"
+        repetidas = {sql: n for sql, n in coletor.consultas.items() if n > 1}
+        medicoes.registrar(rota, coletor.total, coletor.tempo, decorrido, repetidas)
+
+        limite = orcamento(rota)
+        excedeu = limite is not None and coletor.total > limite
+        logger.log(
+            logging.WARNING if excedeu else logging.INFO,
+            json.dumps({
+                "rota": rota,
+                "metodo": request.method,
+                "status": response.status_code,
+                "consultas": coletor.total,
+                "orcamento": limite,
+                "tempo_db_ms": round(coletor.tempo * 1000, 2),
+                "tempo_ms": round(decorrido * 1000, 2),
+                "repetidas": [
+                    {"sql": sql[:200], "vezes": n}
+                    for sql, n in sorted(repetidas.items(), key=lambda item: -item[1])[:3]
+                ],
+                "streaming": response.streaming,
+            }, ensure_ascii=False),
+        )
+        if excedeu and getattr(settings, "SGPI_ORCAMENTO_ESTRITO", False):
+            raise OrcamentoConsultasExcedido(
+                f"{rota}: {coletor.total} consultas (orçamento {limite}). Repetidas: "
+                + "; ".join(f"{n}x {sql[:120]}" for sql, n in repetidas.items())
+            )
+        return response
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sgpi', '0009_permissaosetorusuario_delete_permissaolinhausuario'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='linhaproducao',
+            name='setor',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='registroproducao',
+            index=models.Index(fields=['-data', 'turno'], name='registro_data_turno_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroproducao',
+            index=models.Index(fields=['finalizada', '-data', 'turno'], name='registro_final_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroproducao',
+            index=models.Index(fields=['data', 'linha', 'quantidade_produzida', 'quantidade_defeituosa', 'tempo_parado'], name='registro_data_linha_cov_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sgpi', '0010_indices_registro_linha'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProducaoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('setor', models.CharField(blank=True, max_length=100, null=True)),
+                ('quantidade_produzida', models.PositiveIntegerField(default=0)),
+                ('quantidade_defeituosa', models.PositiveIntegerField(default=0)),
+                ('tempo_parado', models.PositiveIntegerField(default=0, help_text='Tempo parado em minutos')),
+                ('minutos_planejados', models.PositiveIntegerField(default=0)),
+                ('registros', models.PositiveIntegerField(default=0)),
+                ('dia', models.DateField()),
+                ('linha', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='sgpi.linhaproducao')),
+            ],
+            options={
+                'verbose_name': 'Produção diária',
+                'verbose_name_plural': 'Produção diária',
+                'indexes': [models.Index(fields=['setor', 'dia'], name='producao_diaria_setor_idx')],
+                'constraints': [models.UniqueConstraint(fields=('linha', 'dia'), name='uniq_producao_diaria_linha_dia')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProducaoMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('setor', models.CharField(blank=True, max_length=100, null=True)),
+                ('quantidade_produzida', models.PositiveIntegerField(default=0)),
+                ('quantidade_defeituosa', models.PositiveIntegerField(default=0)),
+                ('tempo_parado', models.PositiveIntegerField(default=0, help_text='Tempo parado em minutos')),
+                ('minutos_planejados', models.PositiveIntegerField(default=0)),
+                ('registros', models.PositiveIntegerField(default=0)),
+                ('mes', models.DateField(help_text='Primeiro dia do mês')),
+                ('linha', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='sgpi.linhaproducao')),
+            ],
+            options={
+                'verbose_name': 'Produção mensal',
+                'verbose_name_plural': 'Produção mensal',
+                'indexes': [models.Index(fields=['setor', 'mes'], name='producao_mensal_setor_idx')],
+                'constraints': [models.UniqueConstraint(fields=('linha', 'mes'), name='uniq_producao_mensal_linha_mes')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations, transaction
+from django.db.utils import OperationalError
+
+
+def criar_indice(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    try:
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE sgpi_busca USING fts5("
+                "linha, setor, motivos, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+    except OperationalError:
+        # SQLite compilado sem FTS5: a busca fica no icontains (BuscaSimples)
+        return
+    schema_editor.execute(
+        """
+        INSERT INTO sgpi_busca (rowid, linha, setor, motivos)
+        SELECT r.id, l.nome, COALESCE(l.setor, ''),
+               COALESCE(r.motivo_parada, '') || ' ' || COALESCE(
+                   (SELECT group_concat(p.motivo, ' ') FROM sgpi_parada p WHERE p.registro_id = r.id), ''
+               )
+        FROM sgpi_registroproducao r JOIN sgpi_linhaproducao l ON l.id = r.linha_id
+        """
+    )
+
+
+def remover_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS sgpi_busca")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sgpi", "0011_consolidados_producao"),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sgpi', '0012_indice_busca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MotivoParada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('descricao', models.CharField(max_length=120)),
+                ('chave', models.CharField(blank=True, help_text='Texto normalizado usado para classificar paradas com motivo livre', max_length=120, unique=True)),
+                ('ativo', models.BooleanField(default=True)),
+            ],
+            options={
+                'verbose_name': 'Motivo de parada',
+                'verbose_name_plural': 'Motivos de parada',
+                'ordering': ('descricao',),
+            },
+        ),
+        migrations.AddField(
+            model_name='parada',
+            name='motivo_padrao',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='paradas', to='sgpi.motivoparada', verbose_name='motivo padronizado'),
+        ),
+        migrations.AddIndex(
+            model_name='parada',
+            index=models.Index(fields=['registro', 'motivo_padrao', 'duracao'], name='parada_registro_motivo_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.db import migrations
+from django.db.models import Count
+
+PALAVRAS_IGNORADAS = frozenset(
+    "a o as os e de da do das dos na no nas nos em para por com um uma".split()
+)
+
+
+def normalizar_motivo(texto):
+    """
+    Cópia de sgpi.models.normalizar_motivo na época desta migração (que não
+    pode mudar junto com o código): minúsculas, sem acento, pontuação nem
+    preposições/artigos.
+    """
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    palavras = [p for p in re.findall(r"[a-z0-9]+", texto) if p not in PALAVRAS_IGNORADAS]
+    return " ".join(palavras)[:120]
+
+
+def agrupar_motivos(apps, schema_editor):
+    """Cria um MotivoParada por grupo de textos livres com a mesma chave normalizada."""
+    Parada = apps.get_model("sgpi", "Parada")
+    MotivoParada = apps.get_model("sgpi", "MotivoParada")
+    banco = schema_editor.connection.alias
+
+    grupos = defaultdict(Counter)
+    textos = (
+        Parada.objects.using(banco).exclude(motivo__isnull=True).exclude(motivo="")
+        .order_by().values_list("motivo").annotate(n=Count("id"))
+    )
+    for motivo, n in textos:
+        chave = normalizar_motivo(motivo)
+        if chave:
+            grupos[chave][motivo] += n
+
+    for chave, variantes in grupos.items():
+        descricao = " ".join(variantes.most_common(1)[0][0].split()).rstrip(".")[:120]
+        motivo_padrao, _ = MotivoParada.objects.using(banco).get_or_create(
+            chave=chave, defaults={"descricao": descricao[:1].upper() + descricao[1:]}
+        )
+        originais = list(variantes)
+        for i in range(0, len(originais), 500):
+            Parada.objects.using(banco).filter(
+                motivo__in=originais[i:i + 500], motivo_padrao__isnull=True
+            ).update(motivo_padrao=motivo_padrao)
+
+
+def desfazer(apps, schema_editor):
+    banco = schema_editor.connection.alias
+    apps.get_model("sgpi", "Parada").objects.using(banco).update(motivo_padrao=None)
+    apps.get_model("sgpi", "MotivoParada").objects.using(banco).all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sgpi", "0013_motivos_parada"),
+    ]
+
+    operations = [
+        migrations.RunPython(agrupar_motivos, desfazer),
+    ]
@@ -0,0 +1,127 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:30
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+
+
+def _refazer_consolidados(apps, banco, registros):
+    """
+    Refaz ProducaoDiaria/ProducaoMensal das (linha, dia) e (linha, mês) dos
+    ``registros`` finalizados. Cópia mínima de sgpi.consolidacao.reconstruir:
+    migração não importa código vivo.
+    """
+    RegistroProducao = apps.get_model("sgpi", "RegistroProducao")
+    ProducaoDiaria = apps.get_model("sgpi", "ProducaoDiaria")
+    ProducaoMensal = apps.get_model("sgpi", "ProducaoMensal")
+    minutos_turno = getattr(settings, "SGPI_MINUTOS_TURNO", 480)
+
+    chaves = set(
+        RegistroProducao.objects.using(banco).filter(pk__in=registros, finalizada=True)
+        .values_list("linha_id", "data")
+    )
+    meses = {(linha, data.replace(day=1)) for linha, data in chaves}
+    if not meses:
+        return
+
+    for model, periodo, agrupamento, pares in (
+        (ProducaoDiaria, "dia", "data", chaves),
+        (ProducaoMensal, "mes", "mes_registro", meses),
+    ):
+        for linha, p in pares:
+            model.objects.using(banco).filter(linha_id=linha, **{periodo: p}).delete()
+        linhas = {linha for linha, _ in pares}
+        totais = (
+            RegistroProducao.objects.using(banco)
+            .filter(finalizada=True, linha_id__in=linhas)
+            .annotate(mes_registro=TruncMonth("data"))
+            .order_by().values("linha_id", "linha__setor", agrupamento)
+            .annotate(
+                quantidade_produzida=Sum("quantidade_produzida"),
+                quantidade_defeituosa=Sum("quantidade_defeituosa"),
+                tempo_parado=Sum("tempo_parado"),
+                registros=Count("id"),
+            )
+        )
+        model.objects.using(banco).bulk_create([
+            model(
+                linha_id=g["linha_id"],
+                setor=g["linha__setor"],
+                quantidade_produzida=g["quantidade_produzida"],
+                quantidade_defeituosa=g["quantidade_defeituosa"],
+                tempo_parado=g["tempo_parado"],
+                minutos_planejados=g["registros"] * minutos_turno,
+                registros=g["registros"],
+                **{periodo: g[agrupamento]},
+            )
+            for g in totais
+            if (g["linha_id"], g[agrupamento]) in pares
+        ])
+
+
+def juntar_horas_duplicadas(apps, schema_editor):
+    """
+    Antes da restrição: cada (registro, hora_inicio) repetido vira uma linha
+    só (a mais recente), com a soma das quantidades das repetidas — nenhuma
+    produção lançada se perde. Os totais desses registros são recalculados e
+    os consolidados dos finalizados, refeitos.
+    """
+    RegistroHora = apps.get_model("sgpi", "RegistroHora")
+    RegistroProducao = apps.get_model("sgpi", "RegistroProducao")
+    banco = schema_editor.connection.alias
+
+    duplicados = (
+        RegistroHora.objects.using(banco).order_by().values("registro_id", "hora_inicio")
+        .annotate(
+            n=Count("id"),
+            manter=Max("id"),
+            produzida=Sum("quantidade_produzida"),
+            defeituosa=Sum("quantidade_defeituosa"),
+        )
+        .filter(n__gt=1)
+    )
+    afetados = set()
+    for grupo in duplicados:
+        RegistroHora.objects.using(banco).filter(
+            registro_id=grupo["registro_id"], hora_inicio=grupo["hora_inicio"]
+        ).exclude(pk=grupo["manter"]).delete()
+        RegistroHora.objects.using(banco).filter(pk=grupo["manter"]).update(
+            quantidade_produzida=grupo["produzida"],
+            quantidade_defeituosa=grupo["defeituosa"],
+        )
+        afetados.add(grupo["registro_id"])
+    if not afetados:
+        return
+
+    def _soma(campo):
+        return Coalesce(
+            Subquery(
+                RegistroHora.objects.filter(registro=OuterRef("pk")).order_by()
+                .values("registro").annotate(total=Sum(campo)).values("total")
+            ),
+            Value(0),
+        )
+
+    RegistroProducao.objects.using(banco).filter(pk__in=afetados).update(
+        quantidade_produzida=_soma("quantidade_produzida"),
+        quantidade_defeituosa=_soma("quantidade_defeituosa"),
+    )
+    _refazer_consolidados(apps, banco, afetados)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sgpi', '0014_agrupar_motivos_parada'),
+    ]
+
+    operations = [
+        # Desfazer só remove a restrição: as horas juntadas continuam somadas,
+        # e os totais dos registros já batem com elas.
+        migrations.RunPython(juntar_horas_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='registrohora',
+            constraint=models.UniqueConstraint(fields=('registro', 'hora_inicio'), name='uniq_registro_hora_inicio'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sgpi', '0015_hora_unica_por_registro'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='registroproducao',
+            name='registro_data_linha_cov_idx',
+        ),
+        migrations.AddIndex(
+            model_name='registroproducao',
+            index=models.Index(fields=['data', 'linha'], name='registro_data_linha_idx'),
+        ),
+    ]
@@ -1,14 +1,18 @@
-from datetime import datetime, timedelta
+import re
+import unicodedata
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Sum
 from django.utils import timezone
 
+from . import intervalos
+
 
 class LinhaProducao(models.Model):
     nome = models.CharField(max_length=100)
-    setor = models.CharField(max_length=100, blank=True, null=True)
+    setor = models.CharField(max_length=100, blank=True, null=True, db_index=True)
     capacidade_nominal = models.PositiveIntegerField(
         help_text="Capacidade nominal em unidades por hora"
     )
@@ -17,6 +21,72 @@ class LinhaProducao(models.Model):
         return self.nome
 
 
+class RegistroProducaoQuerySet(models.QuerySet):
+    """
+    Operações em massa sobre registros: tudo em UPDATEs por lote de ids,
+    sem carregar objetos (e, portanto, sem os sinais de RegistroProducao).
+    """
+    TAMANHO_LOTE = 500
+
+    def _lotes(self, **filtro):
+        ids = list(self.filter(**filtro).order_by().values_list("pk", flat=True))
+        base = self.model._default_manager.using(self.db)
+        for i in range(0, len(ids), self.TAMANHO_LOTE):
+            lote = ids[i:i + self.TAMANHO_LOTE]
+            yield lote, base.filter(pk__in=lote)
+
+    def recalcular_totais(self):
+        """Regrava os totais a partir das horas/paradas (subconsultas correlacionadas)."""
+        from .recalculo import expressoes_totais
+
+        return self.update(atualizado_em=timezone.now(), **expressoes_totais())
+
+    def finalizar(self):
+        """
+        Recalcula os totais e finaliza os registros abertos do queryset, um
+        UPDATE por lote com ``WHERE finalizada = false``: cliques simultâneos
+        não finalizam (nem consolidam) o mesmo registro duas vezes. O
+        instante de finalização é único por chamada e identifica as linhas
+        que esta chamada de fato virou. Retorna quantos foram finalizados.
+        """
+        from .consolidacao import aplicar_registros
+        from .painel import marcar_alteracao
+        from .recalculo import expressoes_totais
+
+        agora = timezone.now()
+        total = 0
+        with transaction.atomic(using=self.db):
+            for ids, lote in self._lotes(finalizada=False):
+                alterados = lote.filter(finalizada=False).update(
+                    finalizada=True, finalizada_em=agora, atualizado_em=agora, **expressoes_totais()
+                )
+                if alterados:
+                    aplicar_registros(lote.filter(finalizada=True, finalizada_em=agora), sinal=1)
+                    marcar_alteracao(registro_ids=ids, using=self.db)
+                total += alterados
+        return total
+
+    def reabrir(self):
+        """Reabre os registros finalizados do queryset (mesmo esquema de ``finalizar``)."""
+        from .consolidacao import aplicar_registros
+        from .painel import marcar_alteracao
+
+        agora = timezone.now()
+        total = 0
+        with transaction.atomic(using=self.db):
+            for ids, lote in self._lotes(finalizada=True):
+                alterados = lote.filter(finalizada=True).update(
+                    finalizada=False, finalizada_em=None, atualizado_em=agora
+                )
+                if alterados:
+                    # tira dos consolidados os totais que entraram na finalização
+                    aplicar_registros(lote.filter(finalizada=False, atualizado_em=agora), sinal=-1)
+                    marcar_alteracao(registro_ids=ids, using=self.db)
+                    cache.delete_many([self.model(pk=pk).chave_cache_detalhe() for pk in ids])
+                total += alterados
+        return total
+
+
 class RegistroProducao(models.Model):
     TURNO_CHOICES = [
         ("1/especial", "1/Especial"),
@@ -42,9 +112,27 @@ class RegistroProducao(models.Model):
     finalizada_em = models.DateTimeField(blank=True, null=True)
     motivo_parada = models.TextField(blank=True, null=True)
 
+    objects = RegistroProducaoQuerySet.as_manager()
+
+    # True nas instâncias lidas do arquivo frio (sgpi/arquivo.py), que não estão no banco
+    arquivado = False
+
     def __str__(self):
         return f"{self.linha.nome} - {self.data} - {self.turno}"
 
+    def chave_cache_detalhe(self):
+        """Chave do fragmento HTML do detalhe (só registros finalizados; ver RegistroProducaoDetailView)."""
+        return f"sgpi:registro:detalhe:{self.pk}"
+
+    @classmethod
+    def turno_por_codigo(cls, valor):
+        """Aceita o valor do turno ("1/especial") ou só o número ("1"); None se inválido."""
+        valor = str(valor or "").strip().lower()
+        for turno, _ in cls.TURNO_CHOICES:
+            if valor in (turno, turno.split("/")[0]):
+                return turno
+        return None
+
     @property
     def taxa_defeitos(self):
         if self.quantidade_produzida == 0:
@@ -78,29 +166,35 @@ class RegistroProducao(models.Model):
         constraints = [
             models.UniqueConstraint(fields=["linha", "data", "turno"], name="uniq_linha_data_turno")
         ]
+        indexes = [
+            # ordenação padrão da lista e date_hierarchy do admin
+            models.Index(fields=["-data", "turno"], name="registro_data_turno_idx"),
+            # filtro de pendentes/finalizados na mesma ordenação
+            models.Index(fields=["finalizada", "-data", "turno"], name="registro_final_data_idx"),
+            # relatórios por período (OEE); os totais mudam a cada hora
+            # apontada, então ficam fora da chave
+            models.Index(fields=["data", "linha"], name="registro_data_linha_idx"),
+        ]
 
     def finalizar(self, save=True):
-        self.recalc_totais(save=False)
-        self.finalizada = True
-        self.finalizada_em = timezone.now()
-        if save:
-            self.save(
-                update_fields=[
-                    "quantidade_produzida",
-                    "quantidade_defeituosa",
-                    "tempo_parado",
-                    "finalizada",
-                    "finalizada_em",
-                    "atualizado_em",
-                ]
-            )
+        if not save:
+            self.recalc_totais(save=False)
+            self.finalizada = True
+            self.finalizada_em = timezone.now()
+            return
+        RegistroProducao.objects.filter(pk=self.pk).finalizar()
+        self.refresh_from_db(fields=[
+            "quantidade_produzida", "quantidade_defeituosa", "tempo_parado",
+            "finalizada", "finalizada_em", "atualizado_em",
+        ])
 
     def reabrir(self, save=True):
-        self.finalizada = False
-        self.finalizada_em = None
-        if save:
-            self.save(update_fields=["finalizada", "finalizada_em", "atualizado_em"])
-
+        if not save:
+            self.finalizada = False
+            self.finalizada_em = None
+            return
+        RegistroProducao.objects.filter(pk=self.pk).reabrir()
+        self.refresh_from_db(fields=["finalizada", "finalizada_em", "atualizado_em"])
 
     def clean(self):
         super().clean()
@@ -133,7 +227,29 @@ class RegistroProducao(models.Model):
         return round(self.taxa_defeitos, 2)
 
 
-class RegistroHora(models.Model):
+class ContribuicaoTotaisMixin:
+    """
+    Guarda os valores lidos do banco para que a manutenção incremental dos
+    totais (sgpi/recalculo.py) aplique só a diferença no RegistroProducao.
+    """
+    # campo do filho -> campo de total no RegistroProducao
+    campos_totais = {}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if {"registro_id", *instance.campos_totais} <= set(field_names):
+            instance.guardar_totais_originais()
+        return instance
+
+    def valores_totais(self):
+        return {destino: getattr(self, campo) or 0 for campo, destino in self.campos_totais.items()}
+
+    def guardar_totais_originais(self):
+        self._totais_originais = (self.registro_id, self.valores_totais())
+
+
+class RegistroHora(ContribuicaoTotaisMixin, models.Model):
     registro = models.ForeignKey(
         RegistroProducao, on_delete=models.CASCADE, related_name="registros_hora"
     )
@@ -143,6 +259,11 @@ class RegistroHora(models.Model):
     quantidade_produzida = models.PositiveIntegerField(default=0)
     quantidade_defeituosa = models.PositiveIntegerField(default=0)
 
+    campos_totais = {
+        "quantidade_produzida": "quantidade_produzida",
+        "quantidade_defeituosa": "quantidade_defeituosa",
+    }
+
     def __str__(self):
         return f"{self.registro} - {self.hora_inicio} às {self.hora_fim}"
 
@@ -160,11 +281,7 @@ class RegistroHora(models.Model):
 
     @property
     def minutos_intervalo(self) -> int:
-        dt_ini = datetime.combine(self.registro.data, self.hora_inicio)
-        dt_fim = datetime.combine(self.registro.data, self.hora_fim)
-        if dt_fim <= dt_ini:
-            dt_fim += timedelta(days=1)
-        return int((dt_fim - dt_ini).total_seconds() // 60)
+        return intervalos.duracao(self.hora_inicio, self.hora_fim)
 
     @property
     def taxa_defeitos(self):
@@ -174,9 +291,52 @@ class RegistroHora(models.Model):
 
     class Meta:
         ordering = ("hora_inicio",)
+        constraints = [
+            # uma linha por hora: chave do upsert da API e da importação
+            models.UniqueConstraint(fields=["registro", "hora_inicio"], name="uniq_registro_hora_inicio")
+        ]
+
+
+PALAVRAS_IGNORADAS = frozenset(
+    "a o as os e de da do das dos na no nas nos em para por com um uma".split()
+)
+
+
+def normalizar_motivo(texto):
+    """
+    Chave de agrupamento do texto livre: minúsculas, sem acento, pontuação
+    nem preposições/artigos ("Falta de material." -> "falta material").
+    """
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    palavras = [p for p in re.findall(r"[a-z0-9]+", texto) if p not in PALAVRAS_IGNORADAS]
+    return " ".join(palavras)[:120]
+
+
+class MotivoParada(models.Model):
+    """Catálogo de motivos de parada (códigos padronizados para o Pareto)."""
+    descricao = models.CharField(max_length=120)
+    chave = models.CharField(
+        max_length=120, unique=True, blank=True,
+        help_text="Texto normalizado usado para classificar paradas com motivo livre",
+    )
+    ativo = models.BooleanField(default=True)
+
+    def __str__(self):
+        return self.descricao
+
+    def save(self, *args, **kwargs):
+        if not self.chave:
+            self.chave = normalizar_motivo(self.descricao)
+        super().save(*args, **kwargs)
 
+    class Meta:
+        ordering = ("descricao",)
+        verbose_name = "Motivo de parada"
+        verbose_name_plural = "Motivos de parada"
 
-class Parada(models.Model):
+
+class Parada(ContribuicaoTotaisMixin, models.Model):
     registro = models.ForeignKey(
         RegistroProducao, on_delete=models.CASCADE, related_name="paradas"
     )
@@ -186,6 +346,12 @@ class Parada(models.Model):
         default=0, help_text="Duração em minutos (calculada automaticamente)"
     )
     motivo = models.TextField(blank=True, null=True)
+    motivo_padrao = models.ForeignKey(
+        MotivoParada, on_delete=models.PROTECT, blank=True, null=True, related_name="paradas",
+        verbose_name="motivo padronizado",
+    )
+
+    campos_totais = {"duracao": "tempo_parado"}
 
     def __str__(self):
         return f"Parada {self.hora_inicio} - {self.hora_fim} ({self.duracao} min)"
@@ -195,18 +361,35 @@ class Parada(models.Model):
         if self.hora_fim == self.hora_inicio:
             raise ValidationError("A hora final deve ser diferente da hora inicial.")
 
+    def classificar_motivo(self, catalogo=None):
+        """
+        Sem motivo_padrao, usa o motivo do catálogo com a mesma chave do
+        texto livre. ``catalogo`` (chave -> MotivoParada), carregado uma vez
+        por quem grava várias paradas, dispensa a consulta.
+        """
+        if self.motivo_padrao_id is None and self.motivo:
+            chave = normalizar_motivo(self.motivo)
+            if catalogo is None:
+                self.motivo_padrao = MotivoParada.objects.filter(chave=chave, ativo=True).first()
+            else:
+                self.motivo_padrao = catalogo.get(chave)
+        self._motivo_classificado = True
+
     def save(self, *args, **kwargs):
-        dt_ini = datetime.combine(self.registro.data, self.hora_inicio)
-        dt_fim = datetime.combine(self.registro.data, self.hora_fim)
-        if dt_fim <= dt_ini:
-            dt_fim += timedelta(days=1)
-        self.duracao = int((dt_fim - dt_ini).total_seconds() // 60)
+        self.duracao = intervalos.duracao(self.hora_inicio, self.hora_fim)
+        if not getattr(self, "_motivo_classificado", False):
+            self.classificar_motivo()
         super().save(*args, **kwargs)
+        self._motivo_classificado = False
 
     class Meta:
         ordering = ("hora_inicio",)
         verbose_name = "Parada"
         verbose_name_plural = "Paradas"
+        indexes = [
+            # Pareto: registro -> (motivo, duração) sem ler a tabela
+            models.Index(fields=["registro", "motivo_padrao", "duracao"], name="parada_registro_motivo_idx"),
+        ]
 
 class PermissaoSetorUsuario(models.Model):
    
@@ -231,3 +414,57 @@ class PermissaoSetorUsuario(models.Model):
         from .models import LinhaProducao
         if not LinhaProducao.objects.filter(setor=self.setor).exists():
             raise ValidationError({"setor": "Não existe nenhuma linha cadastrada com este setor."})
+
+
+# -----------------------
+# Consolidados (mantidos por sgpi/consolidacao.py)
+# -----------------------
+class ConsolidadoBase(models.Model):
+    """Totais dos registros FINALIZADOS de uma linha num período."""
+    linha = models.ForeignKey(LinhaProducao, on_delete=models.CASCADE, related_name="+")
+    setor = models.CharField(max_length=100, blank=True, null=True)
+
+    quantidade_produzida = models.PositiveIntegerField(default=0)
+    quantidade_defeituosa = models.PositiveIntegerField(default=0)
+    tempo_parado = models.PositiveIntegerField(default=0, help_text="Tempo parado em minutos")
+    minutos_planejados = models.PositiveIntegerField(default=0)
+    registros = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def taxa_defeitos(self):
+        if self.quantidade_produzida == 0:
+            return 0
+        return (self.quantidade_defeituosa / self.quantidade_produzida) * 100
+
+
+class ProducaoDiaria(ConsolidadoBase):
+    dia = models.DateField()
+
+    def __str__(self):
+        return f"{self.linha} - {self.dia}"
+
+    class Meta:
+        verbose_name = "Produção diária"
+        verbose_name_plural = "Produção diária"
+        constraints = [
+            models.UniqueConstraint(fields=["linha", "dia"], name="uniq_producao_diaria_linha_dia")
+        ]
+        indexes = [models.Index(fields=["setor", "dia"], name="producao_diaria_setor_idx")]
+
+
+class ProducaoMensal(ConsolidadoBase):
+    mes = models.DateField(help_text="Primeiro dia do mês")
+
+    def __str__(self):
+        return f"{self.linha} - {self.mes:%m/%Y}"
+
+    class Meta:
+        verbose_name = "Produção mensal"
+        verbose_name_plural = "Produção mensal"
+        constraints = [
+            models.UniqueConstraint(fields=["linha", "mes"], name="uniq_producao_mensal_linha_mes")
+        ]
+        indexes = [models.Index(fields=["setor", "mes"], name="producao_mensal_setor_idx")]
@@ -0,0 +1,76 @@
+# sgpi/oee.py
+"""
+OEE (Disponibilidade x Desempenho x Qualidade) calculado no banco.
+
+Tudo sai de um único SELECT ... GROUP BY sobre RegistroProducao usando os
+totais já gravados no registro (quantidade_produzida, quantidade_defeituosa,
+tempo_parado) e a capacidade_nominal da linha — nada é iterado em Python.
+"""
+from django.conf import settings
+from django.db.models import Count, F, FloatField, IntegerField, Sum, Value
+from django.db.models.functions import Cast, Greatest, NullIf
+
+from .models import RegistroProducao
+
+# Tempo planejado de um turno em minutos. Não existe cadastro de jornada,
+# então cada registro (linha/data/turno) vale um turno cheio.
+MINUTOS_TURNO = getattr(settings, "SGPI_MINUTOS_TURNO", 480)
+
+# chave do agrupamento -> campos do GROUP BY
+AGRUPAMENTOS = {
+    "linha": ("linha", "linha__nome", "linha__setor"),
+    "dia": ("linha", "linha__nome", "linha__setor", "data"),
+    "turno": ("linha", "linha__nome", "linha__setor", "data", "turno"),
+}
+
+
+def _real(expr):
+    return Cast(expr, FloatField())
+
+
+def _pct(numerador, denominador):
+    # NULL quando o denominador é zero (sem produção / sem tempo planejado)
+    return 100.0 * _real(numerador) / NullIf(_real(denominador), 0.0)
+
+
+def calcular_oee(data_inicio=None, data_fim=None, agrupar_por="linha", queryset=None):
+    """
+    Retorna um ValuesQuerySet com uma linha por grupo contendo os totais e
+    disponibilidade_pct, desempenho_pct, qualidade_pct e oee_pct.
+    """
+    if agrupar_por not in AGRUPAMENTOS:
+        raise ValueError(f"Agrupamento inválido: {agrupar_por!r}")
+
+    qs = queryset if queryset is not None else RegistroProducao.objects.all()
+    if data_inicio:
+        qs = qs.filter(data__gte=data_inicio)
+    if data_fim:
+        qs = qs.filter(data__lte=data_fim)
+
+    turno = Value(MINUTOS_TURNO, output_field=IntegerField())
+    operando = Greatest(turno - F("tempo_parado"), Value(0, output_field=IntegerField()))
+    campos = AGRUPAMENTOS[agrupar_por]
+
+    return (
+        qs.order_by()
+        .values(*campos)
+        .annotate(
+            registros=Count("id"),
+            produzido=Sum("quantidade_produzida"),
+            defeituoso=Sum("quantidade_defeituosa"),
+            minutos_parados=Sum("tempo_parado"),
+            minutos_planejados=Count("id") * turno,
+            minutos_operando=Sum(operando),
+            # peças que a linha faria na capacidade nominal durante o tempo operando
+            capacidade_teorica=Sum(_real(F("linha__capacidade_nominal") * operando)) / 60.0,
+        )
+        .annotate(
+            disponibilidade_pct=_pct(F("minutos_operando"), F("minutos_planejados")),
+            desempenho_pct=_pct(F("produzido"), F("capacidade_teorica")),
+            qualidade_pct=_pct(F("produzido") - F("defeituoso"), F("produzido")),
+        )
+        .annotate(
+            oee_pct=F("disponibilidade_pct") * F("desempenho_pct") * F("qualidade_pct") / 10000.0,
+        )
+        .order_by(*campos[1:], "linha")
+    )
@@ -0,0 +1,124 @@
+# sgpi/paginacao.py
+"""
+Paginação por chave (keyset/cursor).
+
+Em vez de COUNT(*) + OFFSET (que percorre todas as linhas anteriores), cada
+página é buscada a partir da chave da última linha vista:
+``WHERE (data, turno, id) > (...) ORDER BY ... LIMIT n + 1``. O custo é o
+mesmo na página 1 ou na 5.000. A ordenação precisa ser única, então o último
+campo deve ser a pk; campos com NULL não são suportados.
+
+O cursor é opaco para o cliente (JSON em base64) e a contagem total é
+opcional.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+PROXIMA = "p"
+ANTERIOR = "a"
+
+
+class PaginaKeyset:
+    def __init__(self, object_list, cursor_proximo=None, cursor_anterior=None, total=None):
+        self.object_list = object_list
+        self.cursor_proximo = cursor_proximo
+        self.cursor_anterior = cursor_anterior
+        self.total = total
+
+    @property
+    def tem_proxima(self):
+        return self.cursor_proximo is not None
+
+    @property
+    def tem_anterior(self):
+        return self.cursor_anterior is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class PaginadorKeyset:
+    def __init__(self, queryset, ordenacao, por_pagina, contar=False):
+        self.queryset = queryset
+        self.por_pagina = por_pagina
+        self.contar = contar
+        # (nome do campo, decrescente?)
+        self.ordenacao = [(c.lstrip("-"), c.startswith("-")) for c in ordenacao]
+        meta = queryset.model._meta
+        self.campos = {
+            nome: meta.pk if nome == "pk" else meta.get_field(nome)
+            for nome, _ in self.ordenacao
+        }
+
+    # -----------------------
+    # cursor
+    # -----------------------
+    def _chave(self, obj):
+        return [getattr(obj, "pk" if nome == "pk" else self.campos[nome].attname) for nome, _ in self.ordenacao]
+
+    def _codificar(self, direcao, obj):
+        bruto = json.dumps([direcao, self._chave(obj)], cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip("=")
+
+    def _decodificar(self, cursor):
+        try:
+            bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            direcao, valores = json.loads(bruto)
+            if direcao not in (PROXIMA, ANTERIOR) or len(valores) != len(self.ordenacao):
+                return None
+            return direcao, [
+                self.campos[nome].to_python(valor)
+                for (nome, _), valor in zip(self.ordenacao, valores)
+            ]
+        except (ValueError, TypeError, binascii.Error, ValidationError):
+            return None
+
+    # -----------------------
+    # consulta
+    # -----------------------
+    def _depois_de(self, valores, inverter=False):
+        """Q das linhas que vêm depois de ``valores`` na ordenação (ou antes, invertendo)."""
+        condicao = Q()
+        iguais = Q()
+        for (nome, desc), valor in zip(self.ordenacao, valores):
+            maior = desc == inverter
+            condicao |= iguais & Q(**{f"{nome}__{'gt' if maior else 'lt'}": valor})
+            iguais &= Q(**{nome: valor})
+        return condicao
+
+    def _ordem(self, inverter=False):
+        return [f"{'-' if desc != inverter else ''}{nome}" for nome, desc in self.ordenacao]
+
+    def pagina(self, cursor=None):
+        decodificado = self._decodificar(cursor) if cursor else None
+        n = self.por_pagina
+
+        if decodificado and decodificado[0] == ANTERIOR:
+            qs = self.queryset.filter(self._depois_de(decodificado[1], inverter=True))
+            linhas = list(qs.order_by(*self._ordem(inverter=True))[:n + 1])
+            tem_anterior = len(linhas) > n
+            linhas = linhas[:n][::-1]
+            tem_proxima = True
+        else:
+            qs = self.queryset
+            if decodificado:
+                qs = qs.filter(self._depois_de(decodificado[1]))
+            linhas = list(qs.order_by(*self._ordem())[:n + 1])
+            tem_proxima = len(linhas) > n
+            linhas = linhas[:n]
+            tem_anterior = decodificado is not None
+
+        return PaginaKeyset(
+            linhas,
+            cursor_proximo=self._codificar(PROXIMA, linhas[-1]) if linhas and tem_proxima else None,
+            cursor_anterior=self._codificar(ANTERIOR, linhas[0]) if linhas and tem_anterior else None,
+            total=self.queryset.count() if self.contar else None,
+        )
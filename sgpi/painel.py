@@ -0,0 +1,209 @@
+# sgpi/painel.py
+"""
+Painel de produção por setor (hoje e semana corrente).
+
+Cada setor vira um fragmento HTML pronto, guardado no cache sob uma chave
+com a versão do setor e o dia. Gravações em RegistroProducao e a
+atualização dos totais (recálculo no commit, delta incremental ou
+importação em massa) trocam a versão dos setores afetados depois do
+commit; a próxima requisição remonta só aquele setor. Com o cache quente
+o painel é servido sem nenhuma consulta de produção, só leituras de cache.
+
+Os números vêm dos totais já gravados em RegistroProducao (mantidos pelo
+recálculo) — nada de somar RegistroHora a cada atualização da tela.
+"""
+import hashlib
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Q, Sum
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .aovivo import estados, publicar_alteracao
+from .models import LinhaProducao, RegistroProducao
+from .turnos import hora_cheia
+
+TEMPO_CACHE = getattr(settings, "SGPI_CACHE_PAINEL_SEGUNDOS", 10 * 60)
+# a parada em curso depende do relógio, não só das gravações
+TEMPO_CACHE_AO_VIVO = getattr(settings, "SGPI_AOVIVO_CACHE_SEGUNDOS", 30)
+TEMPLATE_SETOR = "painel/_setor.html"
+
+_estado = threading.local()
+
+
+def _id_setor(setor):
+    # nomes de setor têm espaços/acentos; memcached não aceita isso na chave
+    return hashlib.sha1((setor or "").encode()).hexdigest()[:16]
+
+
+def _chave_versao(setor):
+    return f"sgpi:painel:versao:{_id_setor(setor)}"
+
+
+# -----------------------
+# Invalidação
+# -----------------------
+def _pendentes():
+    # alias do banco -> (registro_ids, linha_ids, setores, callback registrado no on_commit)
+    if not hasattr(_estado, "pendentes"):
+        _estado.pendentes = {}
+    return _estado.pendentes
+
+
+def invalidar_setores(setores):
+    # linha sem setor não aparece em nenhum painel
+    cache.set_many({_chave_versao(s): uuid.uuid4().hex for s in setores if s}, None)
+
+
+def invalidar_registros(registro_ids=(), linha_ids=(), using=DEFAULT_DB_ALIAS, setores=()):
+    """
+    Troca agora a versão dos setores dos registros/linhas informados (e dos
+    ``setores`` dados explicitamente — o anterior de uma linha que mudou de
+    setor ou foi excluída) e avisa quem estiver no painel ao vivo.
+    """
+    setores = set(setores)
+    filtro = Q(pk__in=linha_ids) if linha_ids else Q()
+    if registro_ids:
+        filtro |= Q(registros__pk__in=registro_ids)
+    if filtro:
+        setores.update(LinhaProducao.objects.using(using).filter(filtro).values_list("setor", flat=True).distinct())
+    invalidar_setores(setores)
+    # depois da troca de versão: quem conectar agora não pega o retrato antigo
+    publicar_alteracao(registro_ids, linha_ids, using)
+
+
+def marcar_alteracao(registro_ids=(), linha_ids=(), using=DEFAULT_DB_ALIAS, setores=()):
+    """
+    Agenda a troca de versão dos setores dos registros/linhas informados
+    para o commit. Várias marcações na mesma transação resultam numa única
+    consulta de setores.
+    """
+    registro_ids = {pk for pk in registro_ids if pk is not None}
+    linha_ids = {pk for pk in linha_ids if pk is not None}
+    setores = {setor for setor in setores if setor}
+    if not registro_ids and not linha_ids and not setores:
+        return
+
+    pendentes = _pendentes()
+    atual = pendentes.get(using)
+    if atual and any(item[1] is atual[3] for item in connections[using].run_on_commit):
+        atual[0].update(registro_ids)
+        atual[1].update(linha_ids)
+        atual[2].update(setores)
+        return
+
+    def _executar():
+        if pendentes.get(using, (None, None, None, None))[3] is _executar:
+            del pendentes[using]
+        invalidar_registros(registro_ids, linha_ids, using, setores)
+
+    pendentes[using] = (registro_ids, linha_ids, setores, _executar)
+    transaction.on_commit(_executar, using=using)
+
+
+# -----------------------
+# Montagem
+# -----------------------
+def periodo(hoje):
+    """(início da semana (segunda-feira), hoje)."""
+    return hoje - timedelta(days=hoje.weekday()), hoje
+
+
+def _taxa(defeituoso, produzido):
+    return round(100 * defeituoso / produzido, 1) if produzido else None
+
+
+def resumo_setor(setor, hoje):
+    """Totais de hoje e da semana por linha do setor, numa consulta só."""
+    inicio, fim = periodo(hoje)
+    do_dia = Q(data=hoje)
+    linhas = list(
+        RegistroProducao.objects
+        .filter(linha__setor=setor, data__range=(inicio, fim))
+        .order_by()
+        .values("linha_id", "linha__nome")
+        .annotate(
+            produzido_hoje=Sum("quantidade_produzida", filter=do_dia, default=0),
+            defeituoso_hoje=Sum("quantidade_defeituosa", filter=do_dia, default=0),
+            parado_hoje=Sum("tempo_parado", filter=do_dia, default=0),
+            produzido_semana=Sum("quantidade_produzida", default=0),
+            defeituoso_semana=Sum("quantidade_defeituosa", default=0),
+            parado_semana=Sum("tempo_parado", default=0),
+        )
+        .order_by("linha__nome")
+    )
+
+    campos = ("produzido_hoje", "defeituoso_hoje", "parado_hoje",
+              "produzido_semana", "defeituoso_semana", "parado_semana")
+    total = {campo: sum(linha[campo] for linha in linhas) for campo in campos}
+    for item in [*linhas, total]:
+        item["taxa_defeitos_hoje"] = _taxa(item["defeituoso_hoje"], item["produzido_hoje"])
+        item["taxa_defeitos_semana"] = _taxa(item["defeituoso_semana"], item["produzido_semana"])
+    return {"setor": setor, "linhas": linhas, "total": total, "inicio": inicio, "hoje": hoje}
+
+
+def versao_setor(setor):
+    """Versão atual do setor no cache compartilhado (criada se faltar)."""
+    chave = _chave_versao(setor)
+    versao = cache.get(chave)
+    if versao is None:
+        # add não sobrescreve a versão que outro processo acabou de criar
+        cache.add(chave, uuid.uuid4().hex, None)
+        versao = cache.get(chave)
+    return versao
+
+
+def estados_do_canal(setor, linha_id=None, agora=None):
+    """
+    (versão do setor, estados) de um canal do painel ao vivo. O retrato
+    fica no cache sob a versão do setor e a hora do turno, então conexões
+    seguidas ao mesmo canal (em qualquer processo) não repetem as consultas
+    de ``aovivo.estados``.
+    """
+    agora = agora or timezone.now()
+    versao = versao_setor(setor)
+    hora = hora_cheia(agora)
+    momento = f"{hora[0].isoformat()}:{_id_setor(hora[1])}:{hora[2]:%H%M}" if hora else "fora"
+    chave = f"sgpi:aovivo:{_id_setor(setor)}:{linha_id or 0}:{versao}:{momento}"
+    atual = cache.get(chave)
+    if atual is None:
+        filtro = {"linha_ids": [linha_id]} if linha_id else {"setores": [setor]}
+        atual = estados(agora=agora, **filtro)
+        cache.set(chave, atual, TEMPO_CACHE_AO_VIVO)
+    return versao, atual
+
+
+def fragmentos_setores(setores, hoje):
+    """
+    Lista de (setor, html) na ordem de ``setores``. Duas idas ao cache
+    (versões + fragmentos); só os setores sem fragmento válido vão ao banco.
+    """
+    setores = list(setores)
+    versoes = cache.get_many([_chave_versao(s) for s in setores])
+    novas = {}
+    chaves = {}
+    for setor in setores:
+        chave_versao = _chave_versao(setor)
+        versao = versoes.get(chave_versao)
+        if versao is None:
+            versao = novas[chave_versao] = uuid.uuid4().hex
+        chaves[setor] = f"sgpi:painel:{_id_setor(setor)}:{versao}:{hoje.isoformat()}"
+    if novas:
+        cache.set_many(novas, None)
+
+    prontos = cache.get_many(list(chaves.values()))
+    faltando = {}
+    resultado = []
+    for setor in setores:
+        html = prontos.get(chaves[setor])
+        if html is None:
+            html = faltando[chaves[setor]] = render_to_string(TEMPLATE_SETOR, resumo_setor(setor, hoje))
+        resultado.append((setor, html))
+    if faltando:
+        cache.set_many(faltando, TEMPO_CACHE)
+    return resultado
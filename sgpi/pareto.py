@@ -0,0 +1,57 @@
+# sgpi/pareto.py
+"""
+Pareto de paradas por motivo padronizado (MotivoParada).
+
+Uma única consulta agrupa Parada.duracao por motivo (e, opcionalmente, por
+linha ou setor) no período; o índice (registro, motivo_padrao, duracao)
+permite somar sem ler a tabela de paradas. Paradas sem motivo padronizado
+aparecem juntas em "Sem motivo padronizado". Percentuais e acumulado são
+calculados em Python sobre o resultado já agrupado.
+"""
+from django.db.models import Count, Sum
+
+from .models import Parada
+
+SEM_MOTIVO = "Sem motivo padronizado"
+
+AGRUPAMENTOS = {
+    "": [],
+    "linha": ["registro__linha_id", "registro__linha__nome"],
+    "setor": ["registro__linha__setor"],
+}
+
+
+def calcular_pareto(data_inicio=None, data_fim=None, agrupar_por="", queryset=None):
+    """
+    Lista de dicts por (grupo, motivo), do maior para o menor tempo parado
+    dentro de cada grupo, com minutos, ocorrencias, pct_minutos e
+    pct_acumulado.
+    """
+    campos = AGRUPAMENTOS[agrupar_por]
+    qs = Parada.objects.all() if queryset is None else queryset
+    if data_inicio:
+        qs = qs.filter(registro__data__gte=data_inicio)
+    if data_fim:
+        qs = qs.filter(registro__data__lte=data_fim)
+
+    linhas = list(
+        qs.order_by()
+        .values(*campos, "motivo_padrao_id", "motivo_padrao__descricao")
+        .annotate(minutos=Sum("duracao"), ocorrencias=Count("id"))
+        .order_by(*campos, "-minutos", "-ocorrencias", "motivo_padrao__descricao")
+    )
+
+    totais = {}
+    for item in linhas:
+        grupo = tuple(item[c] for c in campos)
+        totais[grupo] = totais.get(grupo, 0) + item["minutos"]
+
+    acumulado = {}
+    for item in linhas:
+        grupo = tuple(item[c] for c in campos)
+        total = totais[grupo]
+        acumulado[grupo] = acumulado.get(grupo, 0) + item["minutos"]
+        item["motivo"] = item.pop("motivo_padrao__descricao") or SEM_MOTIVO
+        item["pct_minutos"] = round(100 * item["minutos"] / total, 1) if total else None
+        item["pct_acumulado"] = round(100 * acumulado[grupo] / total, 1) if total else None
+    return linhas
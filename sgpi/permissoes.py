@@ -0,0 +1,55 @@
+# sgpi/permissoes.py
+"""
+Setores permitidos por usuário (PermissaoSetorUsuario) com cache.
+
+O resultado fica memorizado no próprio objeto do usuário (ou seja, vale
+pela requisição inteira: view, form.__init__ e form.clean consultam uma
+vez só) e no cache do Django sob uma chave versionada. Qualquer gravação
+ou exclusão de PermissaoSetorUsuario troca a versão do usuário, o que
+invalida a entrada antiga sem precisar apagá-la (ver sgpi/signals.py).
+
+Com vários workers o cache tem que ser compartilhado (o perfil de produção
+usa arquivo ou Redis, ver SGPI_CACHE): num LocMemCache a troca de versão só
+valeria no processo que gravou, e uma permissão revogada continuaria
+valendo nos outros até expirar.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import PermissaoSetorUsuario
+
+TEMPO_CACHE = getattr(settings, "SGPI_CACHE_SETORES_SEGUNDOS", 60 * 60)
+
+
+def _chave_versao(usuario_id):
+    return f"sgpi:setores:versao:{usuario_id}"
+
+
+def setores_permitidos(user):
+    """frozenset com os setores do usuário (vazio para anônimos)."""
+    if not user.is_authenticated:
+        return frozenset()
+
+    memo = getattr(user, "_setores_permitidos", None)
+    if memo is not None:
+        return memo
+
+    versao = cache.get_or_set(_chave_versao(user.pk), uuid.uuid4().hex, None)
+    chave = f"sgpi:setores:{user.pk}:{versao}"
+    setores = cache.get(chave)
+    if setores is None:
+        setores = frozenset(
+            PermissaoSetorUsuario.objects
+            .filter(usuario_id=user.pk)
+            .values_list("setor", flat=True)
+        )
+        cache.set(chave, setores, TEMPO_CACHE)
+
+    user._setores_permitidos = setores
+    return setores
+
+
+def invalidar_setores(usuario_id):
+    cache.set(_chave_versao(usuario_id), uuid.uuid4().hex, None)
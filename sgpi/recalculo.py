@@ -0,0 +1,199 @@
+# sgpi/recalculo.py
+"""
+Agendador do recálculo de totais de RegistroProducao.
+
+Os sinais de RegistroHora/Parada apenas marcam o registro como pendente.
+Dentro de uma transação, cada registro marcado é recalculado uma única vez
+quando ela é confirmada (transaction.on_commit); se ela for desfeita, nada é
+recalculado. Fora de um bloco atomic o on_commit roda na hora, ou seja, o
+comportamento continua o mesmo de antes para quem grava sem transação.
+
+Com ``SGPI_TOTAIS_INCREMENTAIS = True`` cada inclusão/alteração/exclusão
+aplica só a sua diferença nos totais do pai com um UPDATE atômico usando
+F(), sem reler os filhos e sem janela de leitura-e-escrita entre edições
+concorrentes. O recálculo completo continua disponível como verificação
+(``manage.py verificar_totais``).
+
+Para cargas em massa use ``suspender_recalculo()``: as marcações ficam
+acumuladas e, na saída do bloco, viram um único recálculo por registro
+(ou nenhum, com ``recalcular_ao_sair=False``, quando quem chama já cuida
+dos totais).
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+_estado = threading.local()
+
+
+def _pendentes():
+    # alias do banco -> (ids pendentes, callback registrado no on_commit)
+    if not hasattr(_estado, "pendentes"):
+        _estado.pendentes = {}
+    return _estado.pendentes
+
+
+def _suspensoes():
+    if not hasattr(_estado, "suspensoes"):
+        _estado.suspensoes = []
+    return _estado.suspensoes
+
+
+def totais_incrementais():
+    return getattr(settings, "SGPI_TOTAIS_INCREMENTAIS", False)
+
+
+def _callback_agendado(using, callback):
+    # callbacks de savepoints/transações desfeitos somem de run_on_commit
+    return any(item[1] is callback for item in connections[using].run_on_commit)
+
+
+def recalcular_registros(ids, using=DEFAULT_DB_ALIAS, tamanho_lote=500):
+    """
+    Recalcula agora os totais dos registros informados: um UPDATE com
+    subconsultas correlacionadas por lote de ids, sem carregar objetos.
+    """
+    from .models import RegistroProducao
+
+    ids = sorted(set(ids))
+    for i in range(0, len(ids), tamanho_lote):
+        RegistroProducao.objects.using(using).filter(pk__in=ids[i:i + tamanho_lote]).update(
+            atualizado_em=timezone.now(), **expressoes_totais()
+        )
+
+
+def marcar_para_recalculo(registro_id, using=DEFAULT_DB_ALIAS):
+    if registro_id is None:
+        return
+
+    suspensoes = _suspensoes()
+    if suspensoes:
+        suspensoes[-1].add((using, registro_id))
+        return
+
+    pendentes = _pendentes()
+    atual = pendentes.get(using)
+    if atual and _callback_agendado(using, atual[1]):
+        atual[0].add(registro_id)
+        return
+
+    ids = {registro_id}
+
+    def _executar():
+        from .painel import invalidar_registros
+
+        if pendentes.get(using, (None, None))[1] is _executar:
+            del pendentes[using]
+        recalcular_registros(ids, using=using)
+        # já estamos depois do commit
+        invalidar_registros(ids, using=using)
+
+    pendentes[using] = (ids, _executar)
+    transaction.on_commit(_executar, using=using)
+
+
+@contextmanager
+def suspender_recalculo(recalcular_ao_sair=True):
+    """
+    Suspende o recálculo automático durante o bloco.
+
+    Retorna o conjunto de pares (alias, registro_id) marcados no período.
+    """
+    suspensoes = _suspensoes()
+    marcados = set()
+    suspensoes.append(marcados)
+    try:
+        yield marcados
+    finally:
+        suspensoes.pop()
+
+    if recalcular_ao_sair:
+        for using, registro_id in marcados:
+            marcar_para_recalculo(registro_id, using=using)
+
+
+def aplicar_delta(registro_id, deltas, using=DEFAULT_DB_ALIAS):
+    """
+    Soma ``deltas`` (campo -> diferença) aos totais do registro num único
+    UPDATE, que sempre renova ``atualizado_em``.
+    """
+    from .models import RegistroProducao
+    from .painel import marcar_alteracao
+
+    if registro_id is None:
+        return
+    # sem diferença nos totais (só horário ou motivo mudou) o registro mudou
+    # do mesmo jeito: atualizado_em é a versão do detalhe (ETag/Last-Modified)
+    deltas = {campo: valor for campo, valor in deltas.items() if valor}
+    RegistroProducao.objects.using(using).filter(pk=registro_id).update(
+        atualizado_em=timezone.now(),
+        **{campo: F(campo) + valor for campo, valor in deltas.items()},
+    )
+    marcar_alteracao(registro_ids=[registro_id], using=using)
+
+
+def registrar_alteracao(instance, using=DEFAULT_DB_ALIAS, criado=False, removido=False):
+    """
+    Ponto de entrada dos sinais de RegistroHora/Parada.
+
+    Sem o modo incremental (ou com o recálculo suspenso) só marca o registro;
+    no modo incremental aplica a diferença entre o valor lido do banco e o
+    valor atual.
+    """
+    original = getattr(instance, "_totais_originais", None)
+    registro_anterior = original[0] if original else None
+
+    if not totais_incrementais() or _suspensoes() or (original is None and not criado):
+        # sem o valor original (ex.: carregado com only()) não há como saber a diferença
+        marcar_para_recalculo(instance.registro_id, using=using)
+        if registro_anterior not in (None, instance.registro_id):
+            marcar_para_recalculo(registro_anterior, using=using)
+    else:
+        anteriores = original[1] if original else {}
+        atuais = {} if removido else instance.valores_totais()
+        if registro_anterior not in (None, instance.registro_id):
+            # filho trocou de registro: tira tudo do antigo e soma tudo no novo
+            aplicar_delta(registro_anterior, {c: -v for c, v in anteriores.items()}, using=using)
+            anteriores = {}
+        campos = set(anteriores) | set(atuais)
+        aplicar_delta(
+            instance.registro_id,
+            {c: atuais.get(c, 0) - anteriores.get(c, 0) for c in campos},
+            using=using,
+        )
+
+    if removido:
+        instance._totais_originais = None
+    else:
+        instance.guardar_totais_originais()
+
+
+def expressoes_totais():
+    """
+    Subconsultas correlacionadas com os totais reais de cada registro, para
+    usar em annotate()/update() sobre RegistroProducao.
+    """
+    from .models import Parada, RegistroHora
+
+    def _soma(model, campo):
+        return Coalesce(
+            Subquery(
+                model.objects.filter(registro=OuterRef("pk"))
+                .order_by()
+                .values("registro")
+                .annotate(total=Sum(campo))
+                .values("total")
+            ),
+            Value(0),
+        )
+
+    return {
+        "quantidade_produzida": _soma(RegistroHora, "quantidade_produzida"),
+        "quantidade_defeituosa": _soma(RegistroHora, "quantidade_defeituosa"),
+        "tempo_parado": _soma(Parada, "duracao"),
+    }
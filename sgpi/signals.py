@@ -1,11 +1,71 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
-from .models import RegistroHora, Parada
+from .busca import indexar_no_commit, obter_backend
+from .models import LinhaProducao, RegistroHora, Parada, PermissaoSetorUsuario, RegistroProducao
+from .painel import marcar_alteracao
+from .permissoes import invalidar_setores
+from .recalculo import registrar_alteracao
 
-@receiver([post_save, post_delete], sender=RegistroHora)
-def atualizar_totais_por_hora(sender, instance, **kwargs):
-    instance.registro.recalc_totais()
+@receiver(post_save, sender=RegistroHora)
+@receiver(post_save, sender=Parada)
+def atualizar_totais_ao_salvar(sender, instance, using, created, **kwargs):
+    registrar_alteracao(instance, using=using, criado=created)
+
+@receiver(post_delete, sender=RegistroHora)
+@receiver(post_delete, sender=Parada)
+def atualizar_totais_ao_excluir(sender, instance, using, **kwargs):
+    registrar_alteracao(instance, using=using, removido=True)
+
+@receiver([post_save, post_delete], sender=RegistroProducao)
+def invalidar_painel_do_registro(sender, instance, using, **kwargs):
+    marcar_alteracao(linha_ids=[instance.linha_id], using=using)
+
+@receiver(pre_save, sender=LinhaProducao)
+def guardar_setor_anterior(sender, instance, using, **kwargs):
+    if instance.pk is None:
+        instance._setor_anterior = None
+        return
+    instance._setor_anterior = (
+        sender.objects.using(using).filter(pk=instance.pk).values_list("setor", flat=True).first()
+    )
+
+@receiver(post_save, sender=LinhaProducao)
+def invalidar_painel_da_linha(sender, instance, using, created, **kwargs):
+    # linha que trocou de setor some do painel antigo: as duas versões mudam
+    anterior = getattr(instance, "_setor_anterior", None)
+    if not created and anterior != instance.setor:
+        marcar_alteracao(linha_ids=[instance.pk], setores=[anterior], using=using)
+
+@receiver(post_delete, sender=LinhaProducao)
+def invalidar_painel_da_linha_excluida(sender, instance, using, **kwargs):
+    # no commit a linha já não existe para a consulta de setores
+    marcar_alteracao(setores=[instance.setor], using=using)
+
+@receiver([post_save, post_delete], sender=PermissaoSetorUsuario)
+def invalidar_cache_de_setores(sender, instance, **kwargs):
+    invalidar_setores(instance.usuario_id)
+
+# -----------------------
+# Índice de busca (sgpi/busca.py)
+# -----------------------
+CAMPOS_BUSCA_REGISTRO = {"linha", "linha_id", "motivo_parada"}
+
+@receiver(post_save, sender=RegistroProducao)
+def indexar_registro(sender, instance, using, update_fields=None, **kwargs):
+    # finalizar/reabrir e afins gravam só alguns campos; não mexem no texto
+    if update_fields is not None and not CAMPOS_BUSCA_REGISTRO & set(update_fields):
+        return
+    obter_backend(using).indexar([instance.pk])
+
+@receiver(post_delete, sender=RegistroProducao)
+def remover_registro_da_busca(sender, instance, using, **kwargs):
+    obter_backend(using).remover([instance.pk])
 
 @receiver([post_save, post_delete], sender=Parada)
-def atualizar_totais_por_parada(sender, instance, **kwargs):
-    instance.registro.recalc_totais()
+def indexar_motivos_da_parada(sender, instance, using, **kwargs):
+    indexar_no_commit(instance.registro_id, using=using)
+
+@receiver(post_save, sender=LinhaProducao)
+def indexar_registros_da_linha(sender, instance, using, created, **kwargs):
+    if not created:
+        obter_backend(using).indexar_linha(instance.pk)
@@ -1,3 +1,1578 @@
-from django.test import TestCase
+import asyncio
+import csv
+import importlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import date, time, timedelta
+from importlib.util import find_spec
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from project.bancos import SQLITE_BUSY_TIMEOUT, banco_postgresql, banco_sqlite, variaveis_de_url
+
+from . import analitico, arquivo, intervalos
+from .apontamento import RegistroArquivado, gravar_apontamento
+from .aovivo import Assinante, central
+from .busca import BuscaFTS5, obter_backend
+from .consolidacao import reconstruir
+from .dados_sinteticos import gerar_linhas, gerar_registros
+from .forms import ParadaFormSet, RegistroHoraFormSet, RegistroProducaoForm
+from .importacao import CacheRegistros, importar_registros_hora, ler_csv
+from .ingestao import BufferContadores, gravar_contadores
+from .middleware import OrcamentoConsultasExcedido, medicoes
+from .models import (
+    LinhaProducao, MotivoParada, Parada, PermissaoSetorUsuario, ProducaoDiaria, ProducaoMensal,
+    RegistroHora, RegistroProducao, normalizar_motivo,
+)
+from .oee import calcular_oee
+from .pareto import calcular_pareto
+from .painel import estados_do_canal, invalidar_setores
+from .permissoes import setores_permitidos
+from .recalculo import suspender_recalculo
+from .turnos import hora_cheia
+from .views import _fluxo_ao_vivo
+
+
+def criar_registros(linha, quantidade, inicio=date(2025, 1, 1)):
+    turnos = [t for t, _ in RegistroProducao.TURNO_CHOICES]
+    registros = [
+        RegistroProducao(
+            linha=linha,
+            data=inicio + timedelta(days=i // len(turnos)),
+            turno=turnos[i % len(turnos)],
+            quantidade_produzida=100 + i,
+            quantidade_defeituosa=i % 7,
+        )
+        for i in range(quantidade)
+    ]
+    return RegistroProducao.objects.bulk_create(registros)
+
+
+class RegistroProducaoListViewQueryTests(TestCase):
+    """A lista não pode voltar a fazer uma consulta por registro (N+1)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@sgpi.local", "senha")
+        cls.operador = User.objects.create_user("operador", "op@sgpi.local", "senha")
+        cls.linha = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=500)
+        PermissaoSetorUsuario.objects.create(usuario=cls.operador, setor="Envase")
+
+    def _consultas_da_pagina(self, usuario):
+        self.client.force_login(usuario)
+        url = reverse("registros-lista")
+        self.client.get(url)  # aquece sessão/templates
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return len(ctx.captured_queries), resp
+
+    def test_numero_de_consultas_nao_depende_do_tamanho_da_pagina(self):
+        for usuario in (self.admin, self.operador):
+            with self.subTest(usuario=usuario.username):
+                RegistroProducao.objects.all().delete()
+                criar_registros(self.linha, 2)
+                poucos, _ = self._consultas_da_pagina(usuario)
+
+                RegistroProducao.objects.all().delete()
+                criar_registros(self.linha, 20)
+                muitos, resp = self._consultas_da_pagina(usuario)
+
+                self.assertEqual(poucos, muitos)
+                self.assertContains(resp, "Envase 1", count=20)
+
+    def test_superuser_lista_em_consultas_fixas(self):
+        criar_registros(self.linha, 20)
+        self.client.force_login(self.admin)
+        # sessão, usuário, página com linha em JOIN (keyset: sem COUNT)
+        with self.assertNumQueries(3):
+            self.client.get(reverse("registros-lista"))
+
+    def test_lista_mostra_totais_gravados(self):
+        registro = criar_registros(self.linha, 1)[0]
+        self.client.force_login(self.admin)
+        resp = self.client.get(reverse("registros-lista"))
+        self.assertContains(resp, f"<td>{registro.quantidade_produzida}</td>", html=True)
+
+
+class PaginacaoKeysetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@sgpi.local", "senha")
+        cls.linha = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=500)
+        criar_registros(cls.linha, 45)
+
+    def test_percorre_todas_as_paginas_nos_dois_sentidos(self):
+        esperado = list(RegistroProducao.objects.order_by("-data", "turno", "pk").values_list("pk", flat=True))
+        self.client.force_login(self.admin)
+        url = reverse("registros-lista")
+
+        vistos, paginas, cursor = [], [], None
+        while True:
+            resp = self.client.get(url, {"cursor": cursor} if cursor else {})
+            pagina = resp.context["page_obj"]
+            paginas.append(pagina)
+            vistos += [r.pk for r in pagina]
+            if not pagina.tem_proxima:
+                break
+            cursor = pagina.cursor_proximo
+        self.assertEqual(vistos, esperado)
+        self.assertEqual([len(p) for p in paginas], [20, 20, 5])
+
+        resp = self.client.get(url, {"cursor": paginas[-1].cursor_anterior})
+        self.assertEqual([r.pk for r in resp.context["page_obj"]], esperado[20:40])
+
+    def test_cursor_invalido_volta_para_a_primeira_pagina(self):
+        self.client.force_login(self.admin)
+        resp = self.client.get(reverse("registros-lista"), {"cursor": "lixo!"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(resp.context["page_obj"].tem_anterior)
+
+
+class RecalculoTotaisTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.linha = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=500)
+
+    def test_recalcula_uma_vez_por_registro_no_commit(self):
+        registro = criar_registros(self.linha, 1)[0]
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for h in range(6, 12):
+                RegistroHora.objects.create(
+                    registro=registro, hora_inicio=time(h), hora_fim=time(h + 1),
+                    quantidade_produzida=10, quantidade_defeituosa=1,
+                )
+            Parada.objects.create(registro=registro, hora_inicio=time(8), hora_fim=time(8, 30))
+
+        # um recálculo e uma reindexação da busca (pela parada)
+        self.assertEqual(len(callbacks), 2)
+        registro.refresh_from_db()
+        self.assertEqual(registro.quantidade_produzida, 60)
+        self.assertEqual(registro.quantidade_defeituosa, 6)
+        self.assertEqual(registro.tempo_parado, 30)
+
+    def test_suspender_recalculo_sem_recalcular(self):
+        registro = criar_registros(self.linha, 1)[0]
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with suspender_recalculo(recalcular_ao_sair=False) as marcados:
+                RegistroHora.objects.create(
+                    registro=registro, hora_inicio=time(6), hora_fim=time(7),
+                    quantidade_produzida=10,
+                )
+        self.assertEqual(callbacks, [])
+        self.assertEqual(marcados, {("default", registro.pk)})
+
+    @override_settings(SGPI_TOTAIS_INCREMENTAIS=True)
+    def test_modo_incremental_aplica_so_a_diferenca(self):
+        registro = criar_registros(self.linha, 1)[0]
+        RegistroProducao.objects.filter(pk=registro.pk).update(quantidade_produzida=0, quantidade_defeituosa=0)
+        with self.assertNumQueries(2):  # INSERT + UPDATE com F()
+            hora = RegistroHora.objects.create(
+                registro=registro, hora_inicio=time(6), hora_fim=time(7),
+                quantidade_produzida=40, quantidade_defeituosa=4,
+            )
+        hora = RegistroHora.objects.get(pk=hora.pk)
+        hora.quantidade_produzida = 35
+        hora.save()
+        RegistroHora.objects.create(
+            registro=registro, hora_inicio=time(7), hora_fim=time(8), quantidade_produzida=10,
+        ).delete()
+
+        registro.refresh_from_db()
+        self.assertEqual((registro.quantidade_produzida, registro.quantidade_defeituosa), (35, 4))
+
+
+class SetoresPermitidosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.operador = User.objects.create_user("operador", "op@sgpi.local", "senha")
+        PermissaoSetorUsuario.objects.create(usuario=cls.operador, setor="Envase")
+
+    def _usuario(self):
+        # objeto novo = requisição nova (sem a memorização por requisição)
+        return User.objects.get(pk=self.operador.pk)
+
+    def test_consulta_uma_vez_e_usa_o_cache(self):
+        usuario = self._usuario()
+        with self.assertNumQueries(1):
+            self.assertEqual(setores_permitidos(usuario), {"Envase"})
+            self.assertEqual(setores_permitidos(usuario), {"Envase"})
+        with self.assertNumQueries(0):
+            self.assertEqual(setores_permitidos(User(pk=self.operador.pk)), {"Envase"})
+
+    def test_gravar_ou_excluir_permissao_invalida_o_cache(self):
+        setores_permitidos(self._usuario())
+        permissao = PermissaoSetorUsuario.objects.create(usuario=self.operador, setor="Rotulagem")
+        self.assertEqual(setores_permitidos(self._usuario()), {"Envase", "Rotulagem"})
+        permissao.delete()
+        self.assertEqual(setores_permitidos(self._usuario()), {"Envase"})
+
+    def test_revogacao_chega_aos_outros_workers_pelo_cache_compartilhado(self):
+        with mock.patch.dict(os.environ, {"DJANGO_SECRET_KEY": "x"}):
+            perfil = importlib.reload(importlib.import_module("project.settings_producao"))
+        self.assertEqual(perfil.CACHES["default"]["BACKEND"], "django.core.cache.backends.filebased.FileBasedCache")
+
+        with tempfile.TemporaryDirectory() as diretorio:
+            # dois processos, cada um com a sua instância do mesmo cache em arquivo
+            worker_a, worker_b = FileBasedCache(diretorio, {}), FileBasedCache(diretorio, {})
+            with mock.patch("sgpi.permissoes.cache", worker_a):
+                self.assertEqual(setores_permitidos(self._usuario()), {"Envase"})
+            with mock.patch("sgpi.permissoes.cache", worker_b):
+                PermissaoSetorUsuario.objects.filter(usuario=self.operador).delete()
+            with mock.patch("sgpi.permissoes.cache", worker_a):
+                self.assertEqual(setores_permitidos(self._usuario()), frozenset())
+
+
+class OEETests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.envase = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=60)
+        cls.rotulo = LinhaProducao.objects.create(nome="Rótulo 1", setor="Rotulagem", capacidade_nominal=0)
+        cls.operador = User.objects.create_user("operador", "op@sgpi.local", "senha")
+        PermissaoSetorUsuario.objects.create(usuario=cls.operador, setor="Envase")
+
+    def _criar(self, linha, dia, produzida, defeituosa=0, parado=0):
+        return RegistroProducao.objects.create(
+            linha=linha, data=date(2025, 6, dia), turno="1/especial",
+            quantidade_produzida=produzida, quantidade_defeituosa=defeituosa, tempo_parado=parado,
+        )
+
+    def _oee(self, agrupar_por="dia"):
+        return list(calcular_oee(date(2025, 6, 1), date(2025, 6, 30), agrupar_por))
+
+    def test_indicadores_de_um_turno(self):
+        self._criar(self.envase, 2, produzida=360, defeituosa=36, parado=120)
+        (linha,) = self._oee()
+        # 360 min operando x 60/h = 360 peças possíveis
+        self.assertEqual(
+            [round(linha[c], 1) for c in ("disponibilidade_pct", "desempenho_pct", "qualidade_pct", "oee_pct")],
+            [75.0, 100.0, 90.0, 67.5],
+        )
+
+    def test_sem_producao(self):
+        self._criar(self.envase, 2, produzida=0)
+        (linha,) = self._oee()
+        self.assertEqual((linha["disponibilidade_pct"], linha["desempenho_pct"]), (100.0, 0.0))
+        self.assertIsNone(linha["qualidade_pct"])
+        self.assertIsNone(linha["oee_pct"])
+
+    def test_parada_maior_que_o_turno(self):
+        self._criar(self.envase, 2, produzida=10, parado=600)
+        self._criar(self.envase, 3, produzida=240, parado=240)
+        dia_2, dia_3 = self._oee()
+        # o tempo operando não fica negativo
+        self.assertEqual((dia_2["minutos_operando"], dia_2["disponibilidade_pct"]), (0, 0.0))
+        self.assertIsNone(dia_2["desempenho_pct"])
+        (mes,) = self._oee("linha")
+        self.assertEqual((mes["minutos_operando"], mes["minutos_planejados"]), (240, 960))
+        self.assertEqual(mes["disponibilidade_pct"], 25.0)
+
+    def test_linha_sem_capacidade(self):
+        self._criar(self.rotulo, 2, produzida=100, defeituosa=5)
+        (linha,) = self._oee()
+        self.assertEqual(linha["capacidade_teorica"], 0)
+        self.assertIsNone(linha["desempenho_pct"])
+        self.assertIsNone(linha["oee_pct"])
+        self.assertEqual(linha["qualidade_pct"], 95.0)
+
+    def test_relatorio_so_mostra_os_setores_do_usuario(self):
+        self._criar(self.envase, 2, produzida=100)
+        self._criar(self.rotulo, 2, produzida=100)
+        params = {"data_inicio": "2025-06-01", "data_fim": "2025-06-30", "agrupar_por": "linha"}
+
+        self.client.force_login(self.operador)
+        resposta = self.client.get(reverse("relatorios-oee"), params)
+        self.assertEqual([l["linha__nome"] for l in resposta.context["linhas_oee"]], ["Envase 1"])
+
+        PermissaoSetorUsuario.objects.filter(usuario=self.operador).delete()
+        resposta = self.client.get(reverse("relatorios-oee"), params)
+        self.assertEqual(list(resposta.context["linhas_oee"]), [])
+
+
+class ConsolidadosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.linha = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=500)
+
+    def _registro(self, turno, produzida):
+        registro = RegistroProducao.objects.create(linha=self.linha, data=date(2025, 3, 10), turno=turno)
+        RegistroHora.objects.create(
+            registro=registro, hora_inicio=time(6), hora_fim=time(7),
+            quantidade_produzida=produzida, quantidade_defeituosa=1,
+        )
+        return RegistroProducao.objects.get(pk=registro.pk)
+
+    def _diario(self):
+        return ProducaoDiaria.objects.values_list("quantidade_produzida", "quantidade_defeituosa", "registros").get()
+
+    def test_finalizar_e_reabrir_atualizam_consolidados(self):
+        primeiro = self._registro("1/especial", 100)
+        segundo = self._registro("2/especial", 50)
+        primeiro.finalizar()
+        segundo.finalizar()
+        self.assertEqual(self._diario(), (150, 2, 2))
+        self.assertEqual(ProducaoMensal.objects.get().mes, date(2025, 3, 1))
+
+        segundo.reabrir()
+        self.assertEqual(self._diario(), (100, 1, 1))
+        self.assertEqual(ProducaoMensal.objects.get().quantidade_produzida, 100)
+
+    def test_reconstruir_bate_com_incremental(self):
+        self._registro("1/especial", 100).finalizar()
+        self._registro("2/especial", 50).finalizar()
+        self._registro("3/especial", 70)  # aberto, fica de fora
+        incremental = self._diario()
+        ProducaoDiaria.objects.update(quantidade_produzida=0)
+
+        self.assertEqual(reconstruir(RegistroProducao.objects.all()), (1, 1))
+        self.assertEqual(self._diario(), incremental)
+
+    def test_registro_finalizado_nao_pode_ser_editado(self):
+        admin = User.objects.create_superuser("admin", "admin@sgpi.local", "senha")
+        self.client.force_login(admin)
+        registro = self._registro("1/especial", 100)
+        registro.finalizar()
+        dados = {
+            "linha": self.linha.pk, "data": "2025-03-10", "turno": "1/especial", "salvar": "1",
+            "hora-TOTAL_FORMS": "1", "hora-INITIAL_FORMS": "0",
+            "hora-0-hora_inicio": "07:00", "hora-0-hora_fim": "08:00",
+            "hora-0-quantidade_produzida": "50", "hora-0-quantidade_defeituosa": "0",
+            "parada-TOTAL_FORMS": "0", "parada-INITIAL_FORMS": "0",
+        }
+        resposta = self.client.post(reverse("registros-editar", args=[registro.pk]), dados)
+        self.assertRedirects(resposta, reverse("registros-detalhes", args=[registro.pk]))
+        self.assertEqual(registro.registros_hora.count(), 1)
+        self.assertNotContains(self.client.get(resposta.url), reverse("registros-editar", args=[registro.pk]))
+
+        registro.refresh_from_db()
+        form = RegistroProducaoForm(dados, instance=registro, user=admin)
+        self.assertNotIn("finalizada", form.fields)
+        self.assertFalse(form.is_valid())
+
+        registro.reabrir()
+        self.assertFalse(ProducaoDiaria.objects.filter(registros__gt=0).exists())
+
+
+class PainelTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.linha = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=500)
+        LinhaProducao.objects.create(nome="Rótulo 1", setor="Rotulagem", capacidade_nominal=500)
+        cls.operador = User.objects.create_user("operador", "op@sgpi.local", "senha")
+        PermissaoSetorUsuario.objects.create(usuario=cls.operador, setor="Envase")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.operador)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.registro = RegistroProducao.objects.create(
+                linha=self.linha, data=timezone.localdate(), turno="1/especial",
+            )
+
+    def _hora(self, inicio, produzida):
+        with self.captureOnCommitCallbacks(execute=True):
+            RegistroHora.objects.create(
+                registro=self.registro, hora_inicio=time(inicio), hora_fim=time(inicio + 1),
+                quantidade_produzida=produzida, quantidade_defeituosa=produzida // 10,
+            )
+
+    def test_fragmento_em_cache_e_invalidado_ao_gravar(self):
+        self._hora(6, 100)
+        resposta = self.client.get(reverse("painel"))
+        self.assertContains(resposta, "Envase 1")
+        self.assertNotContains(resposta, "Rotulagem")
+
+        # cache quente: só sessão + usuário
+        with self.assertNumQueries(2):
+            self.assertContains(self.client.get(reverse("painel")), "<td>100</td>", count=2)
+
+        self._hora(7, 50)
+        self.assertContains(self.client.get(reverse("painel")), "<td>150</td>", count=2)
+
+    def test_linha_sem_setor(self):
+        sem_setor = LinhaProducao.objects.create(nome="Avulsa", setor=None, capacidade_nominal=100)
+        with self.captureOnCommitCallbacks(execute=True):
+            registro = RegistroProducao.objects.create(linha=sem_setor, data=timezone.localdate(), turno="1/especial")
+            RegistroHora.objects.create(registro=registro, hora_inicio=time(6), hora_fim=time(7), quantidade_produzida=10)
+
+        self.client.force_login(User.objects.create_superuser("admin", "admin@sgpi.local", "senha"))
+        resposta = self.client.get(reverse("painel"))
+        self.assertEqual(resposta.status_code, 200)
+        self.assertContains(resposta, "Rotulagem")
+        self.assertNotContains(resposta, "Avulsa")
+
+    def test_linha_que_muda_de_setor_sai_do_painel_antigo(self):
+        self._hora(6, 100)
+        PermissaoSetorUsuario.objects.create(usuario=self.operador, setor="Rotulagem")
+        resposta = self.client.get(reverse("painel"))
+        self.assertContains(resposta, "Envase 1", count=1)
+
+        self.linha.setor = "Rotulagem"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.linha.save()
+        envase, rotulagem = self.client.get(reverse("painel")).content.decode().split('<div class="card-header">')[1:]
+        # os dois fragmentos foram remontados: a linha só aparece no novo setor
+        self.assertNotIn("Envase 1", envase)
+        self.assertIn("<td>Envase 1</td>", rotulagem)
+        self.assertIn("<td>100</td>", rotulagem)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.linha.delete()
+        self.assertNotContains(self.client.get(reverse("painel")), "Envase 1")
+
+
+@skipUnless(connection.vendor == "sqlite", "FTS5 só existe no SQLite")
+class BuscaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.linha = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=500)
+        outra = LinhaProducao.objects.create(nome="Rótulo 1", setor="Rotulagem", capacidade_nominal=500)
+        cls.registro = RegistroProducao.objects.create(linha=cls.linha, data=date(2024, 2, 1), turno="1/especial")
+        cls.outro = RegistroProducao.objects.create(
+            linha=outra, data=date(2024, 2, 1), turno="1/especial", motivo_parada="Troca de bobina",
+        )
+        cls.usuario = User.objects.create_superuser("admin", "admin@sgpi.local", "senha")
+
+    def _ids(self, texto):
+        return set(obter_backend().filtrar(RegistroProducao.objects.all(), texto).values_list("pk", flat=True))
+
+    def test_backend_fts5_no_sqlite(self):
+        self.assertIsInstance(obter_backend(), BuscaFTS5)
+
+    def test_prefixo_sem_acento_e_sincronizado_com_paradas(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            parada = Parada.objects.create(
+                registro=self.registro, hora_inicio=time(8), hora_fim=time(8, 20), motivo="Vazamento na válvula",
+            )
+        self.assertEqual(self._ids("vaz"), {self.registro.pk})
+        self.assertEqual(self._ids("valvula"), {self.registro.pk})
+        self.assertEqual(self._ids("envase vaz"), {self.registro.pk})
+        self.assertEqual(self._ids("bobina"), {self.outro.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            parada.delete()
+        self.assertEqual(self._ids("vazamento"), set())
+
+    def test_formset_de_paradas_reindexa_o_registro_uma_vez(self):
+        motivos = ["Vazamento", "Setup", "Falta de material", "Limpeza"]
+        dados = {"parada-TOTAL_FORMS": str(len(motivos)), "parada-INITIAL_FORMS": "0"}
+        for i, motivo in enumerate(motivos):
+            dados.update({f"parada-{i}-hora_inicio": f"{8 + i}:00", f"parada-{i}-hora_fim": f"{8 + i}:10",
+                          f"parada-{i}-motivo": motivo})
+        formset = ParadaFormSet(dados, instance=self.registro, prefix="parada")
+        self.assertTrue(formset.is_valid(), formset.errors)
+
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            formset.save()
+        reindexacoes = [q for q in consultas.captured_queries if q["sql"].startswith("DELETE FROM sgpi_busca")]
+        self.assertEqual(len(reindexacoes), 1)
+        self.assertEqual(self._ids("limpeza setup"), {self.registro.pk})
+
+    def test_renomear_linha_reindexa_registros(self):
+        self.linha.nome = "Enchedora"
+        self.linha.save()
+        self.assertEqual(self._ids("enched"), {self.registro.pk})
+        self.assertEqual(self._ids("envase enched"), {self.registro.pk})  # setor continua "Envase"
+        self.assertEqual(self._ids("envase 1"), set())
+
+    @override_settings(SGPI_BUSCA_BACKEND="sgpi.busca.BuscaSimples")
+    def test_backend_simples_mesmos_resultados(self):
+        Parada.objects.create(registro=self.registro, hora_inicio=time(8), hora_fim=time(8, 20), motivo="Vazamento")
+        self.assertEqual(self._ids("vaz"), {self.registro.pk})
+        self.assertEqual(self._ids("bobina"), {self.outro.pk})
+
+    def test_endpoint_ranqueado(self):
+        self.client.force_login(self.usuario)
+        resposta = self.client.get(reverse("registros-buscar"), {"q": "bobina"}).json()
+        self.assertEqual([r["id"] for r in resposta["resultados"]], [self.outro.pk])
+        self.assertIn("[bobina]", resposta["resultados"][0]["trecho"])
+
+
+@override_settings(SGPI_ARQUIVO_CAMINHO=Path(tempfile.gettempdir()) / "sgpi-testes-sem-arquivo" / "arquivo.sqlite3")
+class ExportacaoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@sgpi.local", "senha")
+        cls.operador = User.objects.create_user("operador", "op@sgpi.local", "senha")
+        PermissaoSetorUsuario.objects.create(usuario=cls.operador, setor="Envase")
+        envase = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=500)
+        rotulo = LinhaProducao.objects.create(nome="Rótulo 1", setor="Rotulagem", capacidade_nominal=500)
+        cls.registro = RegistroProducao.objects.create(linha=envase, data=date(2025, 6, 2), turno="1/especial")
+        cls.outro = RegistroProducao.objects.create(
+            linha=rotulo, data=date(2025, 6, 2), turno="1/especial", motivo_parada="Troca de bobina",
+        )
+        for registro in (cls.registro, cls.outro):
+            RegistroHora.objects.create(registro=registro, hora_inicio=time(6), hora_fim=time(7),
+                                        quantidade_produzida=100, quantidade_defeituosa=2)
+        Parada.objects.create(registro=cls.registro, hora_inicio=time(6, 10), hora_fim=time(6, 25),
+                              motivo="Falta de material")
+
+    def _exportar(self, usuario, **params):
+        self.client.force_login(usuario)
+        resposta = self.client.get(reverse("registros-exportar"), params)
+        if resposta.status_code != 200:
+            return resposta, None
+        return resposta, b"".join(resposta.streaming_content).decode()
+
+    def _csv(self, usuario, **params):
+        resposta, conteudo = self._exportar(usuario, **params)
+        self.assertEqual(resposta["Content-Type"], "text/csv; charset=utf-8")
+        return list(csv.DictReader(io.StringIO(conteudo.lstrip("\ufeff"))))
+
+    def test_nao_superuser_so_exporta_os_seus_setores(self):
+        self.assertEqual([l["linha"] for l in self._csv(self.operador)], ["Envase 1"])
+        self.assertEqual({l["linha"] for l in self._csv(self.admin)}, {"Envase 1", "Rótulo 1"})
+        self.assertEqual([l["registro_id"] for l in self._csv(self.operador, detalhar="horas")], [str(self.registro.pk)])
+
+    def test_filtro_q(self):
+        self.assertEqual([l["id"] for l in self._csv(self.admin, q="bobina")], [str(self.outro.pk)])
+        self.assertEqual(self._csv(self.operador, q="bobina"), [])
+
+    def test_detalhar_horas_e_paradas(self):
+        resposta, conteudo = self._exportar(self.admin, formato="jsonl", detalhar="horas")
+        self.assertEqual(resposta["Content-Type"], "application/x-ndjson")
+        self.assertIn('filename="registros_horas.jsonl"', resposta["Content-Disposition"])
+        horas = [json.loads(l) for l in conteudo.splitlines()]
+        self.assertEqual(len(horas), 2)
+        self.assertEqual(
+            {k: horas[0][k] for k in ("hora_inicio", "hora_fim", "quantidade_produzida", "quantidade_defeituosa")},
+            {"hora_inicio": "06:00:00", "hora_fim": "07:00:00", "quantidade_produzida": 100, "quantidade_defeituosa": 2},
+        )
+
+        paradas = self._csv(self.admin, detalhar="paradas")
+        self.assertEqual(
+            [(p["registro_id"], p["hora_inicio"], p["duracao"], p["motivo"]) for p in paradas],
+            [(str(self.registro.pk), "06:10:00", "15", "Falta de material")],
+        )
+
+    def test_parametros_invalidos(self):
+        for params in ({"formato": "xlsx"}, {"detalhar": "motivos"}):
+            resposta, _ = self._exportar(self.admin, **params)
+            self.assertEqual(resposta.status_code, 400)
+
+
+class ParetoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vazamento = MotivoParada.objects.create(descricao="Vazamento de óleo")
+        cls.setup = MotivoParada.objects.create(descricao="Setup")
+        linha = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=500)
+        registro = RegistroProducao.objects.create(linha=linha, data=date(2025, 4, 1), turno="1/especial")
+        paradas = [
+            (time(6), time(7), "vazamento de oleo!"),
+            (time(8), time(8, 30), "Vazamento  do óleo"),
+            (time(9), time(9, 20), "setup"),
+            (time(10), time(10, 10), "operador ausente"),
+        ]
+        for inicio, fim, motivo in paradas:
+            Parada.objects.create(registro=registro, hora_inicio=inicio, hora_fim=fim, motivo=motivo)
+
+    def test_classifica_texto_livre_pela_chave(self):
+        self.assertEqual(normalizar_motivo("Vazamento  do ÓLEO."), "vazamento oleo")
+        self.assertEqual(Parada.objects.filter(motivo_padrao=self.vazamento).count(), 2)
+        self.assertFalse(Parada.objects.get(motivo="operador ausente").motivo_padrao_id)
+
+    def test_formset_classifica_sem_uma_consulta_por_parada(self):
+        registro = RegistroProducao.objects.create(
+            linha=LinhaProducao.objects.get(), data=date(2025, 4, 2), turno="2/especial"
+        )
+        textos = ["Vazamento de óleo", "SETUP.", "operador ausente", "vazamento do oleo"]
+        dados = {"parada-TOTAL_FORMS": str(len(textos)), "parada-INITIAL_FORMS": "0"}
+        for i, motivo in enumerate(textos):
+            dados.update({f"parada-{i}-hora_inicio": f"{14 + i}:00", f"parada-{i}-hora_fim": f"{14 + i}:10",
+                          f"parada-{i}-motivo": motivo})
+        formset = ParadaFormSet(dados, instance=registro, prefix="parada")
+
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertTrue(formset.is_valid(), formset.errors)
+            formset.save()
+
+        catalogo = [q for q in consultas.captured_queries if "sgpi_motivoparada" in q["sql"]]
+        self.assertEqual(len(catalogo), 1)
+        self.assertEqual(
+            [p.motivo_padrao for p in registro.paradas.order_by("hora_inicio")],
+            [self.vazamento, self.setup, None, self.vazamento],
+        )
+
+    def test_relatorio_so_mostra_os_setores_do_usuario(self):
+        operador = User.objects.create_user("operador", "op@sgpi.local", "senha")
+        PermissaoSetorUsuario.objects.create(usuario=operador, setor="Rotulagem")
+        params = {"data_inicio": "2025-04-01", "data_fim": "2025-04-30", "formato": "json"}
+        self.client.force_login(operador)
+
+        self.assertEqual(self.client.get(reverse("relatorios-pareto"), params).json()["pareto"], [])
+        PermissaoSetorUsuario.objects.create(usuario=operador, setor="Envase")
+        pareto = self.client.get(reverse("relatorios-pareto"), params).json()["pareto"]
+        self.assertEqual(sum(p["ocorrencias"] for p in pareto), 4)
+
+    def test_pareto_ordenado_com_acumulado(self):
+        with self.assertNumQueries(1):
+            pareto = calcular_pareto(date(2025, 4, 1), date(2025, 4, 30))
+        self.assertEqual(
+            [(p["motivo"], p["minutos"], p["ocorrencias"], p["pct_acumulado"]) for p in pareto],
+            [("Vazamento de óleo", 90, 2, 75.0), ("Setup", 20, 1, 91.7), ("Sem motivo padronizado", 10, 1, 100.0)],
+        )
+        self.assertEqual(calcular_pareto(date(2025, 5, 1), date(2025, 5, 31)), [])
+
+
+class FinalizacaoEmMassaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.linha = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=500)
+
+    def test_finaliza_em_massa_recalcula_e_e_idempotente(self):
+        registros = criar_registros(self.linha, 30)
+        with suspender_recalculo(recalcular_ao_sair=False):
+            for registro in registros:
+                RegistroHora.objects.create(
+                    registro=registro, hora_inicio=time(6), hora_fim=time(7), quantidade_produzida=10,
+                )
+        qs = RegistroProducao.objects.filter(linha=self.linha)
+
+        outra = LinhaProducao.objects.create(nome="Envase 2", setor="Envase", capacidade_nominal=500)
+        criar_registros(outra, 3)
+        with CaptureQueriesContext(connection) as poucos:
+            self.assertEqual(RegistroProducao.objects.filter(linha=outra).finalizar(), 3)
+        with CaptureQueriesContext(connection) as muitos:
+            self.assertEqual(qs.finalizar(), 30)
+        # o número de consultas não cresce com o número de registros
+        self.assertEqual(len(muitos), len(poucos))
+        self.assertEqual(qs.finalizar(), 0)
+
+        self.assertEqual(
+            set(qs.values_list("finalizada", "quantidade_produzida")), {(True, 10)}
+        )
+        self.assertEqual(ProducaoMensal.objects.get(linha=self.linha).registros, 30)
+
+        self.assertEqual(qs.filter(data=registros[0].data).reabrir(), 3)  # um dia = 3 turnos
+        self.assertEqual(qs.reabrir(), 27)
+        self.assertEqual(qs.reabrir(), 0)
+        self.assertFalse(ProducaoMensal.objects.filter(linha=self.linha).exclude(registros=0).exists())
+
+
+class ApiApontamentoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.linha = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=500)
+        cls.outra = LinhaProducao.objects.create(nome="Rótulo 1", setor="Rotulagem", capacidade_nominal=500)
+        cls.operador = User.objects.create_user("operador", "op@sgpi.local", "senha")
+        PermissaoSetorUsuario.objects.create(usuario=cls.operador, setor="Envase")
+
+    def setUp(self):
+        self.client.force_login(self.operador)
+
+    def _enviar(self, linha=None, **extra):
+        dados = {
+            "linha": (linha or self.linha).pk, "data": "2025-06-02", "turno": "1",
+            "horas": [
+                {"hora_inicio": "06:00", "hora_fim": "07:00", "quantidade_produzida": 100, "quantidade_defeituosa": 3},
+                {"hora_inicio": "07:00", "hora_fim": "08:00", "quantidade_produzida": 80},
+            ],
+            **extra,
+        }
+        return self.client.post(reverse("api-apontamento"), dados, content_type="application/json")
+
+    def test_cria_e_depois_atualiza_pela_chave(self):
+        resposta = self._enviar()
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(resposta.json()["quantidade_produzida"], 180)
+
+        resposta = self._enviar(horas=[
+            {"hora_inicio": "07:00", "hora_fim": "08:00", "quantidade_produzida": 90},
+            {"hora_inicio": "08:00", "hora_fim": "09:00", "quantidade_produzida": 50},
+        ])
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json(), {
+            "id": resposta.json()["id"], "quantidade_produzida": 240, "quantidade_defeituosa": 3, "tempo_parado": 0,
+        })
+        self.assertEqual(RegistroHora.objects.count(), 3)
+
+        resposta = self._enviar(substituir_horas=True, horas=[
+            {"hora_inicio": "06:00", "hora_fim": "07:00", "quantidade_produzida": 10},
+        ])
+        self.assertEqual(resposta.json()["quantidade_produzida"], 10)
+        self.assertEqual(RegistroHora.objects.count(), 1)
+
+    def test_erros_permissao_e_finalizado(self):
+        resposta = self._enviar(turno="9", horas=[{"hora_inicio": "06:00", "hora_fim": "06:00"}])
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(set(resposta.json()["erros"]), {"turno", "horas.0"})
+
+        self.assertEqual(self._enviar(linha=self.outra).status_code, 403)
+
+        self._enviar()
+        RegistroProducao.objects.filter(linha=self.linha).finalizar()
+        self.assertEqual(self._enviar().status_code, 409)
+
+
+class ImportacaoTests(TestCase):
+    CABECALHO = "linha;data;turno;hora_inicio;hora_fim;quantidade_produzida;quantidade_defeituosa\n"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@sgpi.local", "senha")
+        cls.linha = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=500)
+
+    def _importar(self, corpo):
+        return importar_registros_hora(ler_csv(io.StringIO(self.CABECALHO + corpo)))
+
+    def test_reimportar_mesmo_arquivo_nao_duplica(self):
+        corpo = (
+            "Envase 1;2025-06-02;1;06:00;07:00;100;2\n"
+            "Envase 1;2025-06-02;1;07:00;08:00;90;0\n"
+        )
+        primeiro, segundo = self._importar(corpo), self._importar(corpo)
+
+        self.assertEqual((primeiro.inseridas, primeiro.total_erros, primeiro.registros_criados), (2, 0, 1))
+        self.assertEqual((segundo.inseridas, segundo.total_erros, segundo.registros_criados), (2, 0, 0))
+        registro = RegistroProducao.objects.get()
+        self.assertEqual((registro.quantidade_produzida, registro.registros_hora.count()), (190, 2))
+        self.assertEqual(obter_backend().filtrar(RegistroProducao.objects.all(), "Envase 1").count(), 1)
+
+    def test_linhas_invalidas_vao_para_o_relatorio_sem_interromper(self):
+        amanha = timezone.localdate() + timedelta(days=1)
+        resultado = self._importar(
+            "Envase 1;2025-06-02;1;06:00;07:00;100;2\n"
+            "Envase 9;2025-06-02;1;07:00;08:00;90;0\n"
+            "Envase 1;2025-06-02;7;07:00;08:00;90;0\n"
+            f"Envase 1;{amanha};1;07:00;08:00;90;0\n"
+            "Envase 1;2025-06-02;1;07:00;08:00;10;20\n"
+            "Envase 1;2025-06-02;1;06:30;07:30;50;0\n"
+            "Envase 1;02/06/2025;2;14:00;15:00;80;1\n"
+        )
+
+        self.assertEqual((resultado.lidas, resultado.inseridas, resultado.total_erros), (7, 2, 5))
+        self.assertEqual([numero for numero, _, _ in resultado.erros], [3, 4, 5, 6, 7])
+        relatorio = resultado.relatorio_csv()
+        for trecho in ("Linha não encontrada", "Turno inválido", "no futuro", "maior que a produzida", "sobreposta"):
+            self.assertIn(trecho, relatorio)
+        self.assertEqual(
+            sorted(RegistroProducao.objects.values_list("turno", "quantidade_produzida")),
+            [("1/especial", 100), ("2/especial", 80)],
+        )
+
+    def test_registro_criado_por_outra_transacao_nao_conta_como_criado(self):
+        carregar = CacheRegistros._carregar
+
+        def concorrente(cache_registros, chaves):
+            carregar(cache_registros, chaves)
+            # outra importação cria o turno 1 entre a leitura e o INSERT
+            RegistroProducao.objects.get_or_create(linha=self.linha, data=date(2025, 6, 2), turno="1/especial")
+
+        with mock.patch.object(CacheRegistros, "_carregar", autospec=True, side_effect=concorrente):
+            resultado = self._importar(
+                "Envase 1;2025-06-02;1;06:00;07:00;100;2\n"
+                "Envase 1;2025-06-02;2;14:00;15:00;80;1\n"
+            )
+
+        self.assertEqual((resultado.inseridas, resultado.registros_criados), (2, 1))
+        self.assertEqual(RegistroProducao.objects.count(), 2)
+
+    def test_registro_finalizado_nao_recebe_horas(self):
+        self._importar("Envase 1;2025-06-02;1;06:00;07:00;100;2\n")
+        RegistroProducao.objects.finalizar()
+
+        resultado = self._importar("Envase 1;2025-06-02;1;06:00;07:00;300;0\n")
+        self.assertEqual((resultado.inseridas, resultado.total_erros), (0, 1))
+        self.assertEqual(RegistroProducao.objects.get().quantidade_produzida, 100)
+
+    def _enviar_arquivo(self, nome, conteudo):
+        self.client.force_login(self.admin)
+        arquivo = io.BytesIO(conteudo)
+        arquivo.name = nome
+        return self.client.post(reverse("registros-importar"), {"arquivo": arquivo})
+
+    def test_csv_malformado_vira_mensagem_e_nao_500(self):
+        campo_gigante = "x" * (csv.field_size_limit() + 1)
+        resposta = self._enviar_arquivo("producao.csv", (self.CABECALHO + f'"{campo_gigante}";2025-06-02\n').encode())
+        self.assertEqual(resposta.status_code, 200)
+        self.assertContains(resposta, "Não foi possível ler o arquivo")
+
+    @skipUnless(find_spec("openpyxl"), "openpyxl não instalado")
+    def test_xlsx_corrompido_vira_mensagem_e_nao_500(self):
+        resposta = self._enviar_arquivo("producao.xlsx", b"PK\x03\x04 isto nao e um zip")
+        self.assertEqual(resposta.status_code, 200)
+        self.assertContains(resposta, "Não foi possível ler o arquivo")
+
+    def test_relatorio_de_erros_e_baixado_de_qualquer_worker(self):
+        self.client.force_login(self.admin)
+        arquivo = io.BytesIO((self.CABECALHO + "Envase 9;2025-06-02;1;06:00;07:00;100;2\n").encode())
+        arquivo.name = "producao.csv"
+        with tempfile.TemporaryDirectory() as diretorio, override_settings(SGPI_IMPORTACAO_ERROS_DIR=diretorio):
+            resposta = self.client.post(reverse("registros-importar"), {"arquivo": arquivo})
+            token = resposta.context["token_erros"]
+            # o relatório não depende do cache local do worker que importou
+            cache.clear()
+            download = self.client.get(reverse("registros-importar-erros", args=[token]))
+            self.assertEqual(download.status_code, 200)
+            self.assertIn("Linha não encontrada", download.content.decode())
+
+            self.assertEqual(self.client.get(reverse("registros-importar-erros", args=["0" * 32])).status_code, 404)
+            self.assertEqual(self.client.get(reverse("registros-importar-erros", args=["..%2Fdb"])).status_code, 404)
+
+
+class MigracaoHoraUnicaTests(TransactionTestCase):
+    """0015 junta horas repetidas somando as quantidades, sem perder produção."""
+    antes = [("sgpi", "0014_agrupar_motivos_parada")]
+    depois = [("sgpi", "0015_hora_unica_por_registro")]
+
+    def _migrar(self, alvo):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(alvo)
+        return executor.loader.project_state(alvo).apps
+
+    def tearDown(self):
+        self._migrar(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_horas_repetidas_sao_somadas_e_consolidados_refeitos(self):
+        apps = self._migrar(self.antes)
+        Linha = apps.get_model("sgpi", "LinhaProducao")
+        Registro = apps.get_model("sgpi", "RegistroProducao")
+        Hora = apps.get_model("sgpi", "RegistroHora")
+        Diaria = apps.get_model("sgpi", "ProducaoDiaria")
+
+        linha = Linha.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=500)
+        registro = Registro.objects.create(
+            linha=linha, data=date(2025, 6, 2), turno="1/especial", finalizada=True,
+            quantidade_produzida=290, quantidade_defeituosa=3,
+        )
+        for produzida, defeituosa in ((100, 2), (100, 1)):
+            Hora.objects.create(registro=registro, hora_inicio=time(6), hora_fim=time(7),
+                                quantidade_produzida=produzida, quantidade_defeituosa=defeituosa)
+        Hora.objects.create(registro=registro, hora_inicio=time(7), hora_fim=time(8),
+                            quantidade_produzida=90, quantidade_defeituosa=0)
+        # consolidado desatualizado, como o deixaria uma exclusão de horas
+        Diaria.objects.create(linha=linha, setor="Envase", dia=date(2025, 6, 2),
+                              quantidade_produzida=190, registros=1)
+
+        self._migrar(self.depois)
+
+        horas = RegistroHora.objects.filter(registro_id=registro.pk).order_by("hora_inicio")
+        self.assertEqual(
+            list(horas.values_list("hora_inicio", "quantidade_produzida", "quantidade_defeituosa")),
+            [(time(6), 200, 3), (time(7), 90, 0)],
+        )
+        registro = RegistroProducao.objects.get(pk=registro.pk)
+        self.assertEqual((registro.quantidade_produzida, registro.quantidade_defeituosa), (290, 3))
+        diaria = ProducaoDiaria.objects.get(linha_id=linha.pk)
+        mensal = ProducaoMensal.objects.get(linha_id=linha.pk)
+        self.assertEqual((diaria.quantidade_produzida, diaria.quantidade_defeituosa, diaria.registros), (290, 3, 1))
+        self.assertEqual((mensal.mes, mensal.quantidade_produzida), (date(2025, 6, 1), 290))
+
+
+@override_settings(SGPI_INGESTAO_TOKEN="segredo")
+class IngestaoContadoresTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.linha = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=500)
+
+    def _enviar(self, dados, token="segredo"):
+        return self.client.post(
+            reverse("ingestao-contadores"), dados, content_type="application/json",
+            headers={"Authorization": f"Token {token}"},
+        )
+
+    def test_soma_eventos_na_hora_do_turno(self):
+        self.assertEqual(self._enviar({"linha": self.linha.pk}, token="errado").status_code, 401)
+        with override_settings(SGPI_INGESTAO_TOKEN=None):
+            self.assertEqual(self._enviar({"linha": self.linha.pk}).status_code, 503)
+
+        eventos = [
+            {"linha": self.linha.pk, "produzida": 10, "defeituosa": 1, "momento": "2025-06-02T06:10:00"},
+            {"linha": self.linha.pk, "produzida": 15, "momento": "2025-06-02T06:40:00"},
+            # depois da meia-noite: turno 3 do dia anterior
+            {"linha": self.linha.pk, "produzida": 7, "momento": "2025-06-03T05:30:00"},
+            {"linha": self.linha.pk, "produzida": 1, "defeituosa": 2},
+        ]
+        resposta = self._enviar({"eventos": eventos})
+        self.assertEqual(resposta.status_code, 202)
+        self.assertEqual(resposta.json()["aceitos"], 3)
+        self.assertEqual([r["indice"] for r in resposta.json()["rejeitados"]], [3])
+
+        self._enviar({"linha": self.linha.pk, "produzida": 5, "momento": "2025-06-02T06:59:59"})
+        primeiro = RegistroProducao.objects.get(data=date(2025, 6, 2), turno="1/especial")
+        hora = primeiro.registros_hora.get()
+        self.assertEqual((hora.hora_inicio, hora.hora_fim), (time(6), time(7)))
+        self.assertEqual((primeiro.quantidade_produzida, primeiro.quantidade_defeituosa), (30, 1))
+        terceiro = RegistroProducao.objects.get(data=date(2025, 6, 2), turno="3/especial")
+        self.assertEqual(terceiro.registros_hora.get().hora_inicio, time(5))
+
+    def test_buffer_agrupa_e_descarta_registro_finalizado(self):
+        buffer = BufferContadores()
+        momento = timezone.make_aware(timezone.datetime(2025, 6, 2, 9, 15))
+        for produzida in (3, 4, 5):
+            buffer.adicionar(self.linha.pk, momento, produzida, 0)
+        buffer.adicionar(self.linha.pk + 100, momento, 1, 0)
+        self.assertEqual((buffer.eventos, len(buffer._pendentes)), (4, 2))
+
+        with self.assertLogs("sgpi.ingestao", "WARNING"):
+            self.assertEqual(buffer.descarregar_sync(), (1, 1))
+        self.assertEqual(RegistroHora.objects.get().quantidade_produzida, 12)
+
+        RegistroProducao.objects.finalizar()
+        buffer.adicionar(self.linha.pk, momento, 6, 0)
+        with self.assertLogs("sgpi.ingestao", "WARNING"):
+            self.assertEqual(buffer.descarregar_sync(), (0, 1))
+        self.assertEqual(RegistroHora.objects.get().quantidade_produzida, 12)
+
+
+class PainelAoVivoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.linha = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=500)
+        cls.outra = LinhaProducao.objects.create(nome="Rótulo 1", setor="Rotulagem", capacidade_nominal=500)
+        cls.operador = User.objects.create_user("operador", "op@sgpi.local", "senha")
+        PermissaoSetorUsuario.objects.create(usuario=cls.operador, setor="Envase")
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.addCleanup(central._ultimo.clear)
+
+    def _assinar(self, **canal):
+        assinante = Assinante(self.loop, **canal)
+        central.assinar(assinante)
+        self.addCleanup(central.cancelar, assinante)
+        return assinante
+
+    def test_publica_so_o_que_mudou_para_o_setor(self):
+        assinante = self._assinar(setor="Envase")
+        data, turno, hora_inicio, hora_fim = hora_cheia(timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            registro = RegistroProducao.objects.create(linha=self.linha, data=data, turno=turno)
+            outro = RegistroProducao.objects.create(linha=self.outra, data=data, turno=turno)
+        self.assertEqual(central.retirar(assinante)[self.linha.pk]["registro"], registro.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RegistroHora.objects.create(
+                registro=registro, hora_inicio=hora_inicio, hora_fim=hora_fim,
+                quantidade_produzida=40, quantidade_defeituosa=2,
+            )
+            RegistroHora.objects.create(
+                registro=outro, hora_inicio=hora_inicio, hora_fim=hora_fim, quantidade_produzida=10,
+            )
+        delta = central.retirar(assinante)
+        self.assertEqual(list(delta), [self.linha.pk])
+        self.assertEqual(
+            {k: delta[self.linha.pk][k] for k in ("hora_produzida", "produzida", "taxa_defeitos")},
+            {"hora_produzida": 40, "produzida": 40, "taxa_defeitos": 5.0},
+        )
+        self.assertNotIn("nome", delta[self.linha.pk])
+
+        # registro de outro dia não muda o turno atual: nada é publicado
+        antigo = RegistroProducao.objects.create(linha=self.linha, data=date(2020, 1, 1), turno=turno)
+        central.retirar(assinante)
+        with self.captureOnCommitCallbacks(execute=True):
+            RegistroHora.objects.create(registro=antigo, hora_inicio=time(6), hora_fim=time(7), quantidade_produzida=5)
+        self.assertEqual(central.retirar(assinante), {})
+
+    def test_eventos_respeitam_setores_do_usuario(self):
+        self.client.force_login(self.operador)
+        resposta = self.client.get(reverse("painel-eventos"), {"setor": "Envase"})
+        self.assertEqual(resposta["Content-Type"], "text/event-stream")
+        self.assertIn("event: estado", resposta.content.decode())
+        self.assertIn("Envase 1", resposta.content.decode())
+
+        self.assertEqual(self.client.get(reverse("painel-eventos"), {"linha": self.outra.pk}).status_code, 403)
+        self.assertEqual(self.client.get(reverse("painel-ao-vivo"), {"setor": "Envase"}).status_code, 200)
+
+    def test_retrato_do_canal_fica_no_cache_ate_a_versao_mudar(self):
+        cache.clear()
+        data, turno, hora_inicio, hora_fim = hora_cheia(timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            registro = RegistroProducao.objects.create(linha=self.linha, data=data, turno=turno)
+        versao, atual = estados_do_canal("Envase")
+        self.assertEqual(atual[self.linha.pk]["registro"], registro.pk)
+
+        # outras conexões ao mesmo canal não consultam o banco
+        with self.assertNumQueries(0):
+            self.assertEqual(estados_do_canal("Envase"), (versao, atual))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RegistroHora.objects.create(
+                registro=registro, hora_inicio=hora_inicio, hora_fim=hora_fim, quantidade_produzida=40,
+            )
+        nova, atual = estados_do_canal("Envase")
+        self.assertNotEqual(nova, versao)
+        self.assertEqual(atual[self.linha.pk]["hora_produzida"], 40)
+
+    @override_settings(SGPI_AOVIVO_INTERVALO_VERSAO=0.01)
+    def test_gravacao_em_outro_worker_chega_pela_versao_do_setor(self):
+        cache.clear()
+        base = {"linha": self.linha.pk, "nome": "Envase 1", "setor": "Envase", "produzida": 0}
+        retratos = [{self.linha.pk: base}, {self.linha.pk: {**base, "produzida": 40}}]
+
+        async def cenario():
+            fluxo = _fluxo_ao_vivo(Assinante(asyncio.get_running_loop(), setor="Envase"))
+            try:
+                await anext(fluxo)
+                inicial = await anext(fluxo)
+                await anext(fluxo)  # o próprio retrato, primeira publicação na central
+                # outro processo gravou: aqui só a versão do setor no cache compartilhado muda
+                await sync_to_async(invalidar_setores)(["Envase"])
+                return inicial, await asyncio.wait_for(anext(fluxo), 5)
+            finally:
+                await fluxo.aclose()
+
+        with mock.patch("sgpi.painel.estados", side_effect=retratos):
+            inicial, delta = self.loop.run_until_complete(cenario())
+        self.assertTrue(inicial.startswith("event: estado"))
+        self.assertEqual(
+            delta, 'event: delta\ndata: [{"produzida": 40, "linha": %d}]\n\n' % self.linha.pk,
+        )
+
+
+class PerfilProducaoTests(TestCase):
+    def test_sqlite_com_wal_e_begin_immediate(self):
+        with tempfile.TemporaryDirectory() as diretorio:
+            conexoes = ConnectionHandler({"default": banco_sqlite(str(Path(diretorio) / "sgpi.sqlite3"))})
+            conexao = conexoes["default"]
+            try:
+                with conexao.cursor() as cursor:
+                    pragmas = {}
+                    for pragma in ("journal_mode", "synchronous", "busy_timeout", "temp_store", "foreign_keys"):
+                        cursor.execute(f"PRAGMA {pragma}")
+                        pragmas[pragma] = cursor.fetchone()[0]
+                self.assertEqual(pragmas, {
+                    "journal_mode": "wal", "synchronous": 1, "busy_timeout": SQLITE_BUSY_TIMEOUT,
+                    "temp_store": 2, "foreign_keys": 1,
+                })
+                self.assertEqual(conexao.transaction_mode, "IMMEDIATE")
+            finally:
+                conexoes.close_all()
+
+    def test_postgresql_pool_ou_conexao_persistente(self):
+        com_pool = banco_postgresql({"SGPI_DB_NAME": "fabrica", "SGPI_DB_POOL": "1", "SGPI_DB_POOL_MAX": "8"})
+        self.assertEqual(com_pool["NAME"], "fabrica")
+        self.assertEqual((com_pool["CONN_MAX_AGE"], com_pool["OPTIONS"]["pool"]["max_size"]), (0, 8))
+
+        sem_pool = banco_postgresql({"SGPI_DB_CONN_MAX_AGE": "300"})
+        self.assertEqual((sem_pool["CONN_MAX_AGE"], sem_pool["OPTIONS"]), (300, {}))
+
+
+    def test_variaveis_de_database_url(self):
+        self.assertEqual(variaveis_de_url("postgresql://sgpi:s%40nha@db:5433/fabrica"), {
+            "SGPI_DB_ENGINE": "postgresql", "SGPI_DB_NAME": "fabrica", "SGPI_DB_USER": "sgpi",
+            "SGPI_DB_PASSWORD": "s@nha", "SGPI_DB_HOST": "db", "SGPI_DB_PORT": "5433",
+        })
+
+
+@skipUnless(os.environ.get("DATABASE_URL"), "defina DATABASE_URL=postgresql://... para testar no PostgreSQL")
+class PostgreSQLTests(SimpleTestCase):
+    """
+    Contra um PostgreSQL de verdade (ex.: serviço do CI): as duas
+    configurações de conexão do perfil de produção e a suíte inteira com
+    project.settings_producao, que cobre o ON CONFLICT da importação, o
+    upsert da API e os demais SQLs escritos à mão.
+    """
+
+    def setUp(self):
+        self.variaveis = variaveis_de_url(os.environ["DATABASE_URL"])
+
+    def _conectar(self, **extras):
+        conexoes = ConnectionHandler({"default": banco_postgresql({**self.variaveis, **extras})})
+        self.addCleanup(conexoes.close_all)
+        conexao = conexoes["default"]
+        with conexao.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            self.assertEqual(cursor.fetchone(), (1,))
+        return conexao
+
+    def test_conexao_persistente_e_pool(self):
+        persistente = self._conectar(SGPI_DB_CONN_MAX_AGE="300")
+        self.assertIsNone(persistente.pool)
+        self.assertEqual(persistente.settings_dict["CONN_MAX_AGE"], 300)
+
+        com_pool = self._conectar(SGPI_DB_POOL="1", SGPI_DB_POOL_MIN="1", SGPI_DB_POOL_MAX="2")
+        self.addCleanup(com_pool.close_pool)
+        self.assertEqual((com_pool.pool.min_size, com_pool.pool.max_size), (1, 2))
+        com_pool.close()
+        # a conexão volta para o pool em vez de ser fechada
+        self.assertGreaterEqual(com_pool.pool.get_stats()["pool_available"], 1)
+
+    def test_suite_no_postgresql(self):
+        ambiente = {
+            **{nome: valor for nome, valor in os.environ.items() if nome != "DATABASE_URL"},
+            **self.variaveis,
+            "DJANGO_SETTINGS_MODULE": "project.settings_producao",
+            "DJANGO_SECRET_KEY": "teste-postgresql",
+            "SGPI_CACHE": "memoria",
+        }
+        execucao = subprocess.run(
+            [sys.executable, "manage.py", "test", "sgpi", "--noinput"],
+            cwd=settings.BASE_DIR, env=ambiente, capture_output=True, text=True, timeout=1800,
+        )
+        self.assertEqual(execucao.returncode, 0, execucao.stderr[-5000:])
+
+
+@override_settings(
+    MIDDLEWARE=[*settings.MIDDLEWARE, "sgpi.middleware.InstrumentacaoMiddleware"],
+    SGPI_ORCAMENTO_ESTRITO=True,
+)
+class InstrumentacaoTests(TestCase):
+    """Cada view principal dentro do orçamento de SGPI_ORCAMENTO_CONSULTAS, com dados de sobra."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@sgpi.local", "senha")
+        cls.operador = User.objects.create_user("operador", "op@sgpi.local", "senha")
+        PermissaoSetorUsuario.objects.create(usuario=cls.operador, setor="Envase")
+        cls.linha = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=500)
+        motivo = MotivoParada.objects.create(descricao="Falta de material")
+        cls.registros = criar_registros(cls.linha, 12, inicio=timezone.localdate() - timedelta(days=3))
+        for registro in cls.registros:
+            for h in range(6, 12):
+                RegistroHora.objects.create(
+                    registro=registro, hora_inicio=time(h), hora_fim=time(h + 1), quantidade_produzida=50,
+                )
+                Parada.objects.create(
+                    registro=registro, hora_inicio=time(h), hora_fim=time(h, 10), motivo_padrao=motivo,
+                )
+
+    def setUp(self):
+        medicoes.limpar()
+        self.addCleanup(medicoes.limpar)
+
+    def test_views_principais_dentro_do_orcamento(self):
+        registro = self.registros[0].pk
+        rotas = [
+            ("registros-lista", [], {}), ("registros-detalhes", [registro], {}),
+            ("registros-criar", [], {}), ("registros-editar", [registro], {}),
+            ("registros-formset-linha", ["parada"], {"indice": 1}),
+            ("registros-buscar", [], {"q": "envase"}), ("registros-exportar", [], {}),
+            ("painel", [], {}), ("relatorios-oee", [], {}), ("relatorios-pareto", [], {}),
+        ]
+        for usuario in (self.admin, self.operador):
+            self.client.force_login(usuario)
+            for rota, args, params in rotas:
+                with self.subTest(usuario=usuario.username, rota=rota):
+                    resposta = self.client.get(reverse(rota, args=args), params)
+                    self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(medicoes.resumo()["registros-editar"]["repetidas"], [])
+
+    def test_estouro_de_orcamento_e_resumo_para_superuser(self):
+        self.client.force_login(self.admin)
+        with override_settings(SGPI_ORCAMENTO_CONSULTAS={"registros-lista": 1}):
+            with self.assertLogs("sgpi.instrumentacao", "WARNING"), self.assertRaises(OrcamentoConsultasExcedido):
+                self.client.get(reverse("registros-lista"))
+
+        resumo = self.client.get(reverse("instrumentacao")).json()["rotas"]
+        self.assertEqual(resumo["registros-lista"]["requisicoes"], 1)
+        self.assertEqual(set(resumo["registros-lista"]["tempo_ms"]), {"p50", "p95", "p99", "max"})
+
+        self.client.force_login(self.operador)
+        self.assertEqual(self.client.get(reverse("instrumentacao")).status_code, 302)
+
+
+class GerarDadosTests(TestCase):
+    def test_gera_registros_detalhados_com_totais_coerentes_e_reproduziveis(self):
+        saida = io.StringIO()
+        opcoes = {"linhas": 2, "setores": 1, "registros": 24, "horas_dias": 2, "fim": "2025-03-10", "stdout": saida}
+        call_command("gerar_dados", **opcoes)
+
+        registros = RegistroProducao.objects.filter(linha__nome__startswith="Linha ")
+        self.assertEqual(registros.count(), 24)
+        detalhados = registros.filter(data__gte=date(2025, 3, 9))
+        self.assertEqual(RegistroHora.objects.filter(registro__in=detalhados).count(), 12 * 8)
+        self.assertFalse(RegistroHora.objects.exclude(registro__in=detalhados).exists())
+        for registro in detalhados:
+            horas = registro.registros_hora.aggregate(p=Sum("quantidade_produzida"), d=Sum("quantidade_defeituosa"))
+            paradas = registro.paradas.aggregate(t=Sum("duracao"))["t"] or 0
+            self.assertEqual(
+                (registro.quantidade_produzida, registro.quantidade_defeituosa, registro.tempo_parado),
+                (horas["p"], horas["d"], paradas),
+            )
+        # derivados: consolidados dos finalizados e índice de busca
+        self.assertTrue(ProducaoDiaria.objects.exists())
+        self.assertEqual(obter_backend().filtrar(RegistroProducao.objects.all(), "Linha 001").count(), 12)
+
+        totais = list(registros.order_by("data", "turno", "linha__nome").values_list("quantidade_produzida", flat=True))
+        call_command("gerar_dados", prefixo="Outra", **opcoes)
+        self.assertEqual(
+            list(
+                RegistroProducao.objects.filter(linha__nome__startswith="Outra ")
+                .order_by("data", "turno", "linha__nome").values_list("quantidade_produzida", flat=True)
+            ),
+            totais,
+        )
+
+
+    def test_gerar_registros_so_com_totais(self):
+        linhas = gerar_linhas(2, 2, seed=7, prefixo="Sint")
+        existente = RegistroProducao.objects.create(linha=linhas[0], data=date(2024, 1, 1), turno="1/especial")
+        fim = timezone.localdate()
+
+        inicio, ultimo = gerar_registros(linhas, 14, seed=7, fim=fim)
+
+        # 2 linhas x 3 turnos por dia: 14 registros ocupam 3 dias, o último incompleto
+        self.assertEqual((inicio, ultimo), (fim - timedelta(days=2), fim))
+        gerados = RegistroProducao.objects.exclude(pk=existente.pk)
+        self.assertEqual(gerados.count(), 14)
+        self.assertEqual(gerados.filter(data=fim).count(), 2)
+        self.assertEqual(gerados.filter(pk__gt=existente.pk).count(), 14)
+        self.assertFalse(RegistroHora.objects.exists() or Parada.objects.exists())
+        self.assertEqual(
+            set(gerados.values_list("data", "finalizada").distinct()),
+            {(inicio, True), (inicio + timedelta(days=1), False), (fim, False)},
+        )
+        # a sequência do id continua depois dos ids explícitos
+        RegistroProducao.objects.create(linha=linhas[1], data=date(2024, 1, 1), turno="1/especial")
+
+
+class IndicesTests(TestCase):
+    def test_indice_de_periodo_so_com_data_e_linha(self):
+        with connection.cursor() as cursor:
+            restricoes = connection.introspection.get_constraints(cursor, RegistroProducao._meta.db_table)
+        self.assertEqual(restricoes["registro_data_linha_idx"]["columns"], ["data", "linha_id"])
+        self.assertNotIn("registro_data_linha_cov_idx", restricoes)
+
+
+class ArquivoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@sgpi.local", "senha")
+        cls.linha = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=500)
+        motivo = MotivoParada.objects.create(descricao="Falta de material")
+        cls.antigos = criar_registros(cls.linha, 6, inicio=date(2024, 1, 30))
+        cls.recente = criar_registros(cls.linha, 1, inicio=timezone.localdate())[0]
+        for registro in cls.antigos:
+            RegistroHora.objects.create(
+                registro=registro, hora_inicio=time(6), hora_fim=time(7), quantidade_produzida=40,
+                quantidade_defeituosa=2,
+            )
+            Parada.objects.create(registro=registro, hora_inicio=time(6, 30), hora_fim=time(6, 45), motivo_padrao=motivo)
+        RegistroProducao.objects.filter(pk__in=[r.pk for r in cls.antigos]).finalizar()
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = override_settings(SGPI_ARQUIVO_CAMINHO=Path(diretorio.name) / "arquivo.sqlite3")
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.client.force_login(self.admin)
+
+    def test_arquiva_le_pelo_arquivo_e_restaura_ao_reabrir(self):
+        consolidado = list(ProducaoMensal.objects.values_list("mes", "quantidade_produzida"))
+        # 30/01 e 31/01 ficam em janeiro; só janeiro é arquivado
+        self.assertEqual(arquivo.arquivar(date(2024, 2, 15)), 6)
+        self.assertEqual(RegistroProducao.objects.count(), 1)
+        self.assertFalse(RegistroHora.objects.exists())
+        self.assertEqual(list(ProducaoMensal.objects.values_list("mes", "quantidade_produzida")), consolidado)
+
+        registro = self.antigos[0]
+        resposta = self.client.get(reverse("registros-detalhes", args=[registro.pk]))
+        self.assertContains(resposta, "(arquivado)")
+        self.assertContains(resposta, "Falta de material")
+        self.assertEqual(resposta.context["total_produzido"], 40)
+
+        exportado = b"".join(self.client.get(reverse("registros-exportar")).streaming_content).decode()
+        self.assertEqual(len(exportado.strip().splitlines()), 1 + 7)
+        filtrado = self.client.get(reverse("registros-exportar"), {"q": "envase", "detalhar": "paradas"})
+        self.assertEqual(len(b"".join(filtrado.streaming_content).decode().strip().splitlines()), 1 + 6)
+
+        form = RegistroProducaoForm(
+            {"linha": self.linha.pk, "data": registro.data, "turno": registro.turno}, user=self.admin,
+        )
+        self.assertFalse(form.is_valid())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("registros-reabrir", args=[registro.pk]))
+        registro_restaurado = RegistroProducao.objects.get(pk=registro.pk)
+        self.assertFalse(registro_restaurado.finalizada)
+        self.assertEqual(registro_restaurado.criado_em, registro.criado_em)
+        self.assertEqual(registro_restaurado.registros_hora.get().quantidade_produzida, 40)
+        self.assertEqual(registro_restaurado.paradas.get().duracao, 15)
+        self.assertIsNone(arquivo.obter(registro.pk))
+        # reabrir tirou o registro do consolidado de janeiro
+        self.assertEqual(ProducaoMensal.objects.get(mes=date(2024, 1, 1)).registros, 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("restaurar_arquivo", de="2024-01-01", ate="2024-01-31", stdout=io.StringIO())
+        self.assertEqual(RegistroProducao.objects.count(), 7)
+        self.assertEqual(RegistroHora.objects.count(), 6)
+
+
+    def test_restaura_paradas_de_motivo_excluido_depois_do_arquivamento(self):
+        arquivo.arquivar(date(2024, 2, 15))
+        MotivoParada.objects.get(descricao="Falta de material").delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(arquivo.restaurar(de=date(2024, 1, 1), ate=date(2024, 1, 31)), 6)
+        self.assertEqual(
+            set(Parada.objects.values_list("motivo_padrao", "motivo")), {(None, "Falta de material")},
+        )
+
+    def test_chave_arquivada_nao_e_recriada_nem_restaurada_por_cima(self):
+        arquivo.arquivar(date(2024, 2, 15))
+        registro = self.antigos[0]
+        chave = (self.linha.pk, registro.data, registro.turno)
+
+        resultado = importar_registros_hora([{
+            "linha": self.linha.nome, "data": registro.data.isoformat(), "turno": registro.turno,
+            "hora_inicio": "07:00", "hora_fim": "08:00", "quantidade_produzida": "10",
+        }])
+        self.assertEqual((resultado.inseridas, resultado.total_erros), (0, 1))
+        self.assertIn("arquivado", resultado.erros[0][1])
+        with self.assertRaises(RegistroArquivado):
+            gravar_apontamento(self.linha, registro.data, registro.turno, [])
+        with self.assertLogs("sgpi.ingestao", "WARNING"):
+            self.assertEqual(gravar_contadores({(*chave, time(7)): [time(8), 10, 0]}), (0, 1))
+        self.assertFalse(RegistroProducao.objects.filter(data=registro.data, turno=registro.turno).exists())
+
+        # criado por fora (ex.: antes desta verificação existir): reabrir não pode dar 500
+        RegistroProducao.objects.create(linha=self.linha, data=registro.data, turno=registro.turno)
+        resposta = self.client.post(reverse("registros-reabrir", args=[registro.pk]))
+        self.assertRedirects(resposta, reverse("registros-detalhes", args=[registro.pk]), fetch_redirect_response=False)
+        self.assertIsNotNone(arquivo.obter(registro.pk))
+        with self.assertRaises(CommandError):
+            call_command("restaurar_arquivo", registro=[registro.pk], stdout=io.StringIO())
+
+
+class LinhasFormsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@sgpi.local", "senha")
+        MotivoParada.objects.create(descricao="Falta de material")
+
+    def test_fragmento_da_linha_nova(self):
+        self.client.force_login(self.admin)
+        url = reverse("registros-formset-linha", args=["parada"])
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url, {"indice": 5})
+        self.assertEqual(resposta.status_code, 200)
+        # sessão, usuário e motivos; nada de linhas/setores
+        self.assertLessEqual(len(consultas), 3)
+        self.assertContains(resposta, 'name="parada-5-hora_inicio"')
+        self.assertContains(resposta, 'value="parada-5"')
+        self.assertContains(resposta, "Falta de material")
+        self.assertNotContains(resposta, "<form")
+
+        self.assertContains(self.client.get(reverse("registros-formset-linha", args=["hora"]), {"indice": 0}),
+                            'name="hora-0-quantidade_produzida"')
+        self.assertEqual(self.client.get(url, {"indice": "x"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("registros-formset-linha", args=["perm"]), {"indice": 0}).status_code, 404)
+
+    def test_remover_linha_sem_js_renumera_as_seguintes(self):
+        self.client.force_login(self.admin)
+        dados = {"hora-TOTAL_FORMS": "3", "hora-INITIAL_FORMS": "0", "rem_hora": "hora-1"}
+        for i in range(3):
+            dados[f"hora-{i}-quantidade_produzida"] = str(10 * (i + 1))
+            dados[f"hora-{i}-hora_inicio"] = f"0{6 + i}:00"
+        resposta = self.client.post(reverse("registros-criar"), dados)
+        formset = resposta.context["formset_hora"]
+        self.assertEqual(formset.total_form_count(), 2)
+        self.assertEqual([f["quantidade_produzida"].value() for f in formset], ["10", "30"])
+        self.assertEqual(formset.forms[1]["hora_inicio"].value(), "08:00")
+
+
+class DetalheCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@sgpi.local", "senha")
+        linha = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=500)
+        cls.registro = criar_registros(linha, 1)[0]
+        for h in range(6, 10):
+            RegistroHora.objects.create(
+                registro=cls.registro, hora_inicio=time(h), hora_fim=time(h + 1), quantidade_produzida=25,
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client.force_login(self.admin)
+        self.url = reverse("registros-detalhes", args=[self.registro.pk])
+
+    def test_get_condicional_e_fragmento_dos_finalizados(self):
+        resposta = self.client.get(self.url)
+        self.assertEqual(resposta["Cache-Control"], "private, no-cache")
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=resposta["ETag"]).status_code, 304)
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=resposta["Last-Modified"]).status_code, 304,
+        )
+        # aberto: nada no cache
+        self.assertIsNone(cache.get(self.registro.chave_cache_detalhe()))
+
+        self.registro.finalizar()
+        finalizado = self.client.get(self.url)
+        self.assertNotEqual(finalizado["ETag"], resposta["ETag"])
+        self.assertContains(finalizado, "Finalizado")
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertContains(self.client.get(self.url), "<td>25</td>", count=4)
+        self.assertFalse([q for q in consultas if "sgpi_registrohora" in q["sql"] or "sgpi_parada" in q["sql"]])
+
+        RegistroProducao.objects.filter(pk=self.registro.pk).reabrir()
+        self.assertIsNone(cache.get(self.registro.chave_cache_detalhe()))
+        reaberto = self.client.get(self.url, HTTP_IF_NONE_MATCH=finalizado["ETag"])
+        self.assertEqual(reaberto.status_code, 200)
+        self.assertContains(reaberto, "Pendente")
+
+
+    @override_settings(SGPI_TOTAIS_INCREMENTAIS=True)
+    def test_editar_so_o_horario_de_um_filho_muda_a_versao(self):
+        antes = self.client.get(self.url)["ETag"]
+        hora = RegistroHora.objects.get(registro=self.registro, hora_inicio=time(9))
+        hora.hora_fim = time(9, 45)
+        hora.save()
+        depois = self.client.get(self.url, HTTP_IF_NONE_MATCH=antes)
+        self.assertEqual(depois.status_code, 200)
+        self.assertNotEqual(depois["ETag"], antes)
+
+        parada = Parada.objects.create(registro=self.registro, hora_inicio=time(7), hora_fim=time(7, 10), motivo="Setup")
+        antes = self.client.get(self.url)["ETag"]
+        parada.motivo = "Falta de material"
+        parada.save()
+        depois = self.client.get(self.url, HTTP_IF_NONE_MATCH=antes)
+        self.assertEqual(depois.status_code, 200)
+        self.assertContains(depois, "Falta de material")
+
+
+class IntervalosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.linha = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=500)
+        cls.registro = RegistroProducao.objects.create(linha=cls.linha, data=date(2025, 6, 2), turno="3/especial")
+
+    def _formsets(self, horas, paradas):
+        dados = {
+            "hora-TOTAL_FORMS": str(len(horas)), "hora-INITIAL_FORMS": "0",
+            "parada-TOTAL_FORMS": str(len(paradas)), "parada-INITIAL_FORMS": "0",
+        }
+        for i, (inicio, fim) in enumerate(horas):
+            dados.update({f"hora-{i}-hora_inicio": inicio, f"hora-{i}-hora_fim": fim,
+                          f"hora-{i}-quantidade_produzida": "10", f"hora-{i}-quantidade_defeituosa": "0"})
+        for i, (inicio, fim) in enumerate(paradas):
+            dados.update({f"parada-{i}-hora_inicio": inicio, f"parada-{i}-hora_fim": fim})
+        formset_hora = RegistroHoraFormSet(dados, instance=self.registro, prefix="hora")
+        formset_parada = ParadaFormSet(dados, instance=self.registro, prefix="parada", formset_hora=formset_hora)
+        return formset_hora, formset_parada
+
+    def test_varredura_no_turno_que_atravessa_a_meia_noite(self):
+        linha_do_tempo = intervalos.normalizar([
+            (time(1, 0), time(2, 0), "c"), (time(22, 0), time(23, 0), "a"),
+            (time(23, 30), time(0, 30), "b"), (time(0, 15), time(0, 45), "d"),
+        ], "3/especial")
+        self.assertEqual([(i.inicio, i.fim) for i in linha_do_tempo], [(0, 60), (90, 150), (135, 165), (180, 240)])
+        varredura = intervalos.varrer(linha_do_tempo)
+        self.assertEqual([(a.item, b.item) for a, b in varredura.sobreposicoes], [("b", "d")])
+        self.assertEqual(varredura.buracos, [(60, 90), (165, 180)])
+        self.assertEqual(varredura.cobertos, 60 + 75 + 60)
+        self.assertEqual(intervalos.hora(165, "3/especial"), time(0, 45))
+        self.assertEqual(intervalos.duracao(time(23, 50), time(0, 10)), 20)
+
+        # 05:30-06:30 passa do início do turno das 06:00 e esbarra na primeira hora
+        varredura = intervalos.varrer(intervalos.normalizar(
+            [(time(6, 0), time(7, 0), "a"), (time(5, 30), time(6, 30), "b")], "1/especial"
+        ))
+        self.assertEqual({(a.item, b.item) for a, b in varredura.sobreposicoes}, {("b", "a")})
+
+    def test_formsets_rejeitam_sobreposicao_e_parada_fora_das_horas(self):
+        formset_hora, formset_parada = self._formsets(
+            [("22:00", "23:00"), ("23:00", "00:00"), ("00:00", "01:00")],
+            [("22:50", "23:10"), ("23:55", "00:05")],
+        )
+        self.assertTrue(formset_hora.is_valid() and formset_parada.is_valid())
+
+        formset_hora, formset_parada = self._formsets(
+            [("22:00", "23:00"), ("22:30", "23:30")],
+            [("22:10", "22:20"), ("22:15", "22:40"), ("01:00", "01:10")],
+        )
+        self.assertFalse(formset_hora.is_valid())
+        self.assertEqual(formset_hora.non_form_errors(), ["Horas sobrepostas: 22:00–23:00 e 22:30–23:30."])
+        self.assertFalse(formset_parada.is_valid())
+        self.assertEqual(formset_parada.non_form_errors(), [
+            "Paradas sobrepostas: 22:10–22:20 e 22:15–22:40.",
+            "A parada 01:00–01:10 está fora das horas apontadas.",
+        ])
+
+        # só paradas, sem horas: nada para conferir além das sobreposições
+        _, formset_parada = self._formsets([], [("01:00", "01:10")])
+        self.assertTrue(formset_parada.is_valid())
+
+    def test_importacao_rejeita_hora_sobreposta(self):
+        RegistroHora.objects.create(registro=self.registro, hora_inicio=time(22, 0), hora_fim=time(23, 0))
+        arquivo = (
+            "linha;data;turno;hora_inicio;hora_fim;quantidade_produzida;quantidade_defeituosa\n"
+            "Envase 1;2025-06-02;3;22:30;23:30;50;0\n"
+            "Envase 1;2025-06-02;3;23:00;00:00;40;0\n"
+            "Envase 1;2025-06-02;3;23:15;23:45;30;0\n"
+            "Envase 1;2025-06-02;3;22:00;23:00;90;0\n"
+        )
+        resultado = importar_registros_hora(ler_csv(io.StringIO(arquivo)))
+        self.assertEqual((resultado.inseridas, resultado.total_erros), (2, 2))
+        self.assertEqual([e[:2] for e in resultado.erros], [
+            (2, "Hora 22:30–23:30 sobreposta a 22:00–23:00 no mesmo registro."),
+            (4, "Hora 23:15–23:45 sobreposta a 23:00–00:00 no mesmo registro."),
+        ])
+        self.registro.refresh_from_db()
+        self.assertEqual(self.registro.quantidade_produzida, 130)
+
+
+@skipUnless(find_spec("numpy"), "sgpi.analitico requer numpy")
+class AnaliticoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.linha_a = LinhaProducao.objects.create(nome="Envase 1", setor="Envase", capacidade_nominal=100)
+        cls.linha_b = LinhaProducao.objects.create(nome="Envase 2", setor="Envase", capacidade_nominal=200)
+        horas = [
+            (cls.linha_a, date(2025, 6, 1), "1/especial", time(6), time(7), 50, 5),
+            (cls.linha_a, date(2025, 6, 1), "1/especial", time(7), time(8), 100, 0),
+            (cls.linha_a, date(2025, 6, 2), "3/especial", time(23), time(0), 80, 8),
+            (cls.linha_b, date(2025, 6, 2), "2/especial", time(14), time(15), 200, 20),
+        ]
+        for linha, data, turno, inicio, fim, produzida, defeituosa in horas:
+            registro, _ = RegistroProducao.objects.get_or_create(linha=linha, data=data, turno=turno)
+            RegistroHora.objects.create(
+                registro=registro, hora_inicio=inicio, hora_fim=fim,
+                quantidade_produzida=produzida, quantidade_defeituosa=defeituosa,
+            )
+        Parada.objects.create(registro=RegistroProducao.objects.get(linha=cls.linha_a, turno="3/especial"),
+                              hora_inicio=time(23, 10), hora_fim=time(23, 20))
+
+    def test_throughput_defeitos_moveis_percentis_e_turnos(self):
+        relatorio = analitico.relatorio(date(2025, 6, 1), date(2025, 6, 2), janela=2, dias_lote=1)
+        linha_a, linha_b = relatorio.por_linha()
+        self.assertEqual(
+            (linha_a["produzido"], linha_a["defeituoso"], linha_a["horas"], linha_a["parado_min"]),
+            (230, 13, 3.0, 10),
+        )
+        self.assertAlmostEqual(linha_a["aproveitamento_pct"], 100 * 230 / 300)
+        self.assertEqual(linha_a["percentis_aproveitamento"], {50: 80.5, 90: 100.5, 95: 100.5})
+        self.assertEqual(linha_b["percentis_aproveitamento"][50], 100.5)
+
+        self.assertAlmostEqual(relatorio.taxa_defeitos_movel[0, 0], 100 * 5 / 150)
+        self.assertAlmostEqual(relatorio.taxa_defeitos_movel[0, 1], 100 * 13 / 230)
+        self.assertTrue(relatorio.np.isnan(relatorio.taxa_defeitos_movel[1, 0]))
+        self.assertAlmostEqual(relatorio.taxa_defeitos_movel_geral[1], 100 * 33 / 430)
+
+        turnos = {t["turno"]: t for t in relatorio.por_turno()}
+        self.assertEqual(
+            [(turnos[t]["produzido"], turnos[t]["parado_min"]) for t in ("1/especial", "2/especial", "3/especial")],
+            [(150, 0), (200, 0), (80, 10)],
+        )
+        self.assertAlmostEqual(turnos["3/especial"]["taxa_defeitos_pct"], 10.0)
+
+        # uma fatia só ou uma por dia: mesmo resultado; filtro por linha
+        self.assertEqual(analitico.relatorio(date(2025, 6, 1), date(2025, 6, 2), janela=2).por_linha(),
+                         relatorio.por_linha())
+        so_b = analitico.relatorio(date(2025, 6, 1), date(2025, 6, 2), linhas=[self.linha_b])
+        self.assertEqual([l["produzido"] for l in so_b.por_linha()], [200])
@@ -0,0 +1,67 @@
+# sgpi/turnos.py
+"""
+Horário dos turnos.
+
+``SGPI_TURNOS_HORARIO`` mapeia cada turno para (início, fim) em "HH:MM".
+Um turno que termina antes de começar (ex.: 22:00-06:00) atravessa a
+meia-noite e pertence à data em que começou.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+HORARIO_PADRAO = {
+    "1/especial": ("06:00", "14:00"),
+    "2/especial": ("14:00", "22:00"),
+    "3/especial": ("22:00", "06:00"),
+}
+
+
+def horario():
+    """turno -> (time início, time fim)."""
+    configurado = getattr(settings, "SGPI_TURNOS_HORARIO", HORARIO_PADRAO)
+    return {
+        turno: (time.fromisoformat(inicio), time.fromisoformat(fim))
+        for turno, (inicio, fim) in configurado.items()
+    }
+
+
+def contem(inicio, fim, hora):
+    """``hora`` está em [inicio, fim), com fim antes de inicio = atravessa a meia-noite."""
+    if inicio < fim:
+        return inicio <= hora < fim
+    return hora >= inicio or hora < fim
+
+
+def turno_do_momento(momento):
+    """
+    (data do registro, turno) a que ``momento`` pertence, no fuso local.
+    Depois da meia-noite, num turno que começou na véspera, a data é a
+    da véspera. None se nenhum turno cobrir o horário.
+    """
+    local = timezone.localtime(momento) if timezone.is_aware(momento) else momento
+    hora = local.time()
+    for turno, (inicio, fim) in horario().items():
+        if contem(inicio, fim, hora):
+            data = local.date()
+            if inicio > fim and hora < fim:
+                data -= timedelta(days=1)
+            return data, turno
+    return None
+
+
+def inicio_do_turno(data, turno):
+    """datetime (ingênuo, hora local) em que o turno da ``data`` começa."""
+    inicio, _ = horario().get(turno, (time(0), time(0)))
+    return datetime.combine(data, inicio)
+
+
+def hora_cheia(momento):
+    """(data do registro, turno, hora_inicio, hora_fim) da hora de ``momento``; None fora de turno."""
+    chave = turno_do_momento(momento)
+    if chave is None:
+        return None
+    local = timezone.localtime(momento) if timezone.is_aware(momento) else momento
+    inicio = local.replace(minute=0, second=0, microsecond=0)
+    return (*chave, inicio.time(), (inicio + timedelta(hours=1)).time())
@@ -17,10 +17,28 @@ urlpatterns = [
     path("registros/<int:pk>/", views.RegistroProducaoDetailView.as_view(), name="registros-detalhes"),
     path('registros/novo/', views.criar_registro, name='registros-criar'),
     path('registros/<int:pk>/editar/', views.editar_registro, name='registros-editar'),
+    path("registros/formset/<str:prefixo>/linha/", views.linha_formset, name="registros-formset-linha"),
+    path("registros/exportar/", views.exportar_registros, name="registros-exportar"),
+    path("registros/buscar/", views.buscar_registros, name="registros-buscar"),
+    path("registros/importar/", views.importar_producao, name="registros-importar"),
+    path("registros/importar/erros/<str:token>/", views.importar_producao_erros, name="registros-importar-erros"),
     # finalizar/reabrir
     path("registros/<int:pk>/finalizar/", views.registro_finalizar, name="registros-finalizar"),
     path("registros/<int:pk>/reabrir/", views.registro_reabrir, name="registros-reabrir"),
 
+    # API dos terminais de linha
+    path("api/apontamentos/", views.api_apontamento, name="api-apontamento"),
+    # contadores das máquinas (ASGI)
+    path("ingestao/contadores/", views.ingerir_contadores, name="ingestao-contadores"),
+
+    # painel e relatórios
+    path("painel/", views.painel, name="painel"),
+    path("painel/ao-vivo/", views.painel_ao_vivo, name="painel-ao-vivo"),
+    path("painel/ao-vivo/eventos/", views.painel_eventos, name="painel-eventos"),
+    path("relatorios/oee/", views.relatorio_oee, name="relatorios-oee"),
+    path("relatorios/pareto/", views.relatorio_pareto, name="relatorios-pareto"),
+    path("instrumentacao/", views.instrumentacao, name="instrumentacao"),
+
 
     # ----------------------------
     # Auth (login/logout)
@@ -1,15 +1,55 @@
 # app/views.py
+import asyncio
+import csv
+import hashlib
+import hmac
+import io
+import json
+import re
+import zipfile
+
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.paginator import Paginator
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, QueryDict, StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from .forms import PermissaoSetorUsuarioFormSet
 
-from .models import LinhaProducao, RegistroProducao, PermissaoSetorUsuario
+from .models import LinhaProducao, Parada, RegistroProducao
+from . import aovivo, arquivo, exportacao, ingestao, intervalos
+from .apontamento import RegistroArquivado, RegistroFinalizado, gravar_apontamento
+from .busca import obter_backend
+from .importacao import guardar_relatorio, importar_registros_hora, ler_csv, ler_relatorio, ler_xlsx
+from .middleware import medicoes
+from .oee import calcular_oee
+from .pareto import calcular_pareto
+from .paginacao import PaginadorKeyset
+from .painel import estados_do_canal, fragmentos_setores, versao_setor
+from .permissoes import setores_permitidos
+from .turnos import hora_cheia
 from .forms import (
+    ApontamentoForm,
+    HoraApontamentoForm,
+    FiltroOEEForm,
+    FiltroParetoForm,
+    ImportacaoProducaoForm,
     RegistroProducaoForm,
     RegistroHoraFormSet,
     ParadaFormSet,
@@ -37,46 +77,34 @@ def _increment_total_forms(post_data, prefix: str):
 
 
 def _remove_formset_row(post_data, prefix: str, pressed_value: str):
-    data = post_data.copy()  
     try:
         idx = int(pressed_value.split("-")[1])
     except Exception:
-        return data
+        return post_data.copy()
 
-    total = int(data.get(f"{prefix}-TOTAL_FORMS", "0"))
-    initial = int(data.get(f"{prefix}-INITIAL_FORMS", "0"))
+    total = int(post_data.get(f"{prefix}-TOTAL_FORMS", "0"))
+    initial = int(post_data.get(f"{prefix}-INITIAL_FORMS", "0"))
 
     if idx >= total:
-        return data 
+        return post_data.copy()
 
     if idx < initial:
-       
+        data = post_data.copy()
         data.setlist(f"{prefix}-{idx}-DELETE", ["on"])
         return data
 
-   
-    for i in range(idx + 1, total):
-        old_prefix = f"{prefix}-{i}-"
-        new_prefix = f"{prefix}-{i-1}-"
-
-        keys_i = [k for k in data.keys() if k.startswith(old_prefix)]
-        for key in keys_i:
-            vals = data.getlist(key)
-            new_key = key.replace(old_prefix, new_prefix, 1)
-            data.setlist(new_key, vals)
-            try:
-                del data[key]
-            except KeyError:
-                pass
-
-    
-    last = total - 1
-    last_prefix = f"{prefix}-{last}-"
-    for k in [k for k in list(data.keys()) if k.startswith(last_prefix)]:
-        try:
-            del data[k]
-        except KeyError:
-            pass
+    # uma passada pelas chaves: some a linha idx e as seguintes descem uma posição
+    padrao = re.compile(rf"{re.escape(prefix)}-(\d+)-(.*)")
+    data = QueryDict(mutable=True)
+    for key, vals in post_data.lists():
+        m = padrao.fullmatch(key)
+        if m:
+            i = int(m.group(1))
+            if i == idx:
+                continue
+            if i > idx:
+                key = f"{prefix}-{i - 1}-{m.group(2)}"
+        data.setlist(key, vals)
 
     data[f"{prefix}-TOTAL_FORMS"] = str(total - 1)
     return data
@@ -116,6 +144,21 @@ class LinhaProducaoDeleteView(DeleteView):
 # Registros de Produção
 # =========================
 
+def _restringir_setores(qs, user, campo="linha__setor"):
+    if user.is_authenticated and not user.is_superuser:
+        setores = setores_permitidos(user)
+        qs = qs.filter(**{f"{campo}__in": setores}) if setores else qs.none()
+    return qs
+
+
+def _filtrar_registros(qs, request):
+    """Busca ``q`` + restrição pelos setores permitidos ao usuário."""
+    q = request.GET.get("q")
+    if q:
+        qs = obter_backend().filtrar(qs, q)
+    return _restringir_setores(qs, request.user)
+
+
 class RegistroProducaoListView(ListView):
     model = RegistroProducao
     template_name = "registros/lista.html"
@@ -124,61 +167,110 @@ class RegistroProducaoListView(ListView):
     paginate_by = 20
 
     def get_queryset(self):
-        qs = super().get_queryset()
-
-       
-        q = self.request.GET.get("q")
-        if q:
-            qs = qs.filter(linha__nome__icontains=q)
-
-       
-        user = self.request.user
-        if user.is_authenticated and not user.is_superuser:
-            setores = list(
-                PermissaoSetorUsuario.objects
-                .filter(usuario=user)
-                .values_list("setor", flat=True)
-            )
-            
-            qs = qs.filter(linha__setor__in=setores) if setores else qs.none()
-
-        return qs
+        # totais já ficam gravados no registro; só a linha precisa vir junto
+        qs = super().get_queryset().select_related("linha")
+        return _filtrar_registros(qs, self.request)
+
+    def paginate_queryset(self, queryset, page_size):
+        # keyset em (data, turno, id): sem COUNT(*) nem OFFSET; o total só com ?contar=1
+        paginador = PaginadorKeyset(
+            queryset, [*self.get_ordering(), "pk"], page_size,
+            contar=self.request.GET.get("contar") == "1",
+        )
+        pagina = paginador.pagina(self.request.GET.get("cursor"))
+        return paginador, pagina, pagina.object_list, pagina.tem_proxima or pagina.tem_anterior
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        registros = context.get("registros") or []
-        iterable = getattr(registros, "object_list", registros)
-
-        for registro in iterable:
-            try:
-                hora_qs = registro.registros_hora.all()
-            except Exception:
-                hora_qs = []
-            total_prod = sum(getattr(h, "quantidade_produzida", 0) or 0 for h in hora_qs)
-            total_def = sum(getattr(h, "quantidade_defeituosa", 0) or 0 for h in hora_qs)
-            setattr(registro, "total_produzido", total_prod)
-            setattr(registro, "total_defeituoso", total_def)
-
         context["q"] = self.request.GET.get("q", "")
         return context
     
 
 
+TEMPO_CACHE_DETALHE = getattr(settings, "SGPI_CACHE_DETALHE_SEGUNDOS", 24 * 60 * 60)
+
+
+def _versao_registro(request, pk):
+    # lida uma vez por requisição (ETag e Last-Modified)
+    if not hasattr(request, "_versao_registro"):
+        request._versao_registro = (
+            RegistroProducao.objects.filter(pk=pk)
+            .values_list("atualizado_em", "finalizada_em", "linha__nome").first()
+        )
+    return request._versao_registro
+
+
+def _etag_registro(request, pk):
+    versao = _versao_registro(request, pk)
+    if versao is None:
+        return None
+    # a página tem o nome do usuário no topo
+    return hashlib.sha1(repr((pk, request.user.pk, *versao)).encode()).hexdigest()[:20]
+
+
+def _modificacao_registro(request, pk):
+    versao = _versao_registro(request, pk)
+    return max(m for m in versao[:2] if m) if versao else None
+
+
+@method_decorator(condition(etag_func=_etag_registro, last_modified_func=_modificacao_registro), name="get")
 class RegistroProducaoDetailView(DetailView):
+    """
+    GET condicional pela versão do registro (atualizado_em, finalizada_em e
+    nome da linha) e, para finalizados, o miolo da página pronto no cache:
+    não muda até o registro ser reaberto (``reabrir`` apaga a chave).
+    """
     model = RegistroProducao
     template_name = "registros/detalhes.html"
     context_object_name = "registro"
+    queryset = RegistroProducao.objects.select_related("linha")
+
+    def get_object(self, queryset=None):
+        try:
+            return super().get_object(queryset)
+        except Http404:
+            # registro antigo já movido para o arquivo frio
+            registro = arquivo.obter(self.kwargs["pk"])
+            if registro is None:
+                raise
+            return registro
+
+    def get(self, request, *args, **kwargs):
+        response = super().get(request, *args, **kwargs)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         registro = self.object
 
-        producao_hora = registro.registros_hora.all()
-        paradas = registro.paradas.all()
+        em_cache = registro.finalizada and not registro.arquivado
+        if em_cache:
+            versao = (registro.atualizado_em, registro.finalizada_em, registro.linha.nome)
+            guardado = cache.get(registro.chave_cache_detalhe())
+            if guardado and guardado[0] == versao:
+                context["fragmento"] = guardado[1]
+                return context
+
+        if registro.arquivado:
+            producao_hora, paradas = registro.horas_arquivadas, registro.paradas_arquivadas
+        else:
+            producao_hora = registro.registros_hora.all()
+            paradas = registro.paradas.select_related("motivo_padrao")
 
         total_produzido = sum((h.quantidade_produzida or 0) for h in producao_hora)
         total_defeituoso = sum((h.quantidade_defeituosa or 0) for h in producao_hora)
-        tempo_parado_total = sum((p.duracao or 0) for p in paradas)  # minutos
+        # minutos cobertos: paradas sobrepostas (gravadas antes da validação) contam uma vez
+        tempo_parado_total = intervalos.varrer(intervalos.normalizar(
+            ((p.hora_inicio, p.hora_fim, p) for p in paradas), registro.turno
+        )).cobertos
+        horas = intervalos.varrer(intervalos.normalizar(
+            ((h.hora_inicio, h.hora_fim, h) for h in producao_hora), registro.turno
+        ))
+        horas_sem_apontamento = [
+            intervalos.rotulo(intervalos.hora(inicio, registro.turno), intervalos.hora(fim, registro.turno))
+            for inicio, fim in horas.buracos
+        ]
         motivos_paradas = [p.motivo for p in paradas if (p.motivo or "").strip()]
 
         context.update({
@@ -187,8 +279,12 @@ class RegistroProducaoDetailView(DetailView):
             "total_produzido": total_produzido,
             "total_defeituoso": total_defeituoso,
             "tempo_parado_total": tempo_parado_total,
+            "horas_sem_apontamento": horas_sem_apontamento,
             "motivos_paradas": motivos_paradas,
         })
+        if em_cache:
+            context["fragmento"] = render_to_string("registros/_detalhe.html", context, self.request)
+            cache.set(registro.chave_cache_detalhe(), (versao, context["fragmento"]), TEMPO_CACHE_DETALHE)
         return context
 
 
@@ -211,19 +307,21 @@ def criar_registro(request):
         if "salvar" in post_data:
             form = RegistroProducaoForm(post_data, user=request.user)
             if form.is_valid():
-                registro = form.save()
-
-                formset_hora = RegistroHoraFormSet(post_data, instance=registro, prefix="hora")
-                formset_parada = ParadaFormSet(post_data, instance=registro, prefix="parada")
+                # os totais são recalculados uma única vez, no commit (sgpi/recalculo.py)
+                with transaction.atomic():
+                    registro = form.save()
 
-                if formset_hora.is_valid() and formset_parada.is_valid():
-                    formset_hora.save()
-                    formset_parada.save()
+                    formset_hora = RegistroHoraFormSet(post_data, instance=registro, prefix="hora")
+                    formset_parada = ParadaFormSet(
+                        post_data, instance=registro, prefix="parada", formset_hora=formset_hora
+                    )
 
-                    registro.quantidade_produzida = sum(h.quantidade_produzida for h in registro.registros_hora.all())
-                    registro.quantidade_defeituosa = sum(h.quantidade_defeituosa for h in registro.registros_hora.all())
-                    registro.save(update_fields=["quantidade_produzida", "quantidade_defeituosa"])
+                    valido = formset_hora.is_valid() and formset_parada.is_valid()
+                    if valido:
+                        formset_hora.save()
+                        formset_parada.save()
 
+                if valido:
                     messages.success(request, "Registro criado com sucesso.")
                     return redirect("registros-detalhes", pk=registro.pk)
 
@@ -269,6 +367,10 @@ def criar_registro(request):
 @login_required
 def editar_registro(request, pk):
     registro = get_object_or_404(RegistroProducao, pk=pk)
+    if registro.finalizada:
+        # os consolidados guardam os totais da finalização; editar agora os deixaria errados
+        messages.error(request, "Registro finalizado — reabra o registro antes de editar.")
+        return redirect("registros-detalhes", pk=registro.pk)
 
     if request.method == "POST":
         post_data = request.POST
@@ -287,19 +389,21 @@ def editar_registro(request, pk):
         if "salvar" in post_data:
             form = RegistroProducaoForm(post_data, instance=registro, user=request.user)
             if form.is_valid():
-                registro = form.save()
-
-                formset_hora = RegistroHoraFormSet(post_data, instance=registro, prefix="hora")
-                formset_parada = ParadaFormSet(post_data, instance=registro, prefix="parada")
+                # os totais são recalculados uma única vez, no commit (sgpi/recalculo.py)
+                with transaction.atomic():
+                    registro = form.save()
 
-                if formset_hora.is_valid() and formset_parada.is_valid():
-                    formset_hora.save()
-                    formset_parada.save()
+                    formset_hora = RegistroHoraFormSet(post_data, instance=registro, prefix="hora")
+                    formset_parada = ParadaFormSet(
+                        post_data, instance=registro, prefix="parada", formset_hora=formset_hora
+                    )
 
-                    registro.quantidade_produzida = sum(h.quantidade_produzida for h in registro.registros_hora.all())
-                    registro.quantidade_defeituosa = sum(h.quantidade_defeituosa for h in registro.registros_hora.all())
-                    registro.save(update_fields=["quantidade_produzida", "quantidade_defeituosa"])
+                    valido = formset_hora.is_valid() and formset_parada.is_valid()
+                    if valido:
+                        formset_hora.save()
+                        formset_parada.save()
 
+                if valido:
                     messages.success(request, "Registro atualizado com sucesso.")
                     return redirect("registros-detalhes", pk=registro.pk)
 
@@ -342,6 +446,247 @@ def editar_registro(request, pk):
     })
 
 
+# fragmento de uma linha nova: formset, template e nome do form no template
+_LINHAS_FORMSET = {
+    "hora": (RegistroHoraFormSet, "registros/_linha_hora.html", "form_hora"),
+    "parada": (ParadaFormSet, "registros/_linha_parada.html", "form_parada"),
+}
+
+
+@login_required
+def linha_formset(request, prefixo):
+    """
+    Só a linha ``indice`` do formset de horas/paradas (formsets.js), para
+    adicionar sem reenviar e renderizar o formulário inteiro.
+    """
+    if prefixo not in _LINHAS_FORMSET:
+        raise Http404
+    try:
+        indice = int(request.GET.get("indice", ""))
+    except ValueError:
+        return HttpResponseBadRequest("Índice inválido.")
+    if indice < 0:
+        return HttpResponseBadRequest("Índice inválido.")
+
+    formset_class, template, nome = _LINHAS_FORMSET[prefixo]
+    form = formset_class(prefix=prefixo).empty_form
+    form.prefix = f"{prefixo}-{indice}"
+    return render(request, template, {nome: form})
+
+
+@login_required
+def exportar_registros(request):
+    formato = request.GET.get("formato", "csv")
+    detalhar = request.GET.get("detalhar", "")
+    if formato not in exportacao.FORMATOS or detalhar not in exportacao.DETALHAMENTOS:
+        return HttpResponseBadRequest("Parâmetros de exportação inválidos.")
+
+    registros = _filtrar_registros(RegistroProducao.objects.all(), request)
+    # os registros do arquivo frio saem depois dos quentes, com os mesmos filtros
+    linha_ids = None
+    if not request.user.is_superuser:
+        linha_ids = LinhaProducao.objects.filter(setor__in=setores_permitidos(request.user)).values_list("pk", flat=True)
+    arquivados = arquivo.linhas_exportacao(detalhar, linha_ids=linha_ids, texto=request.GET.get("q") or None)
+    response = StreamingHttpResponse(
+        exportacao.GERADORES[formato](registros, detalhar, arquivados),
+        content_type=exportacao.FORMATOS[formato],
+    )
+    nome = f"registros{'_' + detalhar if detalhar else ''}.{formato}"
+    response["Content-Disposition"] = f'attachment; filename="{nome}"'
+    return response
+
+
+@login_required
+def buscar_registros(request):
+    """Busca textual ranqueada (JSON) para o campo de busca da lista."""
+    q = request.GET.get("q", "")
+    try:
+        limite = min(int(request.GET.get("limite", 20)), 100)
+    except ValueError:
+        return HttpResponseBadRequest("Limite inválido.")
+
+    registros = _restringir_setores(RegistroProducao.objects.all(), request.user)
+    resultados = obter_backend().buscar(registros, q, limite=limite)
+    return JsonResponse({"resultados": [
+        {
+            "id": registro.pk,
+            "linha": registro.linha.nome,
+            "setor": registro.linha.setor,
+            "data": registro.data,
+            "turno": registro.turno,
+            "relevancia": relevancia,
+            "trecho": trecho,
+            "url": reverse("registros-detalhes", args=[registro.pk]),
+        }
+        for registro, relevancia, trecho in resultados
+    ]})
+
+
+# =========================
+# API de apontamento (terminais de linha)
+# =========================
+
+MAX_HORAS_APONTAMENTO = 48
+
+
+def _erros(form):
+    return {campo: list(mensagens) for campo, mensagens in form.errors.items()}
+
+
+def api_apontamento(request):
+    """
+    POST JSON: {"linha": id, "data": "AAAA-MM-DD", "turno": "1", "horas": [
+    {"hora_inicio": "06:00", "hora_fim": "07:00", "quantidade_produzida": 120,
+    "quantidade_defeituosa": 2}, ...], "motivo_parada": "...",
+    "substituir_horas": false}. Cria ou atualiza o registro e as horas.
+    """
+    if request.method != "POST":
+        return JsonResponse({"erro": "Use POST."}, status=405)
+    if not request.user.is_authenticated:
+        return JsonResponse({"erro": "Autenticação necessária."}, status=401)
+
+    try:
+        dados = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"erro": "JSON inválido."}, status=400)
+    if not isinstance(dados, dict) or not isinstance(dados.get("horas", []), list):
+        return JsonResponse({"erro": "Formato inválido."}, status=400)
+
+    form = ApontamentoForm(dados)
+    erros = {} if form.is_valid() else _erros(form)
+    horas = []
+    for i, hora in enumerate(dados.get("horas", [])[:MAX_HORAS_APONTAMENTO + 1]):
+        form_hora = HoraApontamentoForm(hora if isinstance(hora, dict) else {})
+        if form_hora.is_valid():
+            horas.append(form_hora.cleaned_data)
+        else:
+            erros[f"horas.{i}"] = _erros(form_hora)
+    if len(dados.get("horas", [])) > MAX_HORAS_APONTAMENTO:
+        erros["horas"] = [f"No máximo {MAX_HORAS_APONTAMENTO} horas por envio."]
+    elif len({h["hora_inicio"] for h in horas}) != len(horas):
+        erros["horas"] = ["Hora inicial repetida."]
+    if erros:
+        return JsonResponse({"erros": erros}, status=400)
+
+    linha = form.cleaned_data["linha"]
+    user = request.user
+    if not user.is_superuser and linha.setor not in setores_permitidos(user):
+        return JsonResponse({"erro": "Você não tem permissão para registrar neste setor."}, status=403)
+
+    try:
+        pk, criado, totais = gravar_apontamento(
+            linha,
+            form.cleaned_data["data"],
+            form.cleaned_data["turno"],
+            horas,
+            motivo_parada=form.cleaned_data["motivo_parada"] if "motivo_parada" in dados else None,
+            substituir_horas=form.cleaned_data["substituir_horas"],
+        )
+    except RegistroArquivado:
+        return JsonResponse({"erro": "Registro arquivado — reabra pelos detalhes antes de alterar."}, status=409)
+    except RegistroFinalizado:
+        return JsonResponse({"erro": "Registro finalizado — reabra antes de alterar."}, status=409)
+    return JsonResponse({"id": pk, **totais}, status=201 if criado else 200)
+
+
+MAX_EVENTOS_CONTADORES = 1000
+
+
+@csrf_exempt
+async def ingerir_contadores(request):
+    """
+    POST JSON das máquinas: {"linha": id, "produzida": n, "defeituosa": n,
+    "momento": "AAAA-MM-DDTHH:MM:SS"} ou {"eventos": [...]}. Autenticação
+    por ``Authorization: Token <SGPI_INGESTAO_TOKEN>``. As contagens vão
+    para o buffer (sgpi/ingestao.py) e são gravadas em lote.
+    """
+    if request.method != "POST":
+        return JsonResponse({"erro": "Use POST."}, status=405)
+    token = getattr(settings, "SGPI_INGESTAO_TOKEN", None)
+    if not token:
+        return JsonResponse({"erro": "Ingestão desativada (SGPI_INGESTAO_TOKEN)."}, status=503)
+    enviado = request.headers.get("Authorization", "").removeprefix("Token ").strip()
+    if not hmac.compare_digest(enviado.encode(), token.encode()):
+        return JsonResponse({"erro": "Token inválido."}, status=401)
+
+    try:
+        dados = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"erro": "JSON inválido."}, status=400)
+    eventos = dados.get("eventos", [dados]) if isinstance(dados, dict) else None
+    if not isinstance(eventos, list):
+        return JsonResponse({"erro": "Formato inválido."}, status=400)
+    if len(eventos) > MAX_EVENTOS_CONTADORES:
+        return JsonResponse({"erro": f"No máximo {MAX_EVENTOS_CONTADORES} eventos por envio."}, status=400)
+
+    agora = timezone.now()
+    aceitos = 0
+    rejeitados = []
+    for i, evento in enumerate(eventos):
+        try:
+            if not ingestao.buffer.adicionar(*ingestao.validar_evento(evento, agora)):
+                raise ingestao.EventoInvalido("momento fora dos turnos.")
+            aceitos += 1
+        except ingestao.EventoInvalido as exc:
+            rejeitados.append({"indice": i, "erro": str(exc)})
+
+    if not ingestao.buffer.ativo:
+        # sem o timer do lifespan (runserver/WSGI): grava já
+        await ingestao.buffer.descarregar()
+    elif ingestao.buffer.cheio():
+        ingestao.buffer.agendar_descarga()
+    return JsonResponse({"aceitos": aceitos, "rejeitados": rejeitados}, status=202)
+
+
+# =========================
+# Importação em massa (somente superuser)
+# =========================
+
+@login_required
+@user_passes_test(_so_superuser)
+def importar_producao(request):
+    if request.method == "POST":
+        form = ImportacaoProducaoForm(request.POST, request.FILES)
+        if form.is_valid():
+            arquivo = form.cleaned_data["arquivo"]
+            try:
+                if arquivo.name.lower().endswith(".xlsx"):
+                    resultado = importar_registros_hora(ler_xlsx(arquivo))
+                else:
+                    texto = io.TextIOWrapper(arquivo.file, encoding="utf-8-sig", newline="")
+                    resultado = importar_registros_hora(ler_csv(texto))
+            except (ImportError, UnicodeDecodeError, csv.Error, zipfile.BadZipFile, KeyError) as exc:
+                # KeyError/BadZipFile: .xlsx corrompido; csv.Error: NUL, aspas sem fechar
+                messages.error(request, f"Não foi possível ler o arquivo: {exc}")
+                return render(request, "registros/importar.html", {"form": form})
+
+            token = None
+            if resultado.total_erros:
+                token = guardar_relatorio(resultado)
+                messages.warning(request, f"{resultado.total_erros} linha(s) com erro não foram importadas.")
+            else:
+                messages.success(request, "Importação concluída sem erros.")
+            return render(request, "registros/importar.html", {
+                "form": ImportacaoProducaoForm(),
+                "resultado": resultado,
+                "token_erros": token,
+            })
+    else:
+        form = ImportacaoProducaoForm()
+    return render(request, "registros/importar.html", {"form": form})
+
+
+@login_required
+@user_passes_test(_so_superuser)
+def importar_producao_erros(request, token):
+    relatorio = ler_relatorio(token)
+    if relatorio is None:
+        raise Http404("Relatório de erros expirado ou inexistente.")
+    response = HttpResponse(relatorio, content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = 'attachment; filename="erros_importacao.csv"'
+    return response
+
+
 # =========================
 # CRUD de usuários (somente superuser)
 # =========================
@@ -413,13 +758,12 @@ def criar_usuario(request):
 @login_required
 @user_passes_test(_so_superuser)
 def lista_usuarios(request):
-    qs = User.objects.order_by("username")
+    qs = User.objects.all()
     q = request.GET.get("q")
     if q:
         qs = qs.filter(username__icontains=q)
-    paginator = Paginator(qs, 10)
-    page = request.GET.get("page")
-    usuarios = paginator.get_page(page)
+    paginador = PaginadorKeyset(qs, ["username", "pk"], 10, contar=request.GET.get("contar") == "1")
+    usuarios = paginador.pagina(request.GET.get("cursor"))
     return render(request, "usuarios/lista.html", {"usuarios": usuarios, "q": q or ""})
 
 
@@ -487,20 +831,216 @@ def deletar_usuario(request, user_id):
 # === Ações: Finalizar / Reabrir Registro ===
 @login_required
 def registro_finalizar(request, pk):
-    registro = get_object_or_404(RegistroProducao, pk=pk)
-    if not registro.finalizada:
-        registro.finalizar()
+    registros = RegistroProducao.objects.filter(pk=pk)
+    if registros.finalizar():
         messages.success(request, "Registro finalizado com sucesso.")
+    elif not registros.exists():
+        raise Http404
     return redirect("registros-lista")
 
 @login_required
 def registro_reabrir(request, pk):
-    registro = get_object_or_404(RegistroProducao, pk=pk)
-    if registro.finalizada:
-        registro.reabrir()
+    registros = RegistroProducao.objects.filter(pk=pk)
+    reabertos = registros.reabrir()
+    try:
+        if not reabertos and arquivo.restaurar(ids=[pk]):
+            # estava no arquivo frio: volta para as tabelas quentes e reabre
+            reabertos = registros.reabrir()
+    except arquivo.ConflitoRestauracao as exc:
+        messages.error(request, f"Não foi possível reabrir o registro arquivado: {exc}.")
+        return redirect("registros-detalhes", pk=pk)
+    if reabertos:
         messages.success(request, "Registro reaberto com sucesso.")
+    elif not registros.exists():
+        raise Http404
     return redirect("registros-lista")
 
+# =========================
+# Relatórios
+# =========================
+
+@login_required
+def painel(request):
+    user = request.user
+    if user.is_superuser:
+        setores = (
+            LinhaProducao.objects.exclude(setor__isnull=True).exclude(setor="")
+            .order_by("setor").values_list("setor", flat=True).distinct()
+        )
+    else:
+        setores = sorted(setores_permitidos(user))
+    return render(request, "painel/painel.html", {
+        "fragmentos": fragmentos_setores(setores, timezone.localdate()),
+        "atualizar_a_cada": 60,
+    })
+
+
+def _canal_ao_vivo(request, user):
+    """(setor, linha_id) pedidos em ?setor= ou ?linha=; PermissionDenied/Http404 se não puder ver."""
+    linha_id = request.GET.get("linha")
+    if linha_id:
+        try:
+            setor = LinhaProducao.objects.filter(pk=int(linha_id)).values_list("setor", flat=True).get()
+        except (ValueError, LinhaProducao.DoesNotExist):
+            raise Http404
+        linha_id = int(linha_id)
+    else:
+        setor = request.GET.get("setor") or ""
+        linha_id = None
+        if not setor:
+            raise Http404
+    if not user.is_superuser and setor not in setores_permitidos(user):
+        raise PermissionDenied
+    return setor, linha_id
+
+
+@login_required
+def painel_ao_vivo(request):
+    setor, linha_id = _canal_ao_vivo(request, request.user)
+    return render(request, "painel/ao_vivo.html", {
+        "setor": setor,
+        "linha_id": linha_id,
+        "url_eventos": f"{reverse('painel-eventos')}?{request.GET.urlencode()}",
+    })
+
+
+def _evento_sse(nome, dados):
+    return f"event: {nome}\ndata: {json.dumps(dados, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def _fluxo_ao_vivo(assinante):
+    canal = (assinante.setor, assinante.linha_id)
+    aovivo.central.assinar(assinante)
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            # estado completo na conexão e a cada virada de hora (a produção da hora zera)
+            hora = hora_cheia(timezone.now())
+            versao, atual = await sync_to_async(estados_do_canal)(*canal)
+            aovivo.central.publicar(atual)
+            yield _evento_sse("estado", list(atual.values()))
+
+            ocioso = 0
+            while hora == hora_cheia(timezone.now()):
+                try:
+                    await asyncio.wait_for(assinante.evento.wait(), aovivo.intervalo_versao())
+                except asyncio.TimeoutError:
+                    # gravação em outro worker: só a versão do setor no cache muda
+                    if await sync_to_async(versao_setor)(assinante.setor) != versao:
+                        versao, atual = await sync_to_async(estados_do_canal)(*canal)
+                        aovivo.central.publicar(atual)
+                        continue
+                    ocioso += aovivo.intervalo_versao()
+                    if ocioso >= aovivo.intervalo_heartbeat():
+                        ocioso = 0
+                        yield ": ping\n\n"
+                    continue
+                pendentes = aovivo.central.retirar(assinante)
+                if pendentes:
+                    yield _evento_sse("delta", list(pendentes.values()))
+    finally:
+        aovivo.central.cancelar(assinante)
+
+
+@login_required
+async def painel_eventos(request):
+    """
+    Server-Sent Events do painel ao vivo (?setor= ou ?linha=): um evento
+    ``estado`` com todas as linhas e depois ``delta`` só com o que mudou.
+    Fora do ASGI não há conexão longa: vai o estado e o navegador
+    reconecta (retry) — na prática, polling.
+    """
+    user = await request.auser()
+    setor, linha_id = await sync_to_async(_canal_ao_vivo)(request, user)
+    if not isinstance(request, ASGIRequest):
+        _, atual = await sync_to_async(estados_do_canal)(setor, linha_id)
+        return HttpResponse(
+            "retry: 5000\n\n" + _evento_sse("estado", list(atual.values())),
+            content_type="text/event-stream",
+        )
+
+    assinante = aovivo.Assinante(asyncio.get_running_loop(), setor=setor, linha_id=linha_id)
+    resposta = StreamingHttpResponse(_fluxo_ao_vivo(assinante), content_type="text/event-stream")
+    resposta["Cache-Control"] = "no-cache"
+    resposta["X-Accel-Buffering"] = "no"  # nginx não segura os eventos
+    return resposta
+
+
+@login_required
+@user_passes_test(_so_superuser)
+def instrumentacao(request):
+    """Percentis por rota medidos pelo InstrumentacaoMiddleware (neste processo)."""
+    if request.method == "POST":
+        medicoes.limpar()
+    return JsonResponse({"rotas": medicoes.resumo()}, json_dumps_params={"ensure_ascii": False})
+
+
+@login_required
+def relatorio_oee(request):
+    hoje = timezone.localdate()
+    filtro = FiltroOEEForm(request.GET or None)
+    data_inicio, data_fim, agrupar_por = hoje.replace(day=1), hoje, "linha"
+    linhas_oee = []
+
+    if filtro.is_bound and not filtro.is_valid():
+        return render(request, "relatorios/oee.html", {"filtro": filtro, "linhas_oee": linhas_oee})
+
+    if filtro.is_bound:
+        data_inicio = filtro.cleaned_data["data_inicio"] or data_inicio
+        data_fim = filtro.cleaned_data["data_fim"] or data_fim
+        agrupar_por = filtro.cleaned_data["agrupar_por"] or agrupar_por
+    else:
+        filtro = FiltroOEEForm(initial={
+            "data_inicio": data_inicio, "data_fim": data_fim, "agrupar_por": agrupar_por,
+        })
+
+    qs = _restringir_setores(RegistroProducao.objects.all(), request.user)
+    linhas_oee = calcular_oee(data_inicio, data_fim, agrupar_por, queryset=qs)
+    return render(request, "relatorios/oee.html", {
+        "filtro": filtro,
+        "linhas_oee": linhas_oee,
+        "agrupar_por": agrupar_por,
+        "data_inicio": data_inicio,
+        "data_fim": data_fim,
+    })
+
+@login_required
+def relatorio_pareto(request):
+    hoje = timezone.localdate()
+    filtro = FiltroParetoForm(request.GET or None)
+    data_inicio, data_fim, agrupar_por = hoje.replace(day=1), hoje, ""
+
+    if filtro.is_bound and not filtro.is_valid():
+        if request.GET.get("formato") == "json":
+            return JsonResponse({"erros": filtro.errors}, status=400)
+        return render(request, "relatorios/pareto.html", {"filtro": filtro, "pareto": []})
+
+    if filtro.is_bound:
+        data_inicio = filtro.cleaned_data["data_inicio"] or data_inicio
+        data_fim = filtro.cleaned_data["data_fim"] or data_fim
+        agrupar_por = filtro.cleaned_data["agrupar_por"] or agrupar_por
+    else:
+        filtro = FiltroParetoForm(initial={
+            "data_inicio": data_inicio, "data_fim": data_fim, "agrupar_por": agrupar_por,
+        })
+
+    qs = _restringir_setores(Parada.objects.all(), request.user, "registro__linha__setor")
+    pareto = calcular_pareto(data_inicio, data_fim, agrupar_por, queryset=qs)
+    if request.GET.get("formato") == "json":
+        return JsonResponse({
+            "data_inicio": data_inicio,
+            "data_fim": data_fim,
+            "agrupar_por": agrupar_por,
+            "pareto": pareto,
+        })
+    return render(request, "relatorios/pareto.html", {
+        "filtro": filtro,
+        "pareto": pareto,
+        "agrupar_por": agrupar_por,
+        "data_inicio": data_inicio,
+        "data_fim": data_fim,
+    })
+
 #Redefinir senha
 def forgot_password(request):
     return render(request, "registration/forgot_password.html")
\ No newline at end of file